@@ -2,14 +2,29 @@
 
 import asyncio
 import json
+import signal
 import sys
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
 from telegram.error import BadRequest, NetworkError, TimedOut, RetryAfter
-from config import get_bot_token
+from config import (
+    get_bot_token, DB_STORAGE_PROFILE, SLOW_CALLBACK_SECONDS, CONCURRENT_UPDATES,
+    TASK_STATE_BACKEND, BOT_MODE, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_MAX_CONNECTIONS,
+)
 import database
+import migrations
+from catalog import CATALOG
 import game_data
 import tasks_handler
+import keyboards
+import screens
+import messaging
+from messaging import edit_message
+from screens import create_progress_bar, format_coins
+from router import CallbackRouter, CallbackDataError
+from update_processor import UserOrderedUpdateProcessor
+from state_backends import make_backend
+from webhook import WebhookServer
 
 # Импортируем систему логирования
 try:
@@ -26,19 +41,43 @@ except ImportError:
         print(f"WARNING: {message} {data if data else ''}")
 
 # Инициализация базы данных и загрузка данных
-async def init():
+async def init(application: Application = None):
+    await database.open_pool()
+    mismatches = await database.check_storage_profile()
+    if mismatches:
+        log_warning("Профиль хранения SQLite применён не полностью", mismatches)
+    else:
+        log_info("Профиль хранения SQLite применён", DB_STORAGE_PROFILE)
     await database.init_db()
     await game_data.load_game_data()
+    tasks_handler.task_states.attach_backend(make_backend(TASK_STATE_BACKEND))
+    tasks_handler.task_states.start_sweeper()
+    database.event_snapshotter.start()
+    migrations.background_migration.start()
+
+# Закрытие соединений с базой при остановке
+async def shutdown(application: Application = None):
+    log_info("Статистика кэша пользователей", database.user_cache.stats())
+    log_info("Статистика обработчиков кнопок", router.stats())
+    log_info("Статистика кэша клавиатур", keyboards.cache_stats())
+    log_info("Статистика кэша экранов", screens.cache_stats())
+    log_info("Статистика правок сообщений", messaging.rendered_messages.stats())
+    log_info("Статистика исходящих правок", messaging.outbound.stats())
+    messaging.outbound.cancel_all()
+    tasks_handler.reaction_timers.cancel_all()
+    tasks_handler.task_states.stop_sweeper()
+    database.event_snapshotter.stop()
+    await migrations.background_migration.stop()
+    log_info("Статистика фоновых миграций", migrations.background_migration.stats())
+    log_info("Статистика свёртки журнала событий", database.event_snapshotter.stats())
+    # Отложенные счётчики и несохранённые состояния заданий записываются до закрытия пула
+    await database.counter_buffer.flush()
+    log_info("Статистика отложенной записи счётчиков", database.counter_buffer.stats())
+    await tasks_handler.task_states.detach_backend()
+    log_info("Статистика состояний заданий", tasks_handler.task_states.stats())
+    await database.close_pool()
 
 # Вспомогательные функции для визуализации
-def create_progress_bar(current: int, total: int, length: int = 10) -> str:
-    """Создать визуальный прогресс-бар"""
-    filled = int((current / total) * length) if total > 0 else 0
-    filled = min(filled, length)
-    bar = "█" * filled + "░" * (length - filled)
-    percent = int((current / total) * 100) if total > 0 else 0
-    return f"{bar} {percent}%"
-
 def get_emoji_animation(step: int) -> str:
     """Получить анимированный эмодзи для эффектов"""
     animations = {
@@ -50,12 +89,6 @@ def get_emoji_animation(step: int) -> str:
     # Простая анимация через шаги
     return animations.get("sparkles", ["✨"])[step % len(animations.get("sparkles", ["✨"]))]
 
-def format_coins(amount: int) -> str:
-    """Форматировать количество мандаринок"""
-    if amount >= 1000:
-        return f"{amount/1000:.1f}K🍊"
-    return f"{amount}🍊"
-
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     try:
@@ -64,7 +97,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         user_id = update.effective_user.id
         log_info(f"User {user_id} started bot")
-        await database.get_user(user_id)  # Создаем пользователя если его нет
+        await database.ensure_user(user_id)  # Создаем пользователя если его нет
         
         text = """🎄✨ *Добро пожаловать на Московскую зимнюю ярмарку!* ✨🎄
 
@@ -86,11 +119,9 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 ✨ *Готов начать?*"""
         
-        keyboard = [[InlineKeyboardButton("🎪 Открыть ярмарку", callback_data="menu")]]
-        
         await update.message.reply_text(
             text=text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
+            reply_markup=keyboards.start_keyboard(),
             parse_mode='Markdown'
         )
     except BadRequest as e:
@@ -99,50 +130,95 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             await update.message.reply_text(
                 text=text.replace('*', '').replace('_', ''),
-                reply_markup=InlineKeyboardMarkup(keyboard)
+                reply_markup=keyboards.start_keyboard()
             )
         except Exception as e2:
             log_error(e2, "start_command fallback")
     except Exception as e:
         log_error(e, "start_command")
 
+# Маршруты inline-кнопок: action -> обработчик (см. router.py)
+router = CallbackRouter()
+
+# Экраны, которые должны отрисовываться быстро: медленные вызовы попадают в лог
+SCREEN_ACTIONS = ("menu", "map", "pav_view", "pav_enter", "fact",
+                  "collection", "facts_menu", "facts_pav", "stats")
+
+def log_slow_screen(action: str, elapsed: float):
+    """Хук времени: предупреждение о медленной отрисовке экрана"""
+    if elapsed > SLOW_CALLBACK_SECONDS:
+        log_warning("Медленный обработчик кнопки", {"action": action, "ms": round(elapsed * 1000)})
+
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик всех inline-кнопок"""
+    action = None
     try:
         query = update.callback_query
         if not query:
             return
-        
+
         await query.answer()
-        
+
         if not query.data:
             return
-        
-        data = query.data.split(":")
-        if not data or len(data) == 0:
-            return
-        
-        action = data[0]
+
+        action = query.data.partition(":")[0]
         log_info(f"Button action: {action}", {"user_id": query.from_user.id, "data": query.data})
-        
-        # ГЛАВНОЕ МЕНЮ
-        if action == "menu":
-            user_id = query.from_user.id
-            user_coins = await database.get_user_coins(user_id)
-            open_pavilions = await database.get_open_pavilions(user_id)
-            if 1 not in open_pavilions:  # Автоматически открываем первый павильон
-                await database.open_pavilion(user_id, 1)
-                open_pavilions = await database.get_open_pavilions(user_id)
-            open_count = len(open_pavilions)
-            
-            collected_facts = await database.get_collected_facts(user_id)
-            facts_count = len(collected_facts)
-            
-            # Прогресс-бары
-            pavilions_progress = create_progress_bar(open_count, 7)
-            facts_progress = create_progress_bar(facts_count, 75)
-            
-            text = f"""🎄✨ *Московская зимняя ярмарка* ✨🎄
+
+        try:
+            # После перезапуска состояния начатых заданий игрока подгружаются из бэкенда
+            await tasks_handler.task_states.hydrate(query.from_user.id)
+            await router.dispatch(query, context)
+        except CallbackDataError as e:
+            log_warning("Некорректные данные кнопки", {"data": query.data, "error": str(e)})
+            await query.answer("❌ Ошибка данных", show_alert=True)
+    except BadRequest as e:
+        # Ошибка редактирования сообщения (например, сообщение не изменилось)
+        log_error(e, f"button_handler BadRequest action={action}")
+        try:
+            await query.answer("⚠️ Сообщение уже обновлено", show_alert=False)
+        except:
+            pass
+    except RetryAfter as e:
+        # Превышен лимит запросов
+        log_error(e, f"button_handler RetryAfter action={action}")
+        try:
+            await query.answer(f"⏳ Слишком много запросов. Подожди {e.retry_after} сек.", show_alert=True)
+        except:
+            pass
+    except (NetworkError, TimedOut) as e:
+        # Проблемы с сетью
+        log_error(e, f"button_handler NetworkError action={action}")
+        try:
+            await query.answer("🌐 Проблемы с сетью. Попробуй позже.", show_alert=True)
+        except:
+            pass
+    except Exception as e:
+        # Другие ошибки
+        log_error(e, f"button_handler action={action}")
+        try:
+            await query.answer("❌ Произошла ошибка. Попробуйте позже.", show_alert=True)
+        except:
+            pass
+
+# ГЛАВНОЕ МЕНЮ
+@router.route("menu")
+async def show_menu(query, context):
+    user_id = query.from_user.id
+    user = await database.get_user_snapshot(user_id)
+    if not user.pavilions_mask & CATALOG.pavilion(1).bit:  # Автоматически открываем первый павильон
+        await database.open_pavilion(user_id, 1)
+        user = await database.get_user_snapshot(user_id)
+    user_coins = user.coins
+    open_count = user.pavilions_count
+
+    facts_count = user.facts_count
+
+    # Прогресс-бары
+    pavilions_progress = create_progress_bar(open_count, 7)
+    facts_progress = create_progress_bar(facts_count, 75)
+
+    text = f"""🎄✨ *Московская зимняя ярмарка* ✨🎄
 
 💰 *Твой капитал:* {format_coins(user_coins)}
 
@@ -157,131 +233,82 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 ━━━━━━━━━━━━━━━━━━━━
 
 ✨ *Что дальше?*"""
-            
-            keyboard = [
-                [InlineKeyboardButton("🗺 Карта ярмарки", callback_data="map")],
-                [InlineKeyboardButton("📖 Моя коллекция", callback_data="collection")]
-            ]
-            
-            await query.edit_message_text(
-                text=text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-        
-        # КАРТА ЯРМАРКИ
-        elif action == "map":
-            user_id = query.from_user.id
-            user_coins = await database.get_user_coins(user_id)
-            pavilions = await database.get_all_pavilions()
-            user_pavilions = await database.get_open_pavilions(user_id)
-            
-            text = f"""🗺 *Карта Московской зимней ярмарки* 🗺
-
-❄️ Снег падает на огоньки павильонов...
-☕ Пахнет глинтвейном и мандаринами...
-🎄 В воздухе витает предновогоднее волшебство...
 
-━━━━━━━━━━━━━━━━━━━━
+    await edit_message(
+        query,
+        text=text,
+        reply_markup=keyboards.menu_keyboard(),
+        parse_mode='Markdown'
+    )
 
-💰 *У тебя:* {format_coins(user_coins)}
+# КАРТА ЯРМАРКИ
+@router.route("map")
+async def show_map(query, context):
+    user_id = query.from_user.id
+    user = await database.get_user_snapshot(user_id)
+    text, keyboard = screens.render_map(user.pavilions_mask, user.coins)
 
-━━━━━━━━━━━━━━━━━━━━
+    await edit_message(
+        query,
+        text=text,
+        reply_markup=keyboard,
+        parse_mode='Markdown'
+    )
 
-📍 *Выбери павильон:*"""
-            
-            keyboard = []
-            for pav in pavilions:
-                if pav['id'] in user_pavilions:
-                    btn = InlineKeyboardButton(
-                        f"✅ {pav['emoji']} {pav['name']}",
-                        callback_data=f"pav_enter:{pav['id']}"
-                    )
-                else:
-                    btn = InlineKeyboardButton(
-                        f"🔒 {pav['emoji']} {pav['name']} · {pav['price']}🍊",
-                        callback_data=f"pav_view:{pav['id']}"
-                    )
-                keyboard.append([btn])
-            
-            keyboard.append([InlineKeyboardButton("⬅️ В меню", callback_data="menu")])
-            
-            await query.edit_message_text(
-                text=text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-        
-        # ПРОСМОТР ЗАКРЫТОГО ПАВИЛЬОНА
-        elif action == "pav_view":
-            pav_id = int(data[1])
-            pav = await database.get_pavilion(pav_id)
-            user_id = query.from_user.id
-            user_coins = await database.get_user_coins(user_id)
-            
-            text = f"""{pav['emoji']} *{pav['name']}*
+# ПРОСМОТР ЗАКРЫТОГО ПАВИЛЬОНА
+@router.route("pav_view", int)
+async def show_pavilion_preview(query, context, pav_id: int):
+    pav = CATALOG.pavilion(pav_id)
+    user_id = query.from_user.id
+    user_coins = await database.get_user_coins(user_id)
+
+    text = f"""{pav.emoji} *{pav.name}*
 
-{pav['description']}
+{pav.description}
 
-💫 *{pav['atmosphere']}*
+💫 *{pav.atmosphere}*
 
 ━━━━━━━━━━━━━━━━━━━━
 
-💰 *Стоимость:* {format_coins(pav['price'])}
+💰 *Стоимость:* {format_coins(pav.price)}
 🍊 *У тебя:* {format_coins(user_coins)}"""
-            
-            keyboard = []
-            
-            if user_coins >= pav['price']:
-                text += "\n\n━━━━━━━━━━━━━━━━━━━━\n\n✅ *Можно открыть!*"
-                keyboard.append([
-                    InlineKeyboardButton(
-                        f"✅ Открыть за {format_coins(pav['price'])}",
-                        callback_data=f"pav_buy:{pav_id}"
-                    )
-                ])
-            else:
-                needed = pav['price'] - user_coins
-                text += f"\n\n━━━━━━━━━━━━━━━━━━━━\n\n❌ *Не хватает:* {format_coins(needed)}\n\n💡 Выполняй задания, чтобы заработать!"
-            
-            keyboard.append([InlineKeyboardButton("⬅️ Назад на карту", callback_data="map")])
-            
-            await query.edit_message_text(
-                text=text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-        
-        # ПОКУПКА ПАВИЛЬОНА
-        elif action == "pav_buy":
-            if len(data) < 2:
-                await query.answer("❌ Ошибка данных", show_alert=True)
-                return
-            try:
-                pav_id = int(data[1])
-            except (ValueError, IndexError):
-                await query.answer("❌ Ошибка данных", show_alert=True)
-                return
-            pav = await database.get_pavilion(pav_id)
-            if not pav:
-                await query.answer("❌ Павильон не найден", show_alert=True)
-                return
-            user_id = query.from_user.id
-            
-            user_coins = await database.get_user_coins(user_id)
-            if user_coins < pav['price']:
-                await query.answer("❌ Недостаточно мандаринок!", show_alert=True)
-                return
-            
-            # Списываем монеты и открываем павильон
-            await database.subtract_coins(user_id, pav['price'])
-            await database.open_pavilion(user_id, pav_id)
-            
-            new_coins = await database.get_user_coins(user_id)
-            
-            text = f"""🎉✨ *ПАВИЛЬОН ОТКРЫТ!* ✨🎉
-
-{pav['emoji']} *{pav['name']}*
+
+    if user_coins >= pav.price:
+        text += "\n\n━━━━━━━━━━━━━━━━━━━━\n\n✅ *Можно открыть!*"
+        keyboard = keyboards.pavilion_preview_keyboard(pav_id, f"✅ Открыть за {format_coins(pav.price)}")
+    else:
+        needed = pav.price - user_coins
+        text += f"\n\n━━━━━━━━━━━━━━━━━━━━\n\n❌ *Не хватает:* {format_coins(needed)}\n\n💡 Выполняй задания, чтобы заработать!"
+        keyboard = keyboards.pavilion_preview_keyboard(pav_id)
+
+    await edit_message(
+        query,
+        text=text,
+        reply_markup=keyboard,
+        parse_mode='Markdown'
+    )
+
+# ПОКУПКА ПАВИЛЬОНА
+@router.route("pav_buy", int)
+async def buy_pavilion(query, context, pav_id: int):
+    pav = CATALOG.pavilion(pav_id)
+    if not pav:
+        await query.answer("❌ Павильон не найден", show_alert=True)
+        return
+    user_id = query.from_user.id
+
+    # Списываем монеты и открываем павильон одной транзакцией
+    new_coins = await database.purchase_pavilion(user_id, pav_id)
+    if new_coins is None:
+        if pav_id in await database.get_open_pavilions(user_id):
+            await query.answer("✅ Павильон уже открыт")
+        else:
+            await query.answer("❌ Недостаточно мандаринок!", show_alert=True)
+        return
+
+    text = f"""🎉✨ *ПАВИЛЬОН ОТКРЫТ!* ✨🎉
+
+{pav.emoji} *{pav.name}*
 
 ━━━━━━━━━━━━━━━━━━━━
 
@@ -293,466 +320,178 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 ━━━━━━━━━━━━━━━━━━━━
 
 💰 *Осталось:* {format_coins(new_coins)}"""
-            
-            keyboard = [
-                [InlineKeyboardButton(f"{pav['emoji']} Войти в павильон", callback_data=f"pav_enter:{pav_id}")],
-                [InlineKeyboardButton("🗺 На карту", callback_data="map")]
-            ]
-            
-            await query.edit_message_text(
-                text=text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-        
-        # ВХОД В ПАВИЛЬОН
-        elif action == "pav_enter":
-            if len(data) < 2:
-                await query.answer("❌ Ошибка данных", show_alert=True)
-                return
-            try:
-                pav_id = int(data[1])
-            except (ValueError, IndexError):
-                await query.answer("❌ Ошибка данных", show_alert=True)
-                return
-            pav = await database.get_pavilion(pav_id)
-            if not pav:
-                await query.answer("❌ Павильон не найден", show_alert=True)
-                return
-            tasks = await database.get_pavilion_tasks(pav_id)
-            user_id = query.from_user.id
-            user_coins = await database.get_user_coins(user_id)
-            
-            text = f"""{pav['emoji']} *{pav['name']}*
-📍 {pav['location']}
+
+    await edit_message(
+        query,
+        text=text,
+        reply_markup=keyboards.pavilion_opened_keyboard(pav_id),
+        parse_mode='Markdown'
+    )
+
+# ВХОД В ПАВИЛЬОН
+@router.route("pav_enter", int)
+async def enter_pavilion(query, context, pav_id: int):
+    pav = CATALOG.pavilion(pav_id)
+    if not pav:
+        await query.answer("❌ Павильон не найден", show_alert=True)
+        return
+    user_id = query.from_user.id
+    user_coins = await database.get_user_coins(user_id)
+
+    text = f"""{pav.emoji} *{pav.name}*
+📍 {pav.location}
 
 ━━━━━━━━━━━━━━━━━━━━
 
-💫 *{pav['atmosphere']}*
+💫 *{pav.atmosphere}*
 
-{pav['description']}
+{pav.description}
 
 ━━━━━━━━━━━━━━━━━━━━
 
-💰 *Награда:* +{format_coins(pav['reward'])} за задание
+💰 *Награда:* +{format_coins(pav.reward)} за задание
 🍊 *У тебя:* {format_coins(user_coins)}
 
 ━━━━━━━━━━━━━━━━━━━━
 
 ✨ *Чем займёшься?*"""
-            
-            keyboard = []
-            for task in tasks:
-                keyboard.append([
-                    InlineKeyboardButton(
-                        f"{task['emoji']} {task['name']}",
-                        callback_data=f"task_start:{pav_id}:{task['id']}"
-                    )
-                ])
-            
-            keyboard.append([InlineKeyboardButton("⬅️ На карту ярмарки", callback_data="map")])
-            
-            await query.edit_message_text(
-                text=text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-        
-        # НАЧАЛО ЗАДАНИЯ
-        elif action == "task_start":
-            if len(data) < 3:
-                await query.answer("❌ Ошибка данных", show_alert=True)
-                return
-            try:
-                pav_id = int(data[1])
-                task_id = int(data[2])
-            except (ValueError, IndexError) as e:
-                log_error(e, f"task_start int conversion")
-                await query.answer("❌ Ошибка данных", show_alert=True)
-                return
-            
-            task = await database.get_task(task_id)
-            
-            if not task:
-                log_warning(f"Task not found", {"task_id": task_id})
-                await query.answer("❌ Задание не найдено", show_alert=True)
-                return
-            
-            if task['type'] == 'reaction':
-                await tasks_handler.start_reaction_task(query, pav_id, task_id, context)
-            elif task['type'] == 'choice':
-                await tasks_handler.start_choice_task(query, pav_id, task_id, context)
-            elif task['type'] == 'sequence':
-                await tasks_handler.start_sequence_task(query, pav_id, task_id, context)
-        
-        # РЕАКЦИЯ НА ЗАДАНИЕ - ожидание
-        elif action == "task_reaction_wait":
-            if len(data) < 2:
-                return
-            try:
-                task_id = int(data[1])
-            except (ValueError, IndexError):
-                return
-            await query.answer("⏳ Подожди...", show_alert=False)
-        
-        # РЕАКЦИЯ НА ЗАДАНИЕ - нажатие
-        elif action == "task_reaction_hit":
-            task_id = int(data[1])
-            state_key = f"{query.from_user.id}:{task_id}"
-            
-            # Проверяем состояние задания
-            if state_key not in tasks_handler.task_states:
-                await query.answer("❌ Задание не найдено. Начните заново.", show_alert=True)
-                return
-            
-            if tasks_handler.task_states[state_key].get("ready"):
-                # Успех! Показываем анимацию
-                await query.answer("🎉 Отлично! Идеальный момент!", show_alert=False)
-                # Небольшая задержка для эффекта
-                await asyncio.sleep(0.3)
-                await complete_task(query, task_id)
-            else:
-                # Провал - слишком рано или поздно
-                pav_id = tasks_handler.task_states[state_key].get("pavilion_id", 1)
-                task = await database.get_task(task_id)
-                task_name = task['name'] if task else "задание"
-                
-                await query.answer("⏰ Не тот момент! Попробуй ещё раз.", show_alert=True)
-                # Возвращаем в павильон с более понятным сообщением
-                await query.edit_message_text(
-                    text=f"""❌ *Время не то*
+
+    await edit_message(
+        query,
+        text=text,
+        reply_markup=keyboards.pavilion_keyboard(pav_id),
+        parse_mode='Markdown'
+    )
+
+# НАЧАЛО ЗАДАНИЯ
+@router.route("task_start", int, int)
+async def start_task(query, context, pav_id: int, task_id: int):
+    task = CATALOG.task(task_id)
+
+    if not task:
+        log_warning(f"Task not found", {"task_id": task_id})
+        await query.answer("❌ Задание не найдено", show_alert=True)
+        return
+
+    await tasks_handler.start_task(query, pav_id, task_id)
+
+# РЕАКЦИЯ НА ЗАДАНИЕ - ожидание
+@router.route("task_reaction_wait", int)
+async def reaction_wait(query, context, task_id: int):
+    await query.answer("⏳ Подожди...", show_alert=False)
+
+# РЕАКЦИЯ НА ЗАДАНИЕ - нажатие
+@router.route("task_reaction_hit", int)
+async def reaction_hit(query, context, task_id: int):
+    key = (query.from_user.id, task_id)
+
+    # Проверяем состояние задания
+    state = tasks_handler.task_states.get(key)
+    if state is None:
+        await query.answer("❌ Задание не найдено. Начните заново.", show_alert=True)
+        return
+
+    if state.ready:
+        # Успех! Показываем анимацию
+        await query.answer("🎉 Отлично! Идеальный момент!", show_alert=False)
+        # Небольшая задержка для эффекта
+        await asyncio.sleep(0.3)
+        await complete_task(query, task_id)
+    else:
+        # Провал - слишком рано или поздно; следующие кадры уже не нужны
+        tasks_handler.reaction_timers.cancel(key)
+        pav_id = state.pavilion_id
+
+        await query.answer("⏰ Не тот момент! Попробуй ещё раз.", show_alert=True)
+        # Возвращаем в павильон с более понятным сообщением
+        await edit_message(
+            query,
+            text=f"""❌ *Время не то*
 
 ⏰ Слишком рано или поздно
 👀 Следи внимательнее за сигналом
 
 🎯 *Попробуй снова*""",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔄 Попробовать снова", callback_data=f"task_start:{pav_id}:{task_id}"),
-                        InlineKeyboardButton("⬅️ Назад в павильон", callback_data=f"pav_enter:{pav_id}")
-                    ]]),
-                    parse_mode='Markdown'
-                )
-        
-        # ВЫБОР В ЗАДАНИИ
-        elif action == "task_choice":
-            if len(data) < 2:
-                await query.answer("❌ Ошибка данных", show_alert=True)
-                return
-            task_id = int(data[1])
-            choice = data[2] if len(data) > 2 else ""
-            
-            state_key = f"{query.from_user.id}:{task_id}"
-            task = await database.get_task(task_id)
-            pav_id = tasks_handler.task_states.get(state_key, {}).get("pavilion_id", 1)
-            
-            # Обработка специфичных заданий
-            if task_id == 1:  # Подобрать варежки
-                if choice == "red":
-                    await query.answer("✅ Идеально! Клиент доволен!", show_alert=False)
-                    await asyncio.sleep(0.3)
-                    await complete_task(query, task_id)
-                else:
-                    await query.answer("❌ Не тот цвет! Клиент просил красные. Попробуй ещё раз.", show_alert=True)
-            
-            elif task_id == 4:  # Найти нужный размер
-                if choice == "M":
-                    await query.answer("✅ Отлично! Размер M - именно то, что нужно!", show_alert=False)
-                    await asyncio.sleep(0.3)
-                    await complete_task(query, task_id)
-                else:
-                    await query.answer(f"❌ Не тот размер! Клиент просил размер M, а ты выбрал {choice}. Попробуй ещё раз.", show_alert=True)
-            
-            elif task_id == 15:  # Собрать порцию мороженого - шаг 1 (choice) переходит в sequence
-                if state_key not in tasks_handler.task_states:
-                    tasks_handler.task_states[state_key] = {"step": 1, "pavilion_id": pav_id, "task_id": task_id, "choices": [choice]}
-                else:
-                    tasks_handler.task_states[state_key]["choices"].append(choice)
-                # Переходим к следующему шагу (sequence)
-                await tasks_handler.show_icecream_sequence_continue(query, 1)
-            
-            elif task_id == 19:  # Добавить топпинг
-                await complete_task(query, task_id)
-            
-            elif task_id == 22:  # Повесить шары
-                await complete_task(query, task_id)
-            
-            elif task_id == 24:  # Упаковать свечи
-                await complete_task(query, task_id)
-            
-            elif task_id == 29:  # Сложить пряники
-                await complete_task(query, task_id)
-            
-            elif task_id == 31:  # Добавить варенье
-                await complete_task(query, task_id)
-            
-            elif task_id == 32:  # Украсить пряник
-                await complete_task(query, task_id)
-            
-            elif task_id == 36:  # Заварить чай
-                await complete_task(query, task_id)
-            
-            elif task_id == 44:  # Собрать чайную пару
-                await complete_task(query, task_id)
-            
-            elif task_id == 45:  # Выбрать варенье
-                await complete_task(query, task_id)
-            
-            elif task_id == 46:  # Найти редкий сорт
-                if choice == "found":
-                    await complete_task(query, task_id)
-                else:
-                    await query.answer("Продолжай искать...", show_alert=False)
-            
-            elif task_id == 48:  # Завернуть бумагу
-                await complete_task(query, task_id)
-            
-            elif task_id == 50:  # Написать пожелание
-                await complete_task(query, task_id)
-            
-            elif task_id == 54:  # Украсить декором
-                if state_key not in tasks_handler.task_states:
-                    tasks_handler.task_states[state_key] = {"choices": []}
-                if choice != "done":
-                    tasks_handler.task_states[state_key]["choices"].append(choice)
-                    await tasks_handler.show_decor_choice(query)
-                else:
-                    if len(tasks_handler.task_states[state_key]["choices"]) == 2:
-                        await complete_task(query, task_id)
-                    else:
-                        await query.answer("Нужно выбрать 2 элемента!", show_alert=True)
-            
-            elif task_id == 57:  # Выбрать открытку
-                await complete_task(query, task_id)
-            
-            elif task_id == 59:  # Финальный штрих
-                await complete_task(query, task_id)
-            
-            elif task_id == 7:  # Листать свитера
-                if choice == "found":
-                    await complete_task(query, task_id)
-                else:
-                    await query.answer("Продолжай искать...", show_alert=False)
-            
-            elif task_id == 8:  # Выбрать размер
-                if choice == "M":
-                    await complete_task(query, task_id)
-                else:
-                    await query.answer("❌ Не тот размер!", show_alert=True)
-            
-            elif task_id == 9:  # Примерить шапку
-                await complete_task(query, task_id)
-            
-            elif task_id == 14:  # Выбрать цветовую гамму
-                if state_key not in tasks_handler.task_states:
-                    tasks_handler.task_states[state_key] = {"choices": []}
-                if choice != "done":
-                    tasks_handler.task_states[state_key]["choices"].append(choice)
-                    await tasks_handler.show_color_scheme_choice(query)
-                else:
-                    if len(tasks_handler.task_states[state_key]["choices"]) == 3:
-                        await complete_task(query, task_id)
-                    else:
-                        await query.answer("Нужно выбрать 3 вещи!", show_alert=True)
-            
-            else:
-                await complete_task(query, task_id)
-        
-        # ПОСЛЕДОВАТЕЛЬНОСТЬ В ЗАДАНИИ
-        elif action == "task_sequence":
-            if len(data) < 3:
-                await query.answer("❌ Ошибка данных", show_alert=True)
-                return
-            task_id = int(data[1])
-            step = int(data[2])
-            choice = data[3] if len(data) > 3 else ""
-            
-            state_key = f"{query.from_user.id}:{task_id}"
-            task = await database.get_task(task_id)
-            pav_id = tasks_handler.task_states.get(state_key, {}).get("pavilion_id", 1)
-            
-            # Обработка специфичных последовательностей
-            if task_id == 2:  # Собрать набор для катания
-                if step == 3:
-                    await complete_task(query, task_id)
-                else:
-                    await tasks_handler.show_skating_set_sequence(query, step + 1)
-            
-            elif task_id == 5:  # Добавить грелки
-                if step == 2:
-                    await complete_task(query, task_id)
-                else:
-                    await tasks_handler.show_handwarmers_sequence(query, step + 1)
-            
-            elif task_id == 11:  # Собрать образ
-                if step == 3:
-                    await complete_task(query, task_id)
-                else:
-                    await tasks_handler.show_outfit_sequence(query, step + 1)
-            
-            elif task_id == 13:  # Подобрать аксессуары
-                if step == 2:
-                    await complete_task(query, task_id)
-                else:
-                    await tasks_handler.show_accessories_sequence(query, step + 1)
-            
-            elif task_id == 15:  # Собрать порцию мороженого - продолжение (после выбора топпинга)
-                # Завершаем задание
-                await complete_task(query, task_id)
-            
-            elif task_id == 25:  # Размотать гирлянду
-                if state_key not in tasks_handler.task_states:
-                    tasks_handler.task_states[state_key] = {"count": 0}
-                if choice == "unwind":
-                    tasks_handler.task_states[state_key]["count"] += 1
-                    await tasks_handler.show_garland_unwind_sequence(query, 1)
-                elif choice == "done":
-                    await complete_task(query, task_id)
-            
-            elif task_id == 26:  # Наполнить вазу
-                if state_key not in tasks_handler.task_states:
-                    tasks_handler.task_states[state_key] = {"count": 0}
-                if choice == "add":
-                    tasks_handler.task_states[state_key]["count"] += 1
-                    await tasks_handler.show_mandarin_vase_sequence(query, 1)
-                elif choice == "done":
-                    await complete_task(query, task_id)
-            
-            elif task_id == 28:  # Зажечь свечи
-                if state_key not in tasks_handler.task_states:
-                    tasks_handler.task_states[state_key] = {"count": 0}
-                if choice == "light":
-                    tasks_handler.task_states[state_key]["count"] += 1
-                    await tasks_handler.show_candles_light_sequence(query, 1)
-                elif choice == "done":
-                    await complete_task(query, task_id)
-            
-            elif task_id == 34:  # Собрать микс конфет
-                if state_key not in tasks_handler.task_states:
-                    tasks_handler.task_states[state_key] = {"red": 0, "blue": 0, "green": 0, "yellow": 0}
-                if choice in ["red", "blue", "green", "yellow"]:
-                    tasks_handler.task_states[state_key][choice] += 1
-                    await tasks_handler.show_candy_mix_sequence(query, 1)
-                elif choice == "done":
-                    await complete_task(query, task_id)
-            
-            elif task_id == 39:  # Собрать набор "Москва"
-                if step == 3:
-                    await complete_task(query, task_id)
-                else:
-                    await tasks_handler.show_moscow_set_sequence(query, step + 1)
-            
-            elif task_id == 41:  # Разлить по чашкам
-                if state_key not in tasks_handler.task_states:
-                    tasks_handler.task_states[state_key] = {"count": 0}
-                if choice == "pour":
-                    tasks_handler.task_states[state_key]["count"] += 1
-                    await tasks_handler.show_tea_pour_sequence(query, 1)
-                elif choice == "done":
-                    await complete_task(query, task_id)
-            
-            elif task_id == 42:  # Помешать сахар
-                if state_key not in tasks_handler.task_states:
-                    tasks_handler.task_states[state_key] = {"count": 0}
-                if choice == "stir":
-                    tasks_handler.task_states[state_key]["count"] += 1
-                    await tasks_handler.show_sugar_stir_sequence(query, 1)
-                elif choice == "done":
-                    await complete_task(query, task_id)
-            
-            elif task_id == 47:  # Упаковать подарок
-                if step == 5:
-                    await complete_task(query, task_id)
-                else:
-                    await tasks_handler.show_gift_wrap_sequence(query, step + 1)
-            
-            elif task_id == 53:  # Разгладить складки
-                if state_key not in tasks_handler.task_states:
-                    tasks_handler.task_states[state_key] = {"count": 0}
-                if choice == "smooth":
-                    tasks_handler.task_states[state_key]["count"] += 1
-                    await tasks_handler.show_smooth_folds_sequence(query, 1)
-                elif choice == "done":
-                    await complete_task(query, task_id)
-            
-            else:
-                await complete_task(query, task_id)
-        
-        # ОТМЕНА ЗАДАНИЯ
-        elif action == "task_cancel":
-            if len(data) < 2:
-                await query.answer("❌ Ошибка данных", show_alert=True)
-                return
-            task_id = int(data[1])
-            state_key = f"{query.from_user.id}:{task_id}"
-            pav_id = tasks_handler.task_states.get(state_key, {}).get("pavilion_id", 1)
-            
-            # Удаляем состояние
-            if state_key in tasks_handler.task_states:
-                del tasks_handler.task_states[state_key]
-            
-            # Возвращаем в павильон
-            await query.edit_message_text(
-                text="❌ Задание отменено",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Назад в павильон", callback_data=f"pav_enter:{pav_id}")
-                ]])
-            )
-        
-        # ЗАВЕРШЕНИЕ ЗАДАНИЯ
-        elif action == "task_done":
-            task_id = int(data[1])
-            await complete_task(query, task_id)
-        
-        # ПОКАЗ ФАКТА
-        elif action == "fact":
-            if len(data) < 3:
-                await query.answer("❌ Ошибка данных", show_alert=True)
-                return
-            pav_id = int(data[1])
-            task_id = int(data[2])
-            
-            task = await database.get_task(task_id)
-            fact = await database.get_fact(task['fact_id'])
-            user_id = query.from_user.id
-            
-            # Сохраняем факт в коллекцию
-            await database.add_fact_to_collection(user_id, fact['id'])
-            
-            user_coins = await database.get_user_coins(user_id)
-            
-            text = f"""❄️✨ *Интересный факт* ✨❄️
+            reply_markup=keyboards.retry_task_keyboard(pav_id, task_id),
+            parse_mode='Markdown'
+        )
+
+# ВЫБОР В ЗАДАНИИ
+# Правила заданий описаны в game_data.TASK_FLOWS_DATA и проверяются движком заданий
+@router.route("task_choice", int, str, required=1)
+async def task_choice(query, context, task_id: int, choice: str = ""):
+    if await tasks_handler.choose(query, task_id, choice):
+        await complete_task(query, task_id)
+
+# ПОСЛЕДОВАТЕЛЬНОСТЬ В ЗАДАНИИ
+@router.route("task_sequence", int, int, str, required=2)
+async def task_sequence(query, context, task_id: int, step: int, choice: str = ""):
+    if await tasks_handler.sequence_step(query, task_id, step, choice):
+        await complete_task(query, task_id)
+
+# ОТМЕНА ЗАДАНИЯ
+@router.route("task_cancel", int)
+async def cancel_task(query, context, task_id: int):
+    # Удаляем состояние и отложенные кадры задания
+    key = (query.from_user.id, task_id)
+    tasks_handler.reaction_timers.cancel(key)
+    state = tasks_handler.task_states.pop(key)
+    pav_id = state.pavilion_id if state else 1
+
+    # Возвращаем в павильон
+    await edit_message(
+        query,
+        text="❌ Задание отменено",
+        reply_markup=keyboards.back_to_pavilion_keyboard(pav_id)
+    )
+
+# ЗАВЕРШЕНИЕ ЗАДАНИЯ
+@router.route("task_done", int)
+async def task_done(query, context, task_id: int):
+    await complete_task(query, task_id)
+
+# ПОКАЗ ФАКТА
+@router.route("fact", int, int)
+async def show_fact(query, context, pav_id: int, task_id: int):
+    task = CATALOG.task(task_id)
+    fact = CATALOG.fact(task.fact_id)
+    user_id = query.from_user.id
+
+    # Сохраняем факт в коллекцию
+    await database.add_fact_to_collection(user_id, fact.id)
+
+    user_coins = await database.get_user_coins(user_id)
+
+    text = f"""❄️✨ *Интересный факт* ✨❄️
 
 ━━━━━━━━━━━━━━━━━━━━
 
-💡 *"{fact['text']}"*
+💡 *"{fact.text}"*
 
 ━━━━━━━━━━━━━━━━━━━━
 
 ✅ Факт сохранён в коллекцию! 📚
 
 💰 *У тебя:* {format_coins(user_coins)}"""
-            
-            keyboard = [
-                [InlineKeyboardButton("➡️ Ещё задание", callback_data=f"pav_enter:{pav_id}")],
-                [InlineKeyboardButton("🗺 На карту", callback_data="map")]
-            ]
-            
-            await query.edit_message_text(
-                text=text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-        
-        # КОЛЛЕКЦИЯ
-        elif action == "collection":
-            user_id = query.from_user.id
-            collected_facts = await database.get_collected_facts(user_id)
-            facts_count = len(collected_facts)
-            user_coins = await database.get_user_coins(user_id)
-            
-            facts_progress = create_progress_bar(facts_count, 75)
-            
-            text = f"""📖✨ *Моя коллекция* ✨📖
+
+    await edit_message(
+        query,
+        text=text,
+        reply_markup=keyboards.fact_keyboard(pav_id),
+        parse_mode='Markdown'
+    )
+
+# КОЛЛЕКЦИЯ
+@router.route("collection")
+async def show_collection(query, context):
+    user_id = query.from_user.id
+    user = await database.get_user_snapshot(user_id)
+    facts_count = user.facts_count
+    user_coins = user.coins
+
+    facts_progress = create_progress_bar(facts_count, 75)
+
+    text = f"""📖✨ *Моя коллекция* ✨📖
 
 ━━━━━━━━━━━━━━━━━━━━
 
@@ -764,193 +503,98 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 ━━━━━━━━━━━━━━━━━━━━
 
 ✨ *Что посмотрим?*"""
-            
-            keyboard = [
-                [InlineKeyboardButton("📚 Факты по павильонам", callback_data="facts_menu")],
-                [InlineKeyboardButton("📊 Статистика", callback_data="stats")],
-                [InlineKeyboardButton("⬅️ В меню", callback_data="menu")]
-            ]
-            
-            await query.edit_message_text(
-                text=text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-        
-        # МЕНЮ ФАКТОВ
-        elif action == "facts_menu":
-            user_id = query.from_user.id
-            collected_facts = await database.get_collected_facts(user_id)
-            pavilions = await database.get_all_pavilions()
-            
-            text = """📚✨ *Собранные факты* ✨📚
-
-━━━━━━━━━━━━━━━━━━━━
-
-📍 *Выбери павильон:*"""
-            
-            keyboard = []
-            for pav in pavilions:
-                pav_facts = await database.get_pavilion_facts(pav['id'])
-                collected_pav_facts = [f for f in collected_facts if any(pf['id'] == f for pf in pav_facts)]
-                count = len(collected_pav_facts)
-                total = len(pav_facts)
-                
-                status = "✅" if count == total else ""
-                keyboard.append([
-                    InlineKeyboardButton(
-                        f"{status} {pav['emoji']} {pav['name']} · {count}/{total}",
-                        callback_data=f"facts_pav:{pav['id']}"
-                    )
-                ])
-            
-            keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="collection")])
-            
-            await query.edit_message_text(
-                text=text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-        
-        # ФАКТЫ ПАВИЛЬОНА
-        elif action == "facts_pav":
-            if len(data) < 2:
-                await query.answer("❌ Ошибка данных", show_alert=True)
-                return
-            pav_id = int(data[1])
-            pav = await database.get_pavilion(pav_id)
-            user_id = query.from_user.id
-            collected_facts = await database.get_collected_facts(user_id)
-            pav_facts = await database.get_pavilion_facts(pav_id)
-            
-            collected_pav_facts = [pf for pf in pav_facts if pf['id'] in collected_facts]
-            count = len(collected_pav_facts)
-            total = len(pav_facts)
-            
-            facts_progress = create_progress_bar(count, total)
-            
-            if count == 0:
-                text = f"""📚 *Факты:* {pav['emoji']} {pav['name']}
 
-━━━━━━━━━━━━━━━━━━━━
+    await edit_message(
+        query,
+        text=text,
+        reply_markup=keyboards.collection_keyboard(),
+        parse_mode='Markdown'
+    )
 
-📊 *Собрано:* {count}/{total}
-{facts_progress}
+# МЕНЮ ФАКТОВ
+@router.route("facts_menu")
+async def show_facts_menu(query, context):
+    user_id = query.from_user.id
+    user = await database.get_user_snapshot(user_id)
+    text, keyboard = screens.render_facts_menu(user.facts_mask)
 
-━━━━━━━━━━━━━━━━━━━━
+    await edit_message(
+        query,
+        text=text,
+        reply_markup=keyboard,
+        parse_mode='Markdown'
+    )
 
-💡 Пока нет собранных фактов.
-✨ Выполняй задания в этом павильоне!"""
-            else:
-                text = f"""📚 *Факты:* {pav['emoji']} {pav['name']}
+# ФАКТЫ ПАВИЛЬОНА
+@router.route("facts_pav", int)
+async def show_pavilion_facts(query, context, pav_id: int):
+    user_id = query.from_user.id
+    user = await database.get_user_snapshot(user_id)
+    text, keyboard = screens.render_pavilion_facts(pav_id, user.facts_mask)
 
-━━━━━━━━━━━━━━━━━━━━
+    await edit_message(
+        query,
+        text=text,
+        reply_markup=keyboard,
+        parse_mode='Markdown'
+    )
 
-📊 *Собрано:* {count}/{total} {'✅' if count == total else '📝'}
-{facts_progress}
+# СТАТИСТИКА
+@router.route("stats")
+async def show_stats(query, context):
+    user_id = query.from_user.id
+    user = await database.get_user_snapshot(user_id)
 
-━━━━━━━━━━━━━━━━━━━━
+    pavilions_progress = create_progress_bar(user.pavilions_count, 7)
+    facts_progress = create_progress_bar(user.facts_count, 75)
 
-"""
-                for i, fact in enumerate(collected_pav_facts, 1):
-                    text += f"💡 *Факт {i}:*\n\"{fact['text']}\"\n\n"
-                    if i < len(collected_pav_facts):
-                        text += "━━━━━━━━━━━━━━━━━━━━\n\n"
-            
-            keyboard = [[InlineKeyboardButton("⬅️ К павильонам", callback_data="facts_menu")]]
-            
-            await query.edit_message_text(
-                text=text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-        
-        # СТАТИСТИКА
-        elif action == "stats":
-            user_id = query.from_user.id
-            stats = await database.get_user_stats(user_id)
-            open_pavilions = await database.get_open_pavilions(user_id)
-            
-            pavilions_progress = create_progress_bar(stats['pavilions_open'], 7)
-            facts_progress = create_progress_bar(stats['facts_collected'], 75)
-            
-            text = f"""📊✨ *Твоя статистика* ✨📊
+    text = f"""📊✨ *Твоя статистика* ✨📊
 
 ━━━━━━━━━━━━━━━━━━━━
 
-💰 *Всего заработано:* {format_coins(stats['coins_earned'])}
-👥 *Посетителей обслужено:* {stats['guests_served']}
+💰 *Всего заработано:* {format_coins(user.coins)}
+👥 *Посетителей обслужено:* {user.guests_served}
 
 ━━━━━━━━━━━━━━━━━━━━
 
-🎪 *Павильонов открыто:* {stats['pavilions_open']}/7
+🎪 *Павильонов открыто:* {user.pavilions_count}/7
 {pavilions_progress}
 
-📚 *Фактов собрано:* {stats['facts_collected']}/75
+📚 *Фактов собрано:* {user.facts_count}/75
 {facts_progress}
 
 ━━━━━━━━━━━━━━━━━━━━
 
-🔥 *Заданий выполнено:* {stats['tasks_completed']}"""
-            
-            keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data="collection")]]
-            
-            await query.edit_message_text(
-                text=text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-    except BadRequest as e:
-        # Ошибка редактирования сообщения (например, сообщение не изменилось)
-        log_error(e, f"button_handler BadRequest action={action}")
-        try:
-            await query.answer("⚠️ Сообщение уже обновлено", show_alert=False)
-        except:
-            pass
-    except RetryAfter as e:
-        # Превышен лимит запросов
-        log_error(e, f"button_handler RetryAfter action={action}")
-        try:
-            await query.answer(f"⏳ Слишком много запросов. Подожди {e.retry_after} сек.", show_alert=True)
-        except:
-            pass
-    except (NetworkError, TimedOut) as e:
-        # Проблемы с сетью
-        log_error(e, f"button_handler NetworkError action={action}")
-        try:
-            await query.answer("🌐 Проблемы с сетью. Попробуй позже.", show_alert=True)
-        except:
-            pass
-    except Exception as e:
-        # Другие ошибки
-        log_error(e, f"button_handler action={action}")
-        try:
-            await query.answer("❌ Произошла ошибка. Попробуйте позже.", show_alert=True)
-        except:
-            pass
+🔥 *Заданий выполнено:* {user.tasks_completed}"""
+
+    await edit_message(
+        query,
+        text=text,
+        reply_markup=keyboards.back_to_collection_keyboard(),
+        parse_mode='Markdown'
+    )
+
+for _action in SCREEN_ACTIONS:
+    router.add_timing_hook(log_slow_screen, _action)
 
 async def complete_task(query, task_id: int):
     """Завершение задания и начисление награды"""
-    task = await database.get_task(task_id)
+    task = CATALOG.task(task_id)
     if not task:
         log_warning(f"Task not found in complete_task", {"task_id": task_id})
         await query.answer("❌ Задание не найдено", show_alert=True)
         return
     
-    pav = await database.get_pavilion(task['pavilion_id'])
+    pav = CATALOG.pavilion(task.pavilion_id)
     if not pav:
-        log_warning(f"Pavilion not found in complete_task", {"pavilion_id": task.get('pavilion_id')})
+        log_warning(f"Pavilion not found in complete_task", {"pavilion_id": task.pavilion_id})
         await query.answer("❌ Павильон не найден", show_alert=True)
         return
     
     user_id = query.from_user.id
     
-    # Начисляем награду
-    await database.add_coins(user_id, pav['reward'])
-    await database.increment_tasks_completed(user_id)
-    await database.increment_guests_served(user_id)
-    
-    new_coins = await database.get_user_coins(user_id)
+    # Начисляем награду и счетчики одной транзакцией
+    new_coins = await database.complete_task_reward(user_id, task_id)
     
     # Сообщения успеха для разных заданий
     success_messages = {
@@ -962,7 +606,7 @@ async def complete_task(query, task_id: int):
         38: "Чай заварен как надо — ароматный, согревающий, с легкой остротой имбиря. Посетитель доволен! 😊"
     }
     
-    success_msg = success_messages.get(task_id, f"✅ Отлично! {task['name']} выполнено!")
+    success_msg = success_messages.get(task_id, f"✅ Отлично! {task.name} выполнено!")
     
     # Анимация успеха
     success_emojis = ["🎉", "✨", "🌟", "💫", "⭐"]
@@ -972,27 +616,65 @@ async def complete_task(query, task_id: int):
 
 ━━━━━━━━━━━━━━━━━━━━
 
-💰 *Награда:* +{format_coins(pav['reward'])}
+💰 *Награда:* +{format_coins(pav.reward)}
 🍊 *Всего:* {format_coins(new_coins)}
 
 ━━━━━━━━━━━━━━━━━━━━
 
 📚 *Хочешь узнать интересный факт?*"""
     
-    keyboard = [[InlineKeyboardButton("📚 Узнать факт", callback_data=f"fact:{pav['id']}:{task_id}")]]
-    
-    await query.edit_message_text(
+    await edit_message(
+        query,
         text=text,
-        reply_markup=InlineKeyboardMarkup(keyboard),
+        reply_markup=keyboards.task_reward_keyboard(pav.id, task_id),
         parse_mode='Markdown'
     )
     
-    log_info(f"Task completed", {"user_id": user_id, "task_id": task_id, "reward": pav['reward']})
+    log_info(f"Task completed", {"user_id": user_id, "task_id": task_id, "reward": pav.reward})
     
     # Удаляем состояние задания
-    state_key = f"{user_id}:{task_id}"
-    if state_key in tasks_handler.task_states:
-        del tasks_handler.task_states[state_key]
+    tasks_handler.task_states.pop((user_id, task_id))
+
+async def run_webhook(application: Application):
+    """Работа через webhook: обновления приходят во встроенный HTTP-сервер
+
+    Повторяет жизненный цикл run_polling, только вместо Updater очередь
+    обновлений наполняет WebhookServer. При остановке сервер перестаёт
+    принимать запросы, а application.stop() дообрабатывает уже принятые.
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    server = WebhookServer(application, ready_check=database.pool_is_open)
+    try:
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await server.start()
+        if WEBHOOK_URL:
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL,
+                secret_token=WEBHOOK_SECRET,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=True  # Игнорируем старые обновления при перезапуске
+            )
+            log_info("Webhook зарегистрирован", {"url": WEBHOOK_URL})
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        log_info("Статистика webhook", server.stats())
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
 
 def main():
     """Запуск бота"""
@@ -1000,15 +682,26 @@ def main():
         log_info("=" * 50)
         log_info("🎄 Бот 'Московская зимняя ярмарка' запускается...")
         
-        # Инициализация
-        log_info("Инициализация базы данных...")
-        asyncio.run(init())
-        log_info("База данных инициализирована")
-        
         # Создание приложения
+        # База данных открывается в post_init, чтобы пул соединений жил в цикле событий бота.
+        # Обновления разных игроков обрабатываются параллельно, одного игрока — по очереди
         log_info("Создание приложения...")
         bot_token = get_bot_token()  # Проверка токена при запуске
-        application = Application.builder().token(bot_token).build()
+        if BOT_MODE not in ("polling", "webhook"):
+            raise ValueError(f"Неизвестный BOT_MODE: {BOT_MODE} (ожидается polling или webhook)")
+        if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+            raise ValueError("Для BOT_MODE=webhook задайте WEBHOOK_SECRET")
+        builder = (
+            Application.builder()
+            .token(bot_token)
+            .concurrent_updates(UserOrderedUpdateProcessor(CONCURRENT_UPDATES))
+            .post_init(init)
+            .post_shutdown(shutdown)
+        )
+        if BOT_MODE == "webhook":
+            # Обновления принимает WebhookServer, долгий опрос не нужен
+            builder = builder.updater(None)
+        application = builder.build()
         
         # Регистрация обработчиков
         # Порядок важен: более специфичные обработчики должны быть первыми
@@ -1023,10 +716,13 @@ def main():
         print("📡 Ожидание обновлений...")
         print(f"📝 Логи: logs/bot_{datetime.now().strftime('%Y-%m-%d')}.log")
         
-        application.run_polling(
-            allowed_updates=Update.ALL_TYPES,
-            drop_pending_updates=True  # Игнорируем старые обновления при перезапуске
-        )
+        if BOT_MODE == "webhook":
+            asyncio.run(run_webhook(application))
+        else:
+            application.run_polling(
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=True  # Игнорируем старые обновления при перезапуске
+            )
     except KeyboardInterrupt:
         log_info("Бот остановлен пользователем")
         print("\n⏹ Бот остановлен")
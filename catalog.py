@@ -0,0 +1,176 @@
+"""Неизменяемый справочник игры: павильоны, задания и факты в памяти"""
+
+from types import MappingProxyType
+import game_data
+
+# Прогресс хранится в колонках SQLite INTEGER (64 бита со знаком), по слову
+# маски на колонку: у павильонов одна колонка (ID 1..64), у фактов две (ID 1..128)
+MASK_WORD_BITS = 64
+PAVILION_MASK_WORDS = 1
+FACT_MASK_WORDS = 2
+
+_WORD = (1 << MASK_WORD_BITS) - 1
+_SIGN = 1 << (MASK_WORD_BITS - 1)
+
+def id_bit(item_id: int) -> int:
+    """Бит павильона или факта в маске прогресса"""
+    if item_id < 1:
+        raise ValueError(f"ID {item_id} не может быть битом маски прогресса")
+    return 1 << (item_id - 1)
+
+def mask_words(mask: int, words: int) -> tuple:
+    """Маска прогресса в значениях колонок INTEGER, младшее слово первым"""
+    if mask < 0 or mask >> (MASK_WORD_BITS * words):
+        raise ValueError(f"Маска не помещается в {words} слов по {MASK_WORD_BITS} бит")
+    values = []
+    for _ in range(words):
+        word = mask & _WORD
+        values.append(word - (1 << MASK_WORD_BITS) if word & _SIGN else word)
+        mask >>= MASK_WORD_BITS
+    return tuple(values)
+
+def words_mask(values) -> int:
+    """Маска прогресса из значений колонок INTEGER (обратно к mask_words)"""
+    mask = 0
+    for index, word in enumerate(values):
+        mask |= (word & _WORD) << (MASK_WORD_BITS * index)
+    return mask
+
+def id_word(item_id: int) -> tuple:
+    """Слово маски с битом ID и значение этого бита в колонке: (номер слова, бит)"""
+    index = (item_id - 1) // MASK_WORD_BITS
+    return index, mask_words(id_bit(item_id) >> (MASK_WORD_BITS * index), 1)[0]
+
+def _check_ids(items, words: int, kind: str):
+    limit = MASK_WORD_BITS * words
+    for item in items:
+        if not 1 <= item["id"] <= limit:
+            raise ValueError(f"ID {kind} {item['id']} не помещается в маску прогресса (1..{limit})")
+
+def popcount(mask: int) -> int:
+    """Количество установленных битов маски"""
+    return bin(mask).count("1")
+
+def mask_ids(mask: int) -> list:
+    """ID, установленные в маске, по возрастанию"""
+    ids = []
+    while mask:
+        low = mask & -mask
+        ids.append(low.bit_length())
+        mask ^= low
+    return ids
+
+
+class _Record:
+    """Базовая неизменяемая запись справочника"""
+
+    __slots__ = ()
+
+    def __init__(self, data: dict):
+        for name in self.__slots__:
+            object.__setattr__(self, name, data[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} нельзя изменять")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} нельзя изменять")
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={self.id}, name={getattr(self, 'name', '')!r})"
+
+
+class Pavilion(_Record):
+    """Павильон ярмарки"""
+
+    __slots__ = ("id", "name", "emoji", "location", "price", "reward",
+                 "description", "atmosphere", "tasks_count", "bit")
+
+
+class Task(_Record):
+    """Задание павильона"""
+
+    __slots__ = ("id", "pavilion_id", "name", "emoji", "type", "reward", "fact_id")
+
+
+class Fact(_Record):
+    """Факт о Москве"""
+
+    __slots__ = ("id", "pavilion_id", "text", "bit")
+
+
+class Catalog:
+    """Справочник игры с поиском по ID за O(1)
+
+    Строится один раз из PAVILIONS_DATA/TASKS_DATA/FACTS_DATA и дальше не
+    меняется, поэтому обработчики читают его без обращений к базе.
+    """
+
+    __slots__ = ("pavilions", "tasks", "facts", "all_pavilions_mask", "all_facts_mask",
+                 "_pavilions", "_tasks", "_facts", "_pavilion_tasks", "_pavilion_facts",
+                 "_pavilion_fact_masks")
+
+    def __init__(self, pavilions_data, tasks_data, facts_data):
+        _check_ids(pavilions_data, PAVILION_MASK_WORDS, "павильона")
+        _check_ids(facts_data, FACT_MASK_WORDS, "факта")
+        pavilions = tuple(sorted((Pavilion(dict(p, bit=id_bit(p["id"]))) for p in pavilions_data),
+                                 key=lambda p: p.id))
+        tasks = tuple(sorted((Task(t) for t in tasks_data), key=lambda t: t.id))
+        facts = tuple(sorted((Fact(dict(f, bit=id_bit(f["id"]))) for f in facts_data),
+                             key=lambda f: f.id))
+
+        pavilion_tasks = {pav.id: [] for pav in pavilions}
+        for task in tasks:
+            pavilion_tasks.setdefault(task.pavilion_id, []).append(task)
+        pavilion_facts = {pav.id: [] for pav in pavilions}
+        for fact in facts:
+            pavilion_facts.setdefault(fact.pavilion_id, []).append(fact)
+
+        set_field = object.__setattr__
+        set_field(self, "pavilions", pavilions)
+        set_field(self, "tasks", tasks)
+        set_field(self, "facts", facts)
+        set_field(self, "_pavilions", MappingProxyType({p.id: p for p in pavilions}))
+        set_field(self, "_tasks", MappingProxyType({t.id: t for t in tasks}))
+        set_field(self, "_facts", MappingProxyType({f.id: f for f in facts}))
+        set_field(self, "_pavilion_tasks",
+                  MappingProxyType({k: tuple(v) for k, v in pavilion_tasks.items()}))
+        set_field(self, "_pavilion_facts",
+                  MappingProxyType({k: tuple(v) for k, v in pavilion_facts.items()}))
+        # Маски фактов каждого павильона: прогресс по павильону — это facts_mask & маска
+        set_field(self, "_pavilion_fact_masks", MappingProxyType({
+            k: sum(f.bit for f in v) for k, v in pavilion_facts.items()
+        }))
+        set_field(self, "all_pavilions_mask", sum(p.bit for p in pavilions))
+        set_field(self, "all_facts_mask", sum(f.bit for f in facts))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Catalog нельзя изменять")
+
+    def pavilion(self, pavilion_id: int):
+        """Павильон по ID или None"""
+        return self._pavilions.get(pavilion_id)
+
+    def task(self, task_id: int):
+        """Задание по ID или None"""
+        return self._tasks.get(task_id)
+
+    def fact(self, fact_id: int):
+        """Факт по ID или None"""
+        return self._facts.get(fact_id)
+
+    def pavilion_tasks(self, pavilion_id: int) -> tuple:
+        """Задания павильона в порядке ID"""
+        return self._pavilion_tasks.get(pavilion_id, ())
+
+    def pavilion_facts(self, pavilion_id: int) -> tuple:
+        """Факты павильона в порядке ID"""
+        return self._pavilion_facts.get(pavilion_id, ())
+
+    def pavilion_fact_mask(self, pavilion_id: int) -> int:
+        """Маска всех фактов павильона"""
+        return self._pavilion_fact_masks.get(pavilion_id, 0)
+
+
+# Справочник строится один раз при импорте (при старте бота)
+CATALOG = Catalog(game_data.PAVILIONS_DATA, game_data.TASKS_DATA, game_data.FACTS_DATA)
@@ -0,0 +1,463 @@
+"""Кластер процессов-обработчиков с разбиением игроков по user_id
+
+Один процесс python bot.py занимает одно ядро. python cluster.py запускает
+CLUSTER_WORKERS процессов bot.py (BOT_MODE=webhook на локальных портах
+CLUSTER_BASE_PORT + номер) и сам принимает обновления от Telegram:
+webhook-ом на WEBHOOK_PORT или долгим опросом — по BOT_MODE. Обновление
+пересылается процессу user_id % CLUSTER_WORKERS, поэтому все нажатия
+игрока обрабатывает один процесс и строго по очереди, а кэши, состояния
+заданий и таймеры игрока живут только в этом процессе.
+
+База общая: SQLite в режиме WAL, у каждого процесса свой писатель, а
+блокировки между процессами ждут busy_timeout. Строки игрока пишет только
+его процесс, поэтому кэш пользователей внутри процесса остаётся верным.
+Схема базы создаётся и переносится один раз, до запуска процессов.
+"""
+
+import asyncio
+import os
+import secrets
+import signal
+import sys
+from telegram import Bot, Update
+from telegram.error import NetworkError, TimedOut
+from config import (
+    get_bot_token, BOT_MODE, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_MAX_CONNECTIONS,
+    CLUSTER_WORKERS, CLUSTER_BASE_PORT, CLUSTER_QUEUE_SIZE, CLUSTER_RESTART_DELAY,
+    SEND_GLOBAL_RATE, SEND_GLOBAL_BURST, EVENT_SNAPSHOT_INTERVAL, MIGRATION_IN_BACKGROUND,
+)
+import database
+import game_data
+from update_processor import update_user_id
+from webhook import WebhookListener, HTTPError, SECRET_HEADER
+from logger import log_info, log_warning, log_error
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+
+# Путь webhook внутри кластера (процессы слушают только 127.0.0.1)
+WORKER_PATH = "/telegram"
+
+# Сколько ждать готовности процессов при запуске, ответа процесса на
+# пересылку и завершения процессов при остановке (сек)
+START_TIMEOUT = 60
+FORWARD_TIMEOUT = 30
+STOP_TIMEOUT = 30
+
+# Таймаут долгого опроса getUpdates (сек)
+POLL_TIMEOUT = 30
+
+
+def shard_for(update: Update, workers: int) -> int:
+    """Номер процесса для обновления: по user_id, без пользователя — по update_id"""
+    user_id = update_user_id(update)
+    key = user_id if user_id is not None else update.update_id
+    return key % workers
+
+
+async def read_response(reader) -> int:
+    """Прочитать HTTP-ответ и вернуть его код"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    if length:
+        await reader.readexactly(length)
+    return status
+
+
+class WorkerBusy(Exception):
+    """Процесс ответил 5xx: обновление нужно переслать ещё раз"""
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class WorkerChannel:
+    """Упорядоченная пересылка обновлений одному процессу
+
+    Обновления уходят по одному постоянному соединению в порядке прихода,
+    пачками по BATCH запросов (конвейер HTTP/1.1). Если процесс недоступен
+    (например, перезапускается) или занят (ответ 5xx, например 503 при
+    переполненной очереди), неподтверждённая часть пачки повторяется после
+    переподключения с растущей паузой: Telegram уже получил ответ 200, и
+    обновление игрока не должно потеряться. Доставка — «хотя бы раз»:
+    часть конвейера за отклонённым запросом процесс мог уже принять, и
+    такие повторы процесс отбрасывает по update_id (см. WebhookServer).
+    Выбрасываются только обновления, отклонённые с кодом 4xx.
+    """
+
+    BATCH = 64
+    RETRY_DELAY = 0.5
+    MAX_RETRY_DELAY = 10
+
+    def __init__(self, index: int, port: int, secret: str, queue_size: int = CLUSTER_QUEUE_SIZE):
+        self.index = index
+        self.port = port
+        self.secret = secret
+        self.queue = asyncio.Queue(queue_size)
+        self.online = False
+        self._reader = None
+        self._writer = None
+        self._task = None
+        self.forwarded = 0
+        self.dropped = 0
+        self.retried = 0
+        self.reconnects = 0
+
+    def submit(self, body: bytes) -> bool:
+        """Поставить обновление в очередь; False, если очередь заполнена"""
+        try:
+            self.queue.put_nowait(body)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._disconnect()
+
+    async def _run(self):
+        batch = []
+        delay = self.RETRY_DELAY
+        while True:
+            if self._writer is None:
+                try:
+                    await self._connect()
+                except OSError:
+                    self.online = False
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.MAX_RETRY_DELAY)
+                    continue
+            if not batch:
+                batch.append(await self.queue.get())
+                while len(batch) < self.BATCH and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+            try:
+                await self._send(batch)
+            except WorkerBusy as e:
+                # Ответы на остаток конвейера не читаем: пачка уйдёт заново по новому соединению
+                self._disconnect()
+                self.retried += 1
+                log_warning("Процесс-обработчик занят, повтор", {"worker": self.index, "status": e.status})
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.MAX_RETRY_DELAY)
+            except (OSError, ValueError, IndexError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                self._disconnect()
+                self.online = False
+                self.retried += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.MAX_RETRY_DELAY)
+            else:
+                delay = self.RETRY_DELAY
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection("127.0.0.1", self.port)
+        self.reconnects += 1
+        self.online = True
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _send(self, batch: list):
+        """Отправить пачку; подтверждённые обновления удаляются из batch
+
+        На ответ 5xx бросает WorkerBusy: обновление остаётся в начале batch.
+        """
+        requests = []
+        for body in batch:
+            head = (
+                f"POST {WORKER_PATH} HTTP/1.1\r\n"
+                "Host: 127.0.0.1\r\n"
+                "Content-Type: application/json\r\n"
+                f"{SECRET_HEADER}: {self.secret}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "\r\n"
+            )
+            requests.append(head.encode("latin-1") + body)
+        self._writer.write(b"".join(requests))
+        await self._writer.drain()
+        while batch:
+            status = await asyncio.wait_for(read_response(self._reader), FORWARD_TIMEOUT)
+            if status >= 500:
+                raise WorkerBusy(status)
+            batch.pop(0)
+            self.queue.task_done()
+            if status == 200:
+                self.forwarded += 1
+            else:
+                self.dropped += 1
+                log_warning("Процесс-обработчик отклонил обновление", {"worker": self.index, "status": status})
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "online": self.online,
+            "forwarded": self.forwarded,
+            "dropped": self.dropped,
+            "retried": self.retried,
+            "reconnects": self.reconnects,
+        }
+
+
+class WorkerProcess:
+    """Процесс bot.py в режиме webhook на локальном порту; перезапускается при падении
+
+    Общий лимит исходящих сообщений бота делится между процессами поровну
+    (лимит на чат не меняется: чат игрока обслуживает один процесс), а
+    журнал событий сворачивает только процесс 0.
+    """
+
+    def __init__(self, index: int, port: int, secret: str, workers: int = 1):
+        self.index = index
+        self.port = port
+        self.secret = secret
+        self.workers = workers
+        self.process = None
+        self.restarts = 0
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    def environment(self) -> dict:
+        env = dict(os.environ)
+        env.update(
+            BOT_MODE="webhook",
+            WEBHOOK_LISTEN="127.0.0.1",
+            WEBHOOK_PORT=str(self.port),
+            WEBHOOK_PATH=WORKER_PATH,
+            WEBHOOK_SECRET=self.secret,
+            # Webhook в Telegram регистрирует только супервизор
+            WEBHOOK_URL="",
+            SEND_GLOBAL_RATE=str(SEND_GLOBAL_RATE / self.workers),
+            SEND_GLOBAL_BURST=str(max(1.0, SEND_GLOBAL_BURST / self.workers)),
+            EVENT_SNAPSHOT_INTERVAL=str(EVENT_SNAPSHOT_INTERVAL if self.index == 0 else 0),
+            # Переносы миграций идут в одном процессе, остальные ждут их окончания
+            MIGRATION_IN_BACKGROUND="1" if MIGRATION_IN_BACKGROUND and self.index == 0 else "0",
+        )
+        return env
+
+    async def run(self, stopping: asyncio.Event):
+        while not stopping.is_set():
+            self.process = await asyncio.create_subprocess_exec(sys.executable, BOT_SCRIPT, env=self.environment())
+            log_info("Процесс-обработчик запущен", {"worker": self.index, "pid": self.process.pid, "port": self.port})
+            code = await self.process.wait()
+            if stopping.is_set():
+                break
+            self.restarts += 1
+            log_warning("Процесс-обработчик завершился, перезапуск", {"worker": self.index, "code": code})
+            await asyncio.sleep(CLUSTER_RESTART_DELAY)
+
+    async def ready(self) -> bool:
+        """Ответил ли процесс 200 на /readyz"""
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        except OSError:
+            return False
+        try:
+            writer.write(b"GET /readyz HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            return await asyncio.wait_for(read_response(reader), FORWARD_TIMEOUT) == 200
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            return False
+        finally:
+            writer.close()
+
+    async def stop(self):
+        if not self.running:
+            return
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(self.process.wait(), STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            log_warning("Процесс-обработчик не завершился, принудительная остановка", {"worker": self.index})
+            self.process.kill()
+            await self.process.wait()
+
+
+class ClusterFront(WebhookListener):
+    """Вход кластера: webhook, который пересылает обновления процессам"""
+
+    def __init__(self, supervisor, **kwargs):
+        super().__init__(**kwargs)
+        self.supervisor = supervisor
+
+    def ready(self) -> bool:
+        return self.serving and self.supervisor.ready()
+
+    async def deliver(self, data: dict, body: bytes) -> bool:
+        try:
+            update = Update.de_json(data, None)
+        except (ValueError, TypeError, KeyError):
+            return False
+        if update is None:
+            return False
+        if not self.supervisor.route(update).submit(body):
+            # Telegram повторит запрос позже
+            raise HTTPError(503)
+        return True
+
+
+class Supervisor:
+    """Запуск процессов-обработчиков и раздача им обновлений"""
+
+    def __init__(self, workers: int = CLUSTER_WORKERS, base_port: int = CLUSTER_BASE_PORT,
+                 mode: str = BOT_MODE, front_options: dict = None):
+        if workers < 1:
+            raise ValueError("CLUSTER_WORKERS должно быть не меньше 1")
+        if mode not in ("polling", "webhook"):
+            raise ValueError(f"Неизвестный BOT_MODE: {mode} (ожидается polling или webhook)")
+        # Секрет между супервизором и процессами: свой на каждый запуск
+        secret = secrets.token_urlsafe(32)
+        self.mode = mode
+        self.workers = [WorkerProcess(i, base_port + i, secret, workers) for i in range(workers)]
+        self.channels = [WorkerChannel(i, base_port + i, secret) for i in range(workers)]
+        self.front = ClusterFront(self, **(front_options or {})) if mode == "webhook" else None
+        self.stopping = asyncio.Event()
+        self._tasks = []
+
+    def route(self, update: Update) -> WorkerChannel:
+        return self.channels[shard_for(update, len(self.channels))]
+
+    def ready(self) -> bool:
+        return all(worker.running for worker in self.workers) and all(
+            channel.online and not channel.queue.full() for channel in self.channels
+        )
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stopping.set)
+            except NotImplementedError:
+                pass
+
+        await prepare_database()
+        try:
+            for worker in self.workers:
+                self._tasks.append(asyncio.ensure_future(worker.run(self.stopping)))
+            await self._wait_workers()
+            for channel in self.channels:
+                channel.start()
+            log_info("Кластер запущен", {"workers": len(self.workers), "mode": self.mode})
+
+            if self.mode == "webhook":
+                await self.front.start()
+                if WEBHOOK_URL:
+                    async with Bot(get_bot_token()) as bot:
+                        await bot.set_webhook(
+                            url=WEBHOOK_URL,
+                            secret_token=WEBHOOK_SECRET,
+                            max_connections=WEBHOOK_MAX_CONNECTIONS,
+                            allowed_updates=Update.ALL_TYPES,
+                            drop_pending_updates=True
+                        )
+                    log_info("Webhook зарегистрирован", {"url": WEBHOOK_URL})
+                await self.stopping.wait()
+            else:
+                poller = asyncio.ensure_future(self._poll())
+                self._tasks.append(poller)
+                await self.stopping.wait()
+                poller.cancel()
+        finally:
+            await self._shutdown()
+
+    async def _wait_workers(self):
+        deadline = asyncio.get_running_loop().time() + START_TIMEOUT
+        pending = list(self.workers)
+        while pending and asyncio.get_running_loop().time() < deadline and not self.stopping.is_set():
+            ready = await asyncio.gather(*(worker.ready() for worker in pending))
+            pending = [worker for worker, ok in zip(pending, ready) if not ok]
+            if pending:
+                await asyncio.sleep(0.2)
+        if pending:
+            log_warning("Не все процессы-обработчики готовы", {"workers": [w.index for w in pending]})
+
+    async def _poll(self):
+        """Долгий опрос getUpdates в супервизоре"""
+        async with Bot(get_bot_token()) as bot:
+            await bot.delete_webhook(drop_pending_updates=True)
+            offset = None
+            while True:
+                try:
+                    updates = await bot.get_updates(
+                        offset=offset, timeout=POLL_TIMEOUT, allowed_updates=Update.ALL_TYPES
+                    )
+                except (NetworkError, TimedOut) as e:
+                    log_warning("Ошибка getUpdates", {"error": str(e)})
+                    await asyncio.sleep(1)
+                    continue
+                for update in updates:
+                    await self.route(update).queue.put(update.to_json().encode())
+                    offset = update.update_id + 1
+
+    async def _shutdown(self):
+        """Остановить приём, дослать очереди и завершить процессы"""
+        self.stopping.set()
+        if self.front is not None:
+            await self.front.stop()
+            log_info("Статистика webhook", self.front.stats())
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(channel.queue.join() for channel in self.channels)), STOP_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            log_warning("Не все обновления переданы процессам",
+                        {"queued": sum(channel.queue.qsize() for channel in self.channels)})
+        for channel in self.channels:
+            await channel.stop()
+        await asyncio.gather(*(worker.stop() for worker in self.workers))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        log_info("Статистика кластера", self.stats())
+
+    def stats(self) -> dict:
+        return {
+            f"worker_{worker.index}": dict(channel.stats(), restarts=worker.restarts)
+            for worker, channel in zip(self.workers, self.channels)
+        }
+
+
+async def prepare_database():
+    """Создать схему пустой базы (или применить изменения схемы) один раз, до запуска процессов"""
+    await database.open_pool()
+    try:
+        await database.init_db()
+        await game_data.load_game_data()
+    finally:
+        await database.close_pool()
+
+
+async def run_cluster():
+    # Очереди и события создаются внутри работающего цикла событий
+    await Supervisor().run()
+
+def main():
+    """Запуск кластера"""
+    try:
+        asyncio.run(run_cluster())
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        log_error(e, "cluster")
+        print(f"❌ КРИТИЧЕСКАЯ ОШИБКА: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -29,3 +29,105 @@ DATABASE_PATH = "winter_fair.db"
 # Стартовый капитал
 STARTING_COINS = 50
 
+
+# Количество соединений для чтения в пуле базы данных (писатель всегда один)
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+
+# Профиль хранения SQLite: применяется к каждому соединению при открытии
+# и проверяется при запуске бота (см. database.check_storage_profile)
+DB_STORAGE_PROFILE = {
+    # WAL: читатели не ждут писателя, commit не блокирует чтение
+    "journal_mode": os.getenv("DB_JOURNAL_MODE", "WAL"),
+    # NORMAL в режиме WAL: fsync только при checkpoint, а не на каждый commit
+    "synchronous": os.getenv("DB_SYNCHRONOUS", "NORMAL"),
+    # Размер отображения файла в память, байт
+    "mmap_size": int(os.getenv("DB_MMAP_SIZE", str(64 * 1024 * 1024))),
+    # Размер кэша страниц: отрицательное значение — в КиБ
+    "cache_size": int(os.getenv("DB_CACHE_SIZE", "-16000")),
+    # Сколько ждать освобождения блокировки, мс
+    "busy_timeout": int(os.getenv("DB_BUSY_TIMEOUT", "5000")),
+    # Временные таблицы и индексы — в памяти
+    "temp_store": os.getenv("DB_TEMP_STORE", "MEMORY"),
+}
+
+# Кэш состояния пользователей в памяти: бюджет памяти (байт) и время жизни записи (сек)
+USER_CACHE_MAX_BYTES = int(os.getenv("USER_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "600"))
+
+# Отложенная запись счётчиков игроков (мандаринки, задания, гости): изменения копятся в памяти
+# и записываются одной транзакцией раз в WRITE_BEHIND_INTERVAL_MS или когда наберётся
+# WRITE_BEHIND_MAX_OPS изменений. Интервал — наибольшее окно потери при аварийном
+# завершении процесса; 0 — записывать каждое изменение сразу
+WRITE_BEHIND_INTERVAL_MS = int(os.getenv("WRITE_BEHIND_INTERVAL_MS", "200"))
+WRITE_BEHIND_MAX_OPS = int(os.getenv("WRITE_BEHIND_MAX_OPS", "500"))
+
+# Журнал событий игроков: как часто сворачивать новые события в строки users (сек,
+# 0 — не сворачивать в этом процессе) и сколько игроков сворачивать в одной транзакции
+EVENT_SNAPSHOT_INTERVAL = float(os.getenv("EVENT_SNAPSHOT_INTERVAL", "30"))
+EVENT_SNAPSHOT_BATCH = int(os.getenv("EVENT_SNAPSHOT_BATCH", "500"))
+
+# Миграции схемы (migrations.py): сколько пользователей переносить в одной транзакции
+# и сколько ждать между порциями (мс), чтобы перенос не занимал писателя базы подряд
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "500"))
+MIGRATION_BATCH_PAUSE_MS = int(os.getenv("MIGRATION_BATCH_PAUSE_MS", "20"))
+# Запускать ли переносы в фоне бота (в кластере — только в первом процессе) и как
+# часто остальные процессы проверяют, закончены ли они (сек)
+MIGRATION_IN_BACKGROUND = os.getenv("MIGRATION_IN_BACKGROUND", "1") == "1"
+MIGRATION_POLL_INTERVAL = float(os.getenv("MIGRATION_POLL_INTERVAL", "10"))
+
+# Сколько отрисованных экранов (карта, меню фактов, факты павильона) хранить в LRU-кэше каждого вида
+SCREEN_CACHE_SIZE = int(os.getenv("SCREEN_CACHE_SIZE", "4096"))
+
+# Для скольких сообщений помнить последнее отправленное содержимое (повторные правки не отправляются)
+MESSAGE_FINGERPRINTS_MAX = int(os.getenv("MESSAGE_FINGERPRINTS_MAX", "100000"))
+
+# Лимиты исходящих правок сообщений (ведро токенов): сообщений в секунду и запас на всплеск
+# для всего бота и для одного чата; сколько раз повторять правку после RetryAfter
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_GLOBAL_BURST = float(os.getenv("SEND_GLOBAL_BURST", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", "3"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+
+# Как получать обновления: polling (долгий опрос) или webhook (встроенный HTTP-сервер, см. webhook.py)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# webhook: адрес и порт HTTP-сервера, путь для обновлений и секрет заголовка X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Публичный адрес для setWebhook (https://домен/путь); пустой — webhook регистрируется вне бота
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+# Сколько соединений Telegram может держать с ботом одновременно (1–100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+# Максимальный размер тела запроса (байт) и очередь необработанных обновлений, после которой /readyz отвечает 503
+WEBHOOK_MAX_BODY = int(os.getenv("WEBHOOK_MAX_BODY", str(1024 * 1024)))
+WEBHOOK_MAX_BACKLOG = int(os.getenv("WEBHOOK_MAX_BACKLOG", "10000"))
+# Для скольких последних update_id помнить, что они уже приняты (повторы не обрабатываются)
+WEBHOOK_RECENT_UPDATES = int(os.getenv("WEBHOOK_RECENT_UPDATES", "10000"))
+
+# Кластер (python cluster.py): число процессов-обработчиков, первый из их локальных портов,
+# очередь пересылки на процесс и пауза перед перезапуском упавшего процесса (сек)
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", str(os.cpu_count() or 1)))
+CLUSTER_BASE_PORT = int(os.getenv("CLUSTER_BASE_PORT", "8100"))
+CLUSTER_QUEUE_SIZE = int(os.getenv("CLUSTER_QUEUE_SIZE", "10000"))
+CLUSTER_RESTART_DELAY = float(os.getenv("CLUSTER_RESTART_DELAY", "1"))
+
+# Порог времени отрисовки экрана (сек), после которого обработчик кнопки попадает в лог
+SLOW_CALLBACK_SECONDS = float(os.getenv("SLOW_CALLBACK_SECONDS", "0.5"))
+
+# Сколько обновлений обрабатывается одновременно (обновления одного пользователя — всегда по очереди)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))
+
+# Состояния начатых заданий: время жизни без активности (сек), лимит записей
+# и период очистки просроченных (сек)
+TASK_STATE_TTL = float(os.getenv("TASK_STATE_TTL", "1800"))
+TASK_STATE_MAX_ENTRIES = int(os.getenv("TASK_STATE_MAX_ENTRIES", "100000"))
+TASK_STATE_SWEEP_INTERVAL = float(os.getenv("TASK_STATE_SWEEP_INTERVAL", "60"))
+
+# Где сохранять состояния начатых заданий между перезапусками: memory, sqlite или redis
+TASK_STATE_BACKEND = os.getenv("TASK_STATE_BACKEND", "sqlite")
+# Как часто сбрасывать изменённые состояния в бэкенд одной пачкой (сек)
+TASK_STATE_FLUSH_INTERVAL = float(os.getenv("TASK_STATE_FLUSH_INTERVAL", "1"))
+# Адрес Redis для TASK_STATE_BACKEND=redis
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
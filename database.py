@@ -1,249 +1,943 @@
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 import aiosqlite
-from config import DATABASE_PATH
+from config import (
+    DATABASE_PATH, DB_READ_POOL_SIZE, DB_STORAGE_PROFILE,
+    USER_CACHE_MAX_BYTES, USER_CACHE_TTL, WRITE_BEHIND_INTERVAL_MS, WRITE_BEHIND_MAX_OPS,
+    EVENT_SNAPSHOT_INTERVAL, EVENT_SNAPSHOT_BATCH,
+)
+from catalog import (
+    CATALOG, MASK_WORD_BITS, PAVILION_MASK_WORDS, FACT_MASK_WORDS, id_bit, id_word, mask_ids, mask_words, words_mask,
+    popcount,
+)
+from logger import log_error
+
+# Допустимые значения PRAGMA профиля хранения и их числовые коды в SQLite
+_JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+_SYNCHRONOUS_LEVELS = {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3}
+_TEMP_STORE_MODES = {"DEFAULT": 0, "FILE": 1, "MEMORY": 2}
+_INT_PRAGMAS = ("busy_timeout", "mmap_size", "cache_size")
+
+def validate_storage_profile(profile: dict) -> dict:
+    """Проверить профиль хранения и привести значения к виду, который применяется к соединению"""
+    journal_mode = str(profile["journal_mode"]).upper()
+    if journal_mode not in _JOURNAL_MODES:
+        raise ValueError(f"Недопустимый journal_mode: {profile['journal_mode']}")
+    synchronous = str(profile["synchronous"]).upper()
+    if synchronous not in _SYNCHRONOUS_LEVELS:
+        raise ValueError(f"Недопустимый synchronous: {profile['synchronous']}")
+    temp_store = str(profile["temp_store"]).upper()
+    if temp_store not in _TEMP_STORE_MODES:
+        raise ValueError(f"Недопустимый temp_store: {profile['temp_store']}")
+    validated = {
+        "journal_mode": journal_mode,
+        "synchronous": synchronous,
+        "temp_store": temp_store,
+    }
+    for name in _INT_PRAGMAS:
+        value = int(profile[name])
+        if name != "cache_size" and value < 0:
+            raise ValueError(f"{name} не может быть отрицательным: {value}")
+        validated[name] = value
+    return validated
+
+
+class ConnectionPool:
+    """Долгоживущие соединения с базой: один писатель и пул читателей
+
+    Соединения открываются один раз при старте бота и переиспользуются всеми
+    запросами, поэтому обработчик кнопки не платит за запуск потока aiosqlite
+    и повторное открытие файла базы.
+    """
+
+    def __init__(self, path: str = DATABASE_PATH, readers: int = DB_READ_POOL_SIZE,
+                 profile: dict = DB_STORAGE_PROFILE):
+        self.path = path
+        self.readers_count = max(1, readers)
+        self.profile = validate_storage_profile(profile)
+        self._writer = None
+        self._write_lock = None
+        self._readers = None
+        self._connections = []
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path)
+        conn.row_factory = aiosqlite.Row
+        self._connections.append(conn)
+        await self._apply_profile(conn)
+        return conn
+
+    async def _apply_profile(self, conn: aiosqlite.Connection):
+        """Применить PRAGMA профиля хранения к соединению"""
+        # busy_timeout первым: смена journal_mode может ждать чужую блокировку
+        await conn.execute(f"PRAGMA busy_timeout = {self.profile['busy_timeout']}")
+        await conn.execute(f"PRAGMA journal_mode = {self.profile['journal_mode']}")
+        await conn.execute(f"PRAGMA synchronous = {self.profile['synchronous']}")
+        await conn.execute(f"PRAGMA mmap_size = {self.profile['mmap_size']}")
+        await conn.execute(f"PRAGMA cache_size = {self.profile['cache_size']}")
+        await conn.execute(f"PRAGMA temp_store = {self.profile['temp_store']}")
+
+    def _expected_pragmas(self) -> dict:
+        """Значения PRAGMA в том виде, в котором их возвращает SQLite"""
+        return {
+            "journal_mode": self.profile["journal_mode"].lower(),
+            "synchronous": _SYNCHRONOUS_LEVELS[self.profile["synchronous"]],
+            "temp_store": _TEMP_STORE_MODES[self.profile["temp_store"]],
+            "mmap_size": self.profile["mmap_size"],
+            "cache_size": self.profile["cache_size"],
+            "busy_timeout": self.profile["busy_timeout"],
+        }
+
+    async def check_profile(self) -> dict:
+        """Сверить фактические PRAGMA всех соединений с профилем
+
+        Возвращает расхождения в виде {pragma: (ожидалось, фактически)}.
+        """
+        mismatches = {}
+        expected = self._expected_pragmas()
+        for conn in self._connections:
+            for name, value in expected.items():
+                cursor = await conn.execute(f"PRAGMA {name}")
+                row = await cursor.fetchone()
+                actual = row[0] if row else None
+                if isinstance(actual, str):
+                    actual = actual.lower()
+                if actual != value:
+                    mismatches[name] = (value, actual)
+        return mismatches
+
+    async def open(self):
+        """Открыть соединение писателя и соединения читателей"""
+        self._write_lock = asyncio.Lock()
+        self._writer = await self._connect()
+        self._readers = asyncio.Queue()
+        for _ in range(self.readers_count):
+            self._readers.put_nowait(await self._connect())
+
+    async def close(self):
+        """Закрыть все соединения пула"""
+        connections, self._connections = self._connections, []
+        self._writer = None
+        self._readers = None
+        for conn in connections:
+            await conn.close()
+
+    @asynccontextmanager
+    async def read(self):
+        """Взять соединение для чтения на время блока"""
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self):
+        """Выполнить блок в транзакции писателя (commit по выходу, rollback при ошибке)"""
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            else:
+                await self._writer.commit()
+
+
+# Глобальный пул соединений (создаётся в bot.init())
+_pool = None
+
+async def open_pool(path: str = DATABASE_PATH, readers: int = DB_READ_POOL_SIZE) -> ConnectionPool:
+    """Открыть глобальный пул соединений"""
+    global _pool
+    if _pool is None:
+        pool = ConnectionPool(path, readers)
+        await pool.open()
+        _pool = pool
+    return _pool
+
+async def close_pool():
+    """Закрыть глобальный пул соединений"""
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.close()
+
+async def check_storage_profile() -> dict:
+    """Проверить, что профиль хранения применён ко всем соединениям пула"""
+    return await get_pool().check_profile()
+
+def pool_is_open() -> bool:
+    """Открыт ли глобальный пул соединений"""
+    return _pool is not None
+
+def get_pool() -> ConnectionPool:
+    """Получить открытый пул соединений"""
+    if _pool is None:
+        raise RuntimeError("Пул соединений не открыт: вызовите database.open_pool()")
+    return _pool
 
 async def init_db():
-    """Инициализация базы данных"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        # Таблица пользователей
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                coins INTEGER DEFAULT 50,
-                pavilions_open TEXT DEFAULT '[]',
-                facts_collected TEXT DEFAULT '[]',
-                tasks_completed INTEGER DEFAULT 0,
-                guests_served INTEGER DEFAULT 0,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Таблица павильонов (справочная)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS pavilions (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                emoji TEXT NOT NULL,
-                location TEXT NOT NULL,
-                price INTEGER NOT NULL,
-                reward INTEGER NOT NULL,
-                description TEXT NOT NULL,
-                atmosphere TEXT NOT NULL,
-                tasks_count INTEGER NOT NULL
-            )
-        """)
-        
-        # Таблица заданий (справочная)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY,
-                pavilion_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                emoji TEXT NOT NULL,
-                type TEXT NOT NULL,
-                reward INTEGER NOT NULL,
-                fact_id INTEGER,
-                FOREIGN KEY (pavilion_id) REFERENCES pavilions(id)
-            )
-        """)
-        
-        # Таблица фактов (справочная)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS facts (
-                id INTEGER PRIMARY KEY,
-                pavilion_id INTEGER NOT NULL,
-                text TEXT NOT NULL,
-                FOREIGN KEY (pavilion_id) REFERENCES pavilions(id)
-            )
-        """)
-        
-        await db.commit()
-
-async def get_user(user_id: int):
-    """Получить пользователя или создать нового"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT * FROM users WHERE user_id = ?",
-            (user_id,)
+    """Инициализация базы данных: схема пустой базы или изменения схемы (см. migrations.check_schema)"""
+    # migrations использует пул и SQL этого модуля, поэтому импорт здесь
+    from migrations import check_schema
+    await check_schema()
+
+class UserRecord:
+    """Снимок состояния пользователя: мандаринки, счетчики и маски прогресса"""
+
+    __slots__ = ("user_id", "coins", "tasks_completed", "guests_served",
+                 "pavilions_mask", "facts_mask", "expires_at")
+
+    def __init__(self, user_id: int, coins: int, tasks_completed: int, guests_served: int,
+                 pavilions_mask: int, facts_mask: int):
+        self.user_id = user_id
+        self.coins = coins
+        self.tasks_completed = tasks_completed
+        self.guests_served = guests_served
+        self.pavilions_mask = pavilions_mask
+        self.facts_mask = facts_mask
+        self.expires_at = 0.0
+
+    @property
+    def pavilions_count(self) -> int:
+        """Количество открытых павильонов"""
+        return popcount(self.pavilions_mask)
+
+    @property
+    def facts_count(self) -> int:
+        """Количество собранных фактов"""
+        return popcount(self.facts_mask)
+
+
+# Колонки users со словами масок прогресса, младшее слово первым (см. catalog.mask_words).
+# Маски — единственный источник прогресса: таблицы user_pavilions/user_facts бот не
+# пишет, из них (и из JSON-колонок) маски заполняют только переносы migrations.py
+PAVILION_MASK_COLUMNS = ("pavilions_mask",)
+FACT_MASK_COLUMNS = ("facts_mask", "facts_mask_2")
+assert len(PAVILION_MASK_COLUMNS) == PAVILION_MASK_WORDS and len(FACT_MASK_COLUMNS) == FACT_MASK_WORDS
+
+# Колонки users, из которых собирается UserRecord (в порядке аргументов конструктора)
+USER_STATE_COLUMNS = ", ".join(
+    ("user_id", "coins", "tasks_completed", "guests_served") + PAVILION_MASK_COLUMNS + FACT_MASK_COLUMNS
+)
+
+def mask_update(columns: tuple, item_id: int) -> tuple:
+    """Колонка слова маски с битом ID и значение бита для UPDATE"""
+    index, bit = id_word(item_id)
+    return columns[index], bit
+
+def _estimate_entry_size() -> int:
+    """Примерный размер одной записи кэша в байтах (запись, её поля и узел OrderedDict)"""
+    sample = UserRecord(2 ** 40, 10 ** 6, 10 ** 4, 10 ** 4, 2 ** 63, 2 ** 127)
+    fields = sum(sys.getsizeof(getattr(sample, name)) for name in UserRecord.__slots__)
+    return sys.getsizeof(sample) + fields + 100
+
+
+class UserCache:
+    """Ограниченный кэш состояния пользователей с вытеснением по LRU и TTL
+
+    Чтение идёт через кэш (read-through), изменяющие функции модуля пишут в
+    базу и сразу кладут в кэш свежую строку из RETURNING (write-through).
+    Размер задаётся бюджетом памяти, который переводится в число записей.
+    """
+
+    def __init__(self, max_bytes: int = USER_CACHE_MAX_BYTES, ttl: float = USER_CACHE_TTL):
+        self.ttl = ttl
+        self.entry_size = _estimate_entry_size()
+        self.max_entries = max(1, max_bytes // self.entry_size)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, user_id: int):
+        """Запись пользователя или None (промах или истёк TTL)"""
+        record = self._entries.get(user_id)
+        if record is None:
+            self.misses += 1
+            return None
+        if record.expires_at <= time.monotonic():
+            del self._entries[user_id]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return record
+
+    def put(self, record: UserRecord, replace: bool = True) -> UserRecord:
+        """Положить запись; при replace=False существующая свежая запись не заменяется"""
+        if not replace:
+            current = self._entries.get(record.user_id)
+            if current is not None and current.expires_at > time.monotonic():
+                return current
+        record.expires_at = time.monotonic() + self.ttl
+        self._entries[record.user_id] = record
+        self._entries.move_to_end(record.user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return record
+
+    def adjust(self, user_id: int, coins: int = 0, tasks_completed: int = 0, guests_served: int = 0):
+        """Заменить запись пользователя копией с прибавленными счётчиками (если она в кэше)
+
+        Запись заменяется, а не меняется на месте: снимок, который уже
+        получил обработчик, не меняется у него в руках.
+        """
+        current = self._entries.get(user_id)
+        if current is None:
+            return None
+        record = UserRecord(
+            user_id, current.coins + coins, current.tasks_completed + tasks_completed,
+            current.guests_served + guests_served, current.pavilions_mask, current.facts_mask
         )
-        user = await cursor.fetchone()
-        
-        if not user:
-            await db.execute(
-                "INSERT INTO users (user_id, coins) VALUES (?, ?)",
-                (user_id, 50)
-            )
-            await db.commit()
-            cursor = await db.execute(
-                "SELECT * FROM users WHERE user_id = ?",
-                (user_id,)
+        record.expires_at = current.expires_at
+        self._entries[user_id] = record
+        return record
+
+    def invalidate(self, user_id: int):
+        """Удалить запись пользователя из кэша"""
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Очистить кэш"""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Счётчики кэша для логов и мониторинга"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+# Глобальный кэш состояния пользователей
+user_cache = UserCache()
+
+
+# Колонки events, которые заполняет приложение (id — порядковый номер события)
+EVENT_COLUMNS = "user_id, kind, ref_id, coins, tasks, guests, created_at"
+
+# Состояние игрока: строка users плюс ещё не свёрнутые события журнала.
+# Одним запросом, чтобы свёртка между двумя чтениями не посчитала события дважды
+USER_STATE_QUERY = """
+    SELECT u.user_id,
+           u.coins + COALESCE(SUM(e.coins), 0),
+           u.tasks_completed + COALESCE(SUM(e.tasks), 0),
+           u.guests_served + COALESCE(SUM(e.guests), 0),
+           {masks}
+    FROM users u
+    LEFT JOIN events e ON e.user_id = u.user_id AND e.id > u.last_event_id
+    WHERE u.user_id = ?
+    GROUP BY u.user_id
+"""
+
+# Прогресс из старых источников, пока переносы миграций не закончены
+# (migrations.check_schema). Бот работает во время переноса, поэтому для
+# ещё не перенесённых игроков маски дополняются (OR) ID из JSON-колонок
+# users и таблиц связей: прогресс только растёт, и объединение всегда верно.
+# Запись сначала переносит в маски прогресс своего игрока (_absorb_legacy),
+# поэтому условия UPDATE вроде «павильон ещё не открыт» видят и его.
+LEGACY_JSON = "json"
+LEGACY_TABLES = "tables"
+
+_LEGACY_IDS = {
+    (PAVILION_MASK_COLUMNS, LEGACY_JSON): "pavilions_open",
+    (FACT_MASK_COLUMNS, LEGACY_JSON): "facts_collected",
+    (PAVILION_MASK_COLUMNS, LEGACY_TABLES): "SELECT pavilion_id AS id FROM user_pavilions WHERE user_id = {row}.user_id",
+    (FACT_MASK_COLUMNS, LEGACY_TABLES): "SELECT fact_id AS id FROM user_facts WHERE user_id = {row}.user_id",
+}
+
+# Источники старого прогресса, которые сейчас читаются вместе с масками
+_legacy_progress = ()
+_user_state_queries = {}
+
+def mask_word_sql(ids_sql: str, index: int) -> str:
+    """SQL: слово маски index из ID, которые выбирает ids_sql (колонка id)
+
+    Повторы ID не мешают (SUM DISTINCT), поэтому сумма степеней двойки
+    равна OR; бит 63 — знаковый, как в catalog.mask_words. ID вне слова
+    пропускаются.
+    """
+    low = index * MASK_WORD_BITS + 1
+    return (
+        f"(SELECT COALESCE(SUM(DISTINCT 1 << (id - {low})), 0) FROM ({ids_sql}) "
+        f"WHERE id BETWEEN {low} AND {low + MASK_WORD_BITS - 1})"
+    )
+
+def legacy_ids_sql(columns: tuple, sources: tuple, row: str) -> str:
+    """SQL: ID павильонов (columns — PAVILION_MASK_COLUMNS) или фактов игрока row из старых источников"""
+    parts = []
+    for source in sources:
+        template = _LEGACY_IDS[(columns, source)]
+        if source == LEGACY_JSON:
+            column = f"{row}.{template}"
+            # Битый JSON или не список — пустой список, как в migrations._parse_id_list
+            parts.append(
+                f"SELECT value AS id FROM json_each(CASE WHEN json_valid({column}) "
+                f"THEN CASE json_type({column}) WHEN 'array' THEN {column} END END) WHERE type = 'integer'"
             )
-            user = await cursor.fetchone()
-        
-        return dict(user)
+        else:
+            parts.append(template.format(row=row))
+    return " UNION ALL ".join(parts)
+
+def _mask_expressions(sources: tuple, row: str) -> list:
+    """Выражения слов масок с учётом старых источников: [(колонка, выражение)]"""
+    expressions = []
+    for columns in (PAVILION_MASK_COLUMNS, FACT_MASK_COLUMNS):
+        ids_sql = legacy_ids_sql(columns, sources, row) if sources else None
+        for index, column in enumerate(columns):
+            value = f"{row}.{column}"
+            if ids_sql:
+                value = f"({value} | {mask_word_sql(ids_sql, index)})"
+            expressions.append((column, value))
+    return expressions
+
+def set_legacy_progress(sources: tuple):
+    """Задать старые источники прогресса, которые читаются вместе с масками"""
+    global _legacy_progress
+    _legacy_progress = tuple(sources)
+
+def legacy_progress() -> tuple:
+    """Старые источники прогресса, которые сейчас читаются (пусто — переносы закончены)"""
+    return _legacy_progress
+
+def _user_state_query() -> str:
+    query = _user_state_queries.get(_legacy_progress)
+    if query is None:
+        masks = ", ".join(value for _, value in _mask_expressions(_legacy_progress, "u"))
+        query = _user_state_queries[_legacy_progress] = USER_STATE_QUERY.format(masks=masks)
+    return query
+
+# Свёртка журнала игрока в его строку users. Несвёрнутыми бывают только события
+# счётчиков: павильоны и факты применяются к строке сразу (см. _write_user)
+FOLD_USER_SQL = """
+    UPDATE users SET
+        coins = coins + COALESCE((SELECT SUM(e.coins) FROM events e
+            WHERE e.user_id = users.user_id AND e.id > users.last_event_id), 0),
+        tasks_completed = tasks_completed + COALESCE((SELECT SUM(e.tasks) FROM events e
+            WHERE e.user_id = users.user_id AND e.id > users.last_event_id), 0),
+        guests_served = guests_served + COALESCE((SELECT SUM(e.guests) FROM events e
+            WHERE e.user_id = users.user_id AND e.id > users.last_event_id), 0),
+        last_event_id = (SELECT MAX(e.id) FROM events e WHERE e.user_id = users.user_id)
+    WHERE user_id = ?
+      AND last_event_id < (SELECT MAX(e.id) FROM events e WHERE e.user_id = users.user_id)
+"""
+
+
+class CounterBuffer:
+    """Отложенная запись событий счётчиков игроков (write-behind) с групповым commit
+
+    Начисления мандаринок, выполненные задания и обслуженные гости
+    копятся в памяти и дописываются в журнал events одной транзакцией:
+    через interval после первого незаписанного события или сразу, когда
+    их наберётся max_ops. Число fsync зависит от числа пачек, а не от числа
+    нажатий, а вместо перезаписи строк users идут последовательные вставки;
+    в users события сворачивает EventSnapshotter.
+
+    Кэш пользователей сразу получает новые значения, а строки, прочитанные
+    из базы, дополняются незаписанными приращениями (overlay), поэтому
+    чтения видят их до записи. При ошибке записи события возвращаются
+    в буфер и пробуются снова.
+    """
+
+    def __init__(self, interval_ms: int = WRITE_BEHIND_INTERVAL_MS, max_ops: int = WRITE_BEHIND_MAX_OPS):
+        self.interval = max(0, interval_ms) / 1000
+        self.max_ops = max(1, max_ops)
+        # Незаписанные события (строки для events) и их сумма по игроку:
+        # user_id -> [coins, tasks_completed, guests_served]
+        self._events = []
+        self._pending = {}
+        # Пачка, которая сейчас записывается: её ещё нет в строках, прочитанных из базы
+        self._inflight = {}
+        self._timer = None
+        self._flush_lock = None
+        self._flush_tasks = set()
+        # Растёт в начале и в конце записи каждой пачки; пока пачка пишется,
+        # _writing — future, который завершится вместе с записью (см. get_user_snapshot)
+        self.version = 0
+        self._writing = None
+        self.flushes = 0
+        self.flushed_ops = 0
+        self.flush_errors = 0
+        self.max_batch = 0
+
+    def deltas(self, user_id: int) -> tuple:
+        """Незаписанные приращения игрока: (coins, tasks_completed, guests_served)"""
+        pending = self._pending.get(user_id)
+        inflight = self._inflight.get(user_id)
+        if pending is None and inflight is None:
+            return (0, 0, 0)
+        if inflight is None:
+            return tuple(pending)
+        if pending is None:
+            return tuple(inflight)
+        return tuple(a + b for a, b in zip(pending, inflight))
+
+    async def settled(self) -> int:
+        """Дождаться конца записи текущей пачки и вернуть версию"""
+        while self._writing is not None:
+            await asyncio.shield(self._writing)
+        return self.version
+
+    def overlay(self, record: UserRecord) -> UserRecord:
+        """Дополнить запись из базы незаписанными приращениями"""
+        coins, tasks_completed, guests_served = self.deltas(record.user_id)
+        record.coins += coins
+        record.tasks_completed += tasks_completed
+        record.guests_served += guests_served
+        return record
+
+    async def add(self, user_id: int, kind: str, ref_id: int = None, coins: int = 0,
+                  tasks_completed: int = 0, guests_served: int = 0):
+        """Добавить событие счётчиков игрока"""
+        self._events.append((user_id, kind, ref_id, coins, tasks_completed, guests_served, time.time()))
+        _add_deltas(self._pending, user_id, coins, tasks_completed, guests_served)
+        user_cache.adjust(user_id, coins, tasks_completed, guests_served)
+        if self.interval <= 0 or len(self._events) >= self.max_ops:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.interval, self._flush_due)
+
+    def _flush_due(self):
+        self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        # Держим ссылку до завершения, иначе задачу может собрать GC
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self):
+        """Записать все накопленные события одной транзакцией"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._events:
+                return
+            events, self._events = self._events, []
+            batch, self._pending = self._pending, {}
+            self._inflight = batch
+            self.version += 1
+            self._writing = asyncio.get_running_loop().create_future()
+            try:
+                async with get_pool().write() as db:
+                    await db.executemany(
+                        f"INSERT INTO events ({EVENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        events
+                    )
+            except Exception as e:
+                # Возвращаем пачку в буфер перед более новыми событиями: следующая запись попробует снова
+                self._events = events + self._events
+                for user_id, (coins, tasks, guests) in batch.items():
+                    _add_deltas(self._pending, user_id, coins, tasks, guests)
+                self.flush_errors += 1
+                log_error(e, "CounterBuffer.flush")
+                if self._timer is None and self.interval > 0:
+                    self._timer = asyncio.get_running_loop().call_later(self.interval, self._flush_due)
+            else:
+                self.flushes += 1
+                self.flushed_ops += len(events)
+                self.max_batch = max(self.max_batch, len(events))
+            finally:
+                self._inflight = {}
+                self.version += 1
+                writing, self._writing = self._writing, None
+                writing.set_result(None)
+
+    def stats(self) -> dict:
+        """Счётчики для логов и мониторинга"""
+        return {
+            "pending_users": len(self._pending),
+            "pending_ops": len(self._events),
+            "flushes": self.flushes,
+            "flushed_ops": self.flushed_ops,
+            "ops_per_flush": round(self.flushed_ops / self.flushes, 1) if self.flushes else 0.0,
+            "max_batch": self.max_batch,
+            "flush_errors": self.flush_errors,
+        }
+
+
+def _add_deltas(deltas: dict, user_id: int, coins: int, tasks_completed: int, guests_served: int):
+    current = deltas.get(user_id)
+    if current is None:
+        deltas[user_id] = [coins, tasks_completed, guests_served]
+    else:
+        current[0] += coins
+        current[1] += tasks_completed
+        current[2] += guests_served
+
+
+# Глобальный буфер отложенной записи счётчиков
+counter_buffer = CounterBuffer()
+
+def _record_from_row(row) -> UserRecord:
+    """Запись из строки состояния с ещё не записанными приращениями счётчиков"""
+    facts_start = 4 + len(PAVILION_MASK_COLUMNS)
+    return counter_buffer.overlay(UserRecord(
+        row[0], row[1], row[2], row[3],
+        words_mask(row[4:facts_start]), words_mask(row[facts_start:facts_start + len(FACT_MASK_COLUMNS)])
+    ))
+
+async def _append_event(db, user_id: int, kind: str, ref_id: int = None, coins: int = 0,
+                        tasks: int = 0, guests: int = 0):
+    """Записать событие, уже применённое к строке игрока, и сдвинуть его last_event_id
+
+    Вызывается в транзакции писателя после _fold_user, иначе сдвиг
+    last_event_id пропустит несвёрнутые события.
+    """
+    cursor = await db.execute(
+        f"INSERT INTO events ({EVENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (user_id, kind, ref_id, coins, tasks, guests, time.time())
+    )
+    await db.execute(
+        "UPDATE users SET last_event_id = ? WHERE user_id = ?",
+        (cursor.lastrowid, user_id)
+    )
+
+async def _create_user(db, user_id: int):
+    """Создать пользователя, если его нет, и записать событие join"""
+    cursor = await db.execute(
+        "INSERT OR IGNORE INTO users (user_id, coins) VALUES (?, ?)",
+        (user_id, 50)
+    )
+    if cursor.rowcount:
+        await _append_event(db, user_id, "join", coins=50)
+
+async def _fold_user(db, user_id: int):
+    """Свернуть события игрока в его строку users (в транзакции писателя)"""
+    await db.execute(FOLD_USER_SQL, (user_id,))
+
+async def ensure_user(user_id: int):
+    """Создать пользователя, если его нет (состояние читается через get_user_snapshot)"""
+    await get_user_snapshot(user_id)
+
+async def get_user_snapshot(user_id: int) -> UserRecord:
+    """Получить снимок пользователя одним запросом (или из кэша)
+
+    Мандаринки, счетчики, открытые павильоны и собранные факты приходят
+    одной строкой users с несвёрнутыми событиями журнала; павильоны и
+    факты — битовыми масками. Пользователь создаётся при первом обращении.
+    """
+    record = user_cache.get(user_id)
+    if record is not None:
+        return record
+
+    while True:
+        version = await counter_buffer.settled()
+        async with get_pool().read() as db:
+            cursor = await db.execute(_user_state_query(), (user_id,))
+            row = await cursor.fetchone()
+        # Если во время чтения началась запись пачки счётчиков, строка может
+        # уже содержать её, а overlay добавит её ещё раз: читаем заново
+        if counter_buffer.version == version:
+            break
+
+    if not row:
+        async with get_pool().write() as db:
+            await _create_user(db, user_id)
+            cursor = await db.execute(_user_state_query(), (user_id,))
+            row = await cursor.fetchone()
+
+    # Пока шло чтение, запись могла положить в кэш более свежую строку
+    return user_cache.put(_record_from_row(row), replace=False)
+
+async def _absorb_legacy(db, user_id: int):
+    """Перенести в маски игрока прогресс из старых источников, пока переносы идут (в транзакции писателя)"""
+    if not _legacy_progress:
+        return
+    masks = ", ".join(f"{column} = {value}" for column, value in _mask_expressions(_legacy_progress, "users"))
+    await db.execute(f"UPDATE users SET {masks} WHERE user_id = ?", (user_id,))
+
+async def _write_user(db, user_id: int, sql: str, params: tuple):
+    """Свернуть журнал игрока, выполнить UPDATE ... RETURNING и обновить кэш
+
+    После свёртки строка users полная, поэтому RETURNING отдаёт актуальное
+    состояние (без событий, которые ещё лежат в буфере, — их добавит overlay).
+    Возвращает None, если UPDATE не изменил строку.
+    """
+    await _absorb_legacy(db, user_id)
+    await _fold_user(db, user_id)
+    cursor = await db.execute(f"{sql} RETURNING {USER_STATE_COLUMNS}", params)
+    row = await cursor.fetchone()
+    return user_cache.put(_record_from_row(row)) if row else None
 
 async def get_user_coins(user_id: int) -> int:
     """Получить количество мандаринок пользователя"""
-    user = await get_user(user_id)
-    return user['coins']
-
-async def add_coins(user_id: int, amount: int):
-    """Добавить мандаринки"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute(
-            "UPDATE users SET coins = coins + ? WHERE user_id = ?",
-            (amount, user_id)
-        )
-        await db.commit()
+    user = await get_user_snapshot(user_id)
+    return user.coins
 
-async def subtract_coins(user_id: int, amount: int):
-    """Списать мандаринки"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute(
-            "UPDATE users SET coins = coins - ? WHERE user_id = ?",
-            (amount, user_id)
-        )
-        await db.commit()
+async def get_progress(user_id: int) -> tuple:
+    """Получить маски прогресса (pavilions_mask, facts_mask)"""
+    user = await get_user_snapshot(user_id)
+    return user.pavilions_mask, user.facts_mask
 
 async def get_open_pavilions(user_id: int) -> list:
     """Получить список открытых павильонов"""
-    import json
-    user = await get_user(user_id)
-    try:
-        return json.loads(user['pavilions_open'])
-    except (json.JSONDecodeError, TypeError):
-        return []
+    pavilions_mask, _ = await get_progress(user_id)
+    return mask_ids(pavilions_mask)
 
 async def open_pavilion(user_id: int, pavilion_id: int):
     """Открыть павильон"""
-    import json
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        user = await get_user(user_id)
-        try:
-            pavilions = json.loads(user['pavilions_open'])
-        except (json.JSONDecodeError, TypeError):
-            pavilions = []
-        if pavilion_id not in pavilions:
-            pavilions.append(pavilion_id)
-            await db.execute(
-                "UPDATE users SET pavilions_open = ? WHERE user_id = ?",
-                (json.dumps(pavilions), user_id)
-            )
-            await db.commit()
+    column, bit = mask_update(PAVILION_MASK_COLUMNS, pavilion_id)
+    async with get_pool().write() as db:
+        user = await _write_user(
+            db,
+            user_id,
+            f"UPDATE users SET {column} = {column} | ? WHERE user_id = ? AND {column} & ? = 0",
+            (bit, user_id, bit)
+        )
+        if user is not None:
+            await _append_event(db, user_id, "pavilion", pavilion_id)
+
+async def purchase_pavilion(user_id: int, pavilion_id: int):
+    """Купить павильон: списать цену и открыть его одной транзакцией
+
+    Проверка баланса и владения идёт в самом UPDATE, поэтому двойное
+    нажатие или параллельные обработчики не спишут цену дважды и не уведут
+    баланс в минус. Незаписанные приращения из CounterBuffer учитываются:
+    пока транзакция держит писателя, буфер не может записать пачку.
+    Возвращает новое количество мандаринок или None, если павильон не
+    найден, уже открыт или мандаринок не хватает.
+    """
+    pav = CATALOG.pavilion(pavilion_id)
+    if not pav:
+        return None
+    # Создаёт пользователя, если его ещё нет
+    await get_user_snapshot(user_id)
+    column, bit = mask_update(PAVILION_MASK_COLUMNS, pavilion_id)
+    async with get_pool().write() as db:
+        pending_coins = counter_buffer.deltas(user_id)[0]
+        user = await _write_user(
+            db,
+            user_id,
+            f"""
+            UPDATE users SET coins = coins - ?, {column} = {column} | ?
+            WHERE user_id = ? AND coins + ? >= ? AND {column} & ? = 0
+            """,
+            (pav.price, bit, user_id, pending_coins, pav.price, bit)
+        )
+        if user is None:
+            return None
+        await _append_event(db, user_id, "pavilion", pavilion_id, coins=-pav.price)
+    return user.coins
 
 async def get_collected_facts(user_id: int) -> list:
     """Получить список собранных фактов"""
-    import json
-    user = await get_user(user_id)
-    try:
-        return json.loads(user['facts_collected'])
-    except (json.JSONDecodeError, TypeError):
-        return []
+    _, facts_mask = await get_progress(user_id)
+    return mask_ids(facts_mask)
 
 async def add_fact_to_collection(user_id: int, fact_id: int):
     """Добавить факт в коллекцию"""
-    import json
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        user = await get_user(user_id)
-        try:
-            facts = json.loads(user['facts_collected'])
-        except (json.JSONDecodeError, TypeError):
-            facts = []
-        if fact_id not in facts:
-            facts.append(fact_id)
-            await db.execute(
-                "UPDATE users SET facts_collected = ? WHERE user_id = ?",
-                (json.dumps(facts), user_id)
-            )
-            await db.commit()
-
-async def increment_tasks_completed(user_id: int):
-    """Увеличить счетчик выполненных заданий"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute(
-            "UPDATE users SET tasks_completed = tasks_completed + 1 WHERE user_id = ?",
-            (user_id,)
+    column, bit = mask_update(FACT_MASK_COLUMNS, fact_id)
+    async with get_pool().write() as db:
+        user = await _write_user(
+            db,
+            user_id,
+            f"UPDATE users SET {column} = {column} | ? WHERE user_id = ? AND {column} & ? = 0",
+            (bit, user_id, bit)
         )
-        await db.commit()
+        if user is not None:
+            await _append_event(db, user_id, "fact", fact_id)
 
-async def increment_guests_served(user_id: int):
-    """Увеличить счетчик обслуженных гостей"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute(
-            "UPDATE users SET guests_served = guests_served + 1 WHERE user_id = ?",
-            (user_id,)
-        )
-        await db.commit()
+async def complete_task_reward(user_id: int, task_id: int):
+    """Начислить награду за задание и увеличить счетчики
 
-async def get_all_pavilions():
-    """Получить все павильоны"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM pavilions ORDER BY id")
-        rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
-
-async def get_pavilion(pavilion_id: int):
-    """Получить павильон по ID"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM pavilions WHERE id = ?", (pavilion_id,))
-        row = await cursor.fetchone()
-        return dict(row) if row else None
-
-async def get_pavilion_tasks(pavilion_id: int):
-    """Получить задания павильона"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT * FROM tasks WHERE pavilion_id = ? ORDER BY id",
-            (pavilion_id,)
-        )
-        rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
-
-async def get_task(task_id: int):
-    """Получить задание по ID"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
-        row = await cursor.fetchone()
-        return dict(row) if row else None
-
-async def get_fact(fact_id: int):
-    """Получить факт по ID"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM facts WHERE id = ?", (fact_id,))
-        row = await cursor.fetchone()
-        return dict(row) if row else None
-
-async def get_pavilion_facts(pavilion_id: int):
-    """Получить факты павильона"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT * FROM facts WHERE pavilion_id = ? ORDER BY id",
-            (pavilion_id,)
-        )
-        rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+    В буфер отложенной записи идёт одно событие task. Возвращает новое
+    количество мандаринок или None, если задание не найдено.
+    """
+    task = CATALOG.task(task_id)
+    pav = CATALOG.pavilion(task.pavilion_id) if task else None
+    if not pav:
+        return None
+    # Создаёт пользователя, если его ещё нет, и кладёт его в кэш
+    await get_user_snapshot(user_id)
+    await counter_buffer.add(user_id, "task", task_id, coins=pav.reward, tasks_completed=1, guests_served=1)
+    user = await get_user_snapshot(user_id)
+    return user.coins
 
 async def get_user_stats(user_id: int):
     """Получить статистику пользователя"""
-    user = await get_user(user_id)
+    user = await get_user_snapshot(user_id)
     return {
-        'coins_earned': user['coins'],
-        'guests_served': user['guests_served'],
-        'pavilions_open': len(await get_open_pavilions(user_id)),
-        'facts_collected': len(await get_collected_facts(user_id)),
-        'tasks_completed': user['tasks_completed']
+        'coins_earned': user.coins,
+        'guests_served': user.guests_served,
+        'pavilions_open': user.pavilions_count,
+        'facts_collected': user.facts_count,
+        'tasks_completed': user.tasks_completed
     }
 
 async def get_all_user_ids():
     """Получить список всех user_id из базы данных"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with get_pool().read() as db:
         cursor = await db.execute("SELECT user_id FROM users")
         rows = await cursor.fetchall()
         return [row[0] for row in rows]
 
+# Журнал событий: свёртка и восстановление
+
+async def fold_events(batch_size: int = EVENT_SNAPSHOT_BATCH) -> int:
+    """Свернуть новые события журнала в строки users
+
+    Берутся игроки с событиями после folded_upto, каждая порция из
+    batch_size игроков — своя короткая транзакция. Логическое состояние
+    при этом не меняется: суммы переходят из журнала в строку users в
+    одной транзакции. Возвращает число просмотренных игроков.
+    """
+    async with get_pool().read() as db:
+        cursor = await db.execute("SELECT folded_upto FROM event_snapshot WHERE id = 1")
+        folded_upto = (await cursor.fetchone())[0]
+        cursor = await db.execute("SELECT MAX(id) FROM events")
+        upto = (await cursor.fetchone())[0]
+        if upto is None or upto <= folded_upto:
+            return 0
+        cursor = await db.execute(
+            "SELECT DISTINCT user_id FROM events WHERE id > ? AND id <= ?",
+            (folded_upto, upto)
+        )
+        user_ids = [row[0] for row in await cursor.fetchall()]
+
+    for i in range(0, len(user_ids), batch_size):
+        async with get_pool().write() as db:
+            await db.executemany(FOLD_USER_SQL, [(user_id,) for user_id in user_ids[i:i + batch_size]])
+        await asyncio.sleep(0)
+
+    async with get_pool().write() as db:
+        await db.execute(
+            "UPDATE event_snapshot SET folded_upto = MAX(folded_upto, ?) WHERE id = 1",
+            (upto,)
+        )
+    return len(user_ids)
+
+
+class EventSnapshotter:
+    """Периодическая свёртка журнала событий в строки users (см. fold_events)"""
+
+    def __init__(self, interval: float = EVENT_SNAPSHOT_INTERVAL, batch_size: int = EVENT_SNAPSHOT_BATCH):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._handle = None
+        self._task = None
+        self.runs = 0
+        self.folded_users = 0
+        self.errors = 0
+
+    def start(self):
+        """Сворачивать журнал каждые interval секунд в текущем цикле событий (0 — не сворачивать)"""
+        self.stop()
+        if self.interval <= 0:
+            return
+        loop = asyncio.get_running_loop()
+
+        def run():
+            # Новая свёртка не начинается, пока не закончилась предыдущая
+            if self._task is None or self._task.done():
+                self._task = asyncio.ensure_future(self.run_once())
+            self._handle = loop.call_later(self.interval, run)
+
+        self._handle = loop.call_later(self.interval, run)
+
+    def stop(self):
+        """Остановить периодическую свёртку (начатая порция откатывается)"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def run_once(self) -> int:
+        try:
+            folded = await fold_events(self.batch_size)
+        except Exception as e:
+            self.errors += 1
+            log_error(e, "EventSnapshotter")
+            return 0
+        self.runs += 1
+        self.folded_users += folded
+        return folded
+
+    def stats(self) -> dict:
+        """Счётчики для логов и мониторинга"""
+        return {"runs": self.runs, "folded_users": self.folded_users, "errors": self.errors}
+
+
+# Глобальная свёртка журнала (запускается в bot.init())
+event_snapshotter = EventSnapshotter()
+
+async def _replay(db, user_id: int):
+    cursor = await db.execute(
+        "SELECT kind, ref_id, coins, tasks, guests FROM events WHERE user_id = ? ORDER BY id",
+        (user_id,)
+    )
+    rows = await cursor.fetchall()
+    if not rows:
+        return None
+    record = UserRecord(user_id, 0, 0, 0, 0, 0)
+    for kind, ref_id, coins, tasks, guests in rows:
+        record.coins += coins
+        record.tasks_completed += tasks
+        record.guests_served += guests
+        if kind == "pavilion":
+            record.pavilions_mask |= id_bit(ref_id)
+        elif kind == "fact":
+            record.facts_mask |= id_bit(ref_id)
+    return record
+
+async def replay_user(user_id: int):
+    """Состояние игрока, собранное с нуля по журналу событий (или None, если событий нет)"""
+    async with get_pool().read() as db:
+        return await _replay(db, user_id)
+
+async def restore_user(user_id: int):
+    """Перезаписать строку игрока состоянием из журнала событий
+
+    Журнал читается в той же транзакции писателя, поэтому события,
+    дописанные во время восстановления, не теряются. Возвращает
+    восстановленную запись или None, если событий нет (тогда база не
+    меняется). Кэш и буфер счётчиков сбрасываются только в этом процессе.
+    Пока переносы миграций не закончены, у старых игроков в журнале нет
+    исходного состояния, поэтому восстановление недоступно.
+    """
+    if _legacy_progress:
+        raise RuntimeError("Переносы миграций не закончены: восстановление по журналу недоступно")
+    async with get_pool().write() as db:
+        # BEGIN IMMEDIATE берёт блокировку базы до чтения журнала: другие процессы
+        # не допишут события между чтением и перезаписью строки
+        if not db.in_transaction:
+            await db.execute("BEGIN IMMEDIATE")
+        record = await _replay(db, user_id)
+        if record is None:
+            return None
+        await db.execute(
+            "INSERT OR IGNORE INTO users (user_id) VALUES (?)",
+            (user_id,)
+        )
+        mask_columns = PAVILION_MASK_COLUMNS + FACT_MASK_COLUMNS
+        await db.execute(
+            f"""
+            UPDATE users SET coins = ?, tasks_completed = ?, guests_served = ?,
+                {", ".join(f"{column} = ?" for column in mask_columns)},
+                last_event_id = (SELECT MAX(id) FROM events WHERE user_id = ?)
+            WHERE user_id = ?
+            """,
+            (record.coins, record.tasks_completed, record.guests_served,
+             *mask_words(record.pavilions_mask, len(PAVILION_MASK_COLUMNS)),
+             *mask_words(record.facts_mask, len(FACT_MASK_COLUMNS)),
+             user_id, user_id)
+        )
+    user_cache.invalidate(user_id)
+    return record
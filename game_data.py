@@ -155,6 +155,984 @@ TASKS_DATA = [
     {"id": 59, "pavilion_id": 7, "name": "Финальный штрих", "emoji": "🎁", "type": "choice", "reward": 100, "fact_id": 59}
 ]
 
+# Описания заданий для движка (task_engine.py): тексты, кадры, задержки,
+# кнопки (подпись, значение), правильные ответы и число шагов.
+# Задания без описания показывают универсальный экран своего типа.
+TASK_FLOWS_DATA = {
+    # Павильон 1: Поезд
+    1: {  # Подобрать варежки
+        "text": """🧤 *Подобрать варежки*
+
+❄️ Снег падает за окном павильона...
+🕯️ Теплый свет ламп освещает полки с варежками
+
+На полке разложены варежки разных цветов.
+Клиент указывает на красные — нужно найти подходящие.
+
+🎯 *Выбери цвет:*""",
+        "options": [("🤍 Белые", "white"), ("🔴 Красные", "red"), ("🔵 Синие", "blue"), ("⚫️ Черные", "black")],
+        "answer": "red",
+        "fail_text": "❌ Не тот цвет! Клиент просил красные. Попробуй ещё раз.",
+        "success_text": "✅ Идеально! Клиент доволен!",
+    },
+    2: {  # Собрать набор для катания
+        "steps": [
+            {
+                "text": """🎒 Собрать набор для катания
+
+Выбери шапку!""",
+                "options": [("🧢 Шапка-ушанка", "hat"), ("🎩 Шерстяная", "wool_hat")],
+            },
+            {
+                "text": """✅ Шапка выбрана
+
+*Шаг 2/3:* Выбери шарф
+
+🎯 *Шарф:*""",
+                "options": [("🧣 Шерстяной", "scarf"), ("🧣 Теплый", "warm_scarf")],
+            },
+            {
+                "text": """✅ Шарф выбран
+
+*Шаг 3/3:* Выбери варежки
+
+🎯 *Варежки:*""",
+                "options": [("🧤 Теплые", "gloves"), ("🧤 Шерстяные", "wool_gloves")],
+            },
+        ],
+    },
+    3: {  # Проверить термометр
+        "hit_label": "✅ НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """🌡 *Проверить термометр*
+
+❄️ В павильоне прохладно
+🌡️ Термометр на стене показывает температуру
+🔥 Отопление работает, температура медленно поднимается
+
+Дождись комфортной температуры (22°C).
+
+🌡️ *15°C...* ❄️""",
+            """🌡 *Проверить термометр*
+
+🔥 Теплее становится...
+🌡️ *25°C...*
+
+⏳ Ждем идеальной температуры...""",
+            """🌡 *Проверить термометр*
+
+✨ Идеальная температура!
+🌡️ *22°C* ✅
+
+⚡ *СЕЙЧАС!*""",
+        ],
+    },
+    4: {  # Найти нужный размер
+        "text": """🧣 *Найти нужный размер*
+
+🌨️ За окном метель, в павильоне тепло и уютно
+📦 На полке аккуратно разложены шарфы с бирками
+
+Нужен размер M — средний, самый популярный.
+
+🎯 *Выбери размер:*""",
+        "options": [("S", "S"), ("M", "M"), ("L", "L"), ("XL", "XL")],
+        "answer": "M",
+        "fail_text": "❌ Не тот размер! Клиент просил размер M, а ты выбрал {choice}. Попробуй ещё раз.",
+        "success_text": "✅ Отлично! Размер M - именно то, что нужно!",
+    },
+    5: {  # Добавить грелки
+        "steps": [
+            {
+                "text": """🔥 Добавить грелки
+
+Добавь грелки в карманы!
+
+━━━━━━━━━━━━━━━━
+
+ШАГ 1/2: Первая грелка""",
+                "options": [("🔥 Добавить", "add")],
+            },
+            {
+                "text": """✅ Первая грелка добавлена!
+
+━━━━━━━━━━━━━━━━
+
+ШАГ 2/2: Вторая грелка""",
+                "options": [("🔥 Добавить", "add")],
+            },
+        ],
+    },
+    6: {  # Пробить чек
+        "hit_label": "✅ НАЖАТЬ!",
+        "delay": 1.5,
+        "frames": [
+            """📦 Пробить чек
+
+На кассе нужно пробить чек на сумму 1000₽.
+
+Следи за суммой! 💰
+
+━━━━━━━━━━━━━━━━
+
+Сумма: 250₽...""",
+            """📦 Пробить чек
+
+Сумма: 650₽...""",
+            """📦 Пробить чек
+
+Сумма: 1000₽... ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+
+    # Павильон 2: Коньки
+    7: {  # Листать свитера
+        "text": """🧥 *Листать свитера*
+
+🎨 На вешалке висят свитера разных цветов и узоров
+🦌 Нужен синий с оленями — классический зимний узор
+👀 Листай вешалку и ищи нужный
+
+🎯 *Поиск:*""",
+        "options": [("⬅️ Назад", "prev"), ("➡️ Вперед", "next"), ("✅ Это он!", "found")],
+        "answer": "found",
+        "fail_text": "Продолжай искать...",
+        "fail_alert": False,
+    },
+    8: {  # Выбрать размер
+        "text": """👕 Выбрать размер
+
+Клиент говорит: рост 175см
+
+Выбери размер!""",
+        "options": [("S (160-165)", "S"), ("M (170-175)", "M"), ("L (180-185)", "L"), ("XL (190+)", "XL")],
+        "answer": "M",
+        "fail_text": "❌ Не тот размер!",
+    },
+    9: {  # Примерить шапку
+        "text": """🧢 Примерить шапку
+
+Выбери модель шапки!""",
+        "options": [
+            ("🧢 С помпоном", "pompon"), ("🎩 Классическая", "classic"),
+            ("🎨 Дизайнерская", "designer"),
+        ],
+    },
+    10: {  # Проверить ткань
+        "hit_label": "✅ НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """🖐 Проверить ткань
+
+Клиент хочет потрогать ткань. Нажми когда ткань будет готова!
+
+━━━━━━━━━━━━━━━━
+
+Ткань: Проверяется...""",
+            """🖐 Проверить ткань
+
+Ткань: Мягкая/Теплая/Приятная ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    11: {  # Собрать образ
+        "steps": [
+            {
+                "text": """🪞 Собрать образ
+
+Выбери свитер!""",
+                "options": [("🧥 С оленями", "sweater"), ("🧥 Классический", "classic")],
+            },
+            {
+                "text": """✅ Свитер выбран!
+
+━━━━━━━━━━━━━━━━
+
+ШАГ 2/3: Выбери шапку""",
+                "options": [("🧢 С помпоном", "hat"), ("🧢 Классическая", "classic")],
+            },
+            {
+                "text": """✅ Шапка выбрана!
+
+━━━━━━━━━━━━━━━━
+
+ШАГ 3/3: Выбери шарф""",
+                "options": [("🧣 Шерстяной", "scarf"), ("🧣 Теплый", "warm")],
+            },
+        ],
+    },
+    12: {  # Упаковать в пакет
+        "hit_label": "✅ НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """🛍 Упаковать в пакет
+
+Упакуй покупку в пакет!
+
+━━━━━━━━━━━━━━━━
+
+Пакет: Готов...""",
+            """🛍 Упаковать в пакет
+
+Пакет: Готов! ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    13: {  # Подобрать аксессуары
+        "steps": [
+            {
+                "text": """👔 Подобрать аксессуары
+
+К пальто выбери шарф!""",
+                "options": [("🧣 Шерстяной", "scarf"), ("🧣 Шелковый", "silk")],
+            },
+            {
+                "text": """✅ Шарф выбран!
+
+━━━━━━━━━━━━━━━━
+
+ШАГ 2/2: Выбери перчатки""",
+                "options": [("🧤 Кожаные", "gloves"), ("🧤 Шерстяные", "wool")],
+            },
+        ],
+    },
+    14: {  # Выбрать цветовую гамму
+        "text": """🎨 *Выбрать цветовую гамму*
+
+🎭 Зеркала отражают мягкий свет
+🧵 На манекенах — серые тона, от светлого до угольного
+✨ Нужно собрать комплект: 3 вещи в серой гамме
+
+Выбери 3 предмета, которые сочетаются.
+
+🎯 *Выбери 3 вещи:*""",
+        "options": [
+            ("⚪️ Серый свитер", "gray_sweater"), ("⚫️ Темно-серый шарф", "gray_scarf"),
+            ("🔘 Серые перчатки", "gray_gloves"), ("⚪️ Светло-серый", "light_gray"),
+        ],
+        "pick": 3,
+        "picked_text": "✅ Выбрано 3 вещи!",
+        "fail_text": "Нужно выбрать 3 вещи!",
+    },
+
+    # Павильон 3: Холодильник
+    15: {  # Собрать порцию мороженого
+        "text": """🍦 *Собрать порцию мороженого*
+
+🧊 Холодный воздух из витрины с мороженым
+🍦 Вафельные рожки лежат стопкой
+✨ Блестит мороженое в металлических контейнерах
+
+Выбери сорт для порции в рожке.
+
+🎯 *Сорт:*""",
+        "options": [
+            ("🤍 Пломбир", "vanilla"), ("🍫 Шоколадное", "chocolate"),
+            ("🌰 Фисташковое", "pistachio"), ("🍓 Клубничное", "strawberry"),
+        ],
+        "then": [
+            {
+                "text": """✅ Пломбир выбран
+
+🍦 Мороженое в рожке
+✨ *Шаг 2/2:* Выбери топпинг
+
+🎯 *Топпинг:*""",
+                "options": [
+                    ("🍫 Шоколадная крошка", "chocolate"), ("🍮 Карамель", "caramel"),
+                    ("🫐 Свежие ягоды", "berries"), ("🥜 Орешки", "nuts"),
+                ],
+            },
+        ],
+    },
+    16: {  # Сделать эспрессо
+        "hit_label": "☕️ НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """☕️ Сделать эспрессо
+
+Кофе-машина готовит эспрессо. Следи за индикатором!
+
+━━━━━━━━━━━━━━━━
+
+Индикатор: ⚪️ Готовится...""",
+            """☕️ Сделать эспрессо
+
+Индикатор: 🟡 Почти готово...""",
+            """☕️ Сделать эспрессо
+
+Индикатор: 🟢 ГОТОВО! ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    17: {  # Налить какао
+        "hit_label": "🍫 НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """🍫 Налить какао
+
+Подставь стакан под кран и нажми в нужный момент!
+
+━━━━━━━━━━━━━━━━
+
+Стакан: Пусто...""",
+            """🍫 Налить какао
+
+Стакан: Наполняется...""",
+            """🍫 Налить какао
+
+Стакан: Почти полный! ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    18: {  # Прогреть вафельный рожок
+        "hit_label": "🧇 НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """🧇 Прогреть вафельный рожок
+
+Дождись золотистого цвета!
+
+━━━━━━━━━━━━━━━━
+
+Цвет: Светлый...""",
+            """🧇 Прогреть вафельный рожок
+
+Цвет: Желтоватый...""",
+            """🧇 Прогреть вафельный рожок
+
+Цвет: Золотистый! ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    19: {  # Добавить топпинг
+        "text": """🍨 Добавить топпинг
+
+Выбери топпинг для мороженого!""",
+        "options": [
+            ("🍫 Шоколадная крошка", "chocolate"), ("🍮 Карамель", "caramel"),
+            ("🫐 Свежие ягоды", "berries"), ("🥜 Орешки", "nuts"),
+        ],
+    },
+    20: {  # Взбить молоко
+        "hit_label": "🥛 НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """🥛 Взбить молоко
+
+Нажми когда пенка готова!
+
+━━━━━━━━━━━━━━━━
+
+Пенка: Формируется...""",
+            """🥛 Взбить молоко
+
+Пенка: Почти готова...""",
+            """🥛 Взбить молоко
+
+Пенка: Готова! ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    21: {  # Вставить трубочку
+        "hit_label": "🥤 Добавить",
+        "frames": [
+            """🥤 Вставить трубочку
+
+Добавь трубочку в напиток!
+
+━━━━━━━━━━━━━━━━
+
+Трубочка: Готова...""",
+        ],
+    },
+
+    # Павильон 4: Мандарин
+    22: {  # Повесить шары
+        "text": """🎄 Повесить шары
+
+Выбери цвет елочного шара!""",
+        "options": [
+            ("🔴 Красный", "red"), ("🟡 Золотой", "gold"),
+            ("⚪️ Серебряный", "silver"), ("🔵 Синий", "blue"),
+        ],
+    },
+    23: {  # Проверить гирлянду
+        "hit_label": "💡 НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """💡 Проверить гирлянду
+
+Гирлянда мигает разными цветами. Нажми когда загорится красный!
+
+━━━━━━━━━━━━━━━━
+
+Цвет: Синий...""",
+            """💡 Проверить гирлянду
+
+Цвет: Зеленый...""",
+            """💡 Проверить гирлянду
+
+Цвет: 🔴 КРАСНЫЙ! ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    24: {  # Упаковать свечи
+        "text": """🕯 Упаковать свечи
+
+Выбери набор свечей!""",
+        "options": [("3 свечи", "3"), ("5 свечей", "5"), ("7 свечей", "7")],
+    },
+    25: {  # Размотать гирлянду
+        "text": """🎀 Размотать гирлянду
+
+Разматывай гирлянду!
+
+━━━━━━━━━━━━━━━━
+
+Размотано: {count}/5""",
+        "options": [("🎀 Разматывать", "unwind")],
+        "counter": 5,
+        "done_text": """✅ Гирлянда размотана!
+
+Готово!""",
+    },
+    26: {  # Наполнить вазу
+        "text": """🍊 Наполнить вазу
+
+Добавляй мандарины в вазу!
+
+━━━━━━━━━━━━━━━━
+
+Добавлено: {count}/7""",
+        "options": [("🍊 Добавить мандарин", "add")],
+        "counter": 7,
+        "done_text": """✅ Ваза наполнена!
+
+Готово!""",
+    },
+    27: {  # Проверить снежный шар
+        "hit_label": "❄️ НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """❄️ Проверить снежный шар
+
+Встряхни снежный шар и нажми когда красиво кружится!
+
+━━━━━━━━━━━━━━━━
+
+Снежинки: Оседают...""",
+            """❄️ Проверить снежный шар
+
+Снежинки: Кружатся...""",
+            """❄️ Проверить снежный шар
+
+Снежинки: Красиво кружатся! ✨
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    28: {  # Зажечь свечи
+        "text": """🔥 Зажечь свечи
+
+Зажигай свечи по порядку!
+
+━━━━━━━━━━━━━━━━
+
+Зажжено: {count}/5""",
+        "options": [("🔥 Зажечь свечу", "light")],
+        "counter": 5,
+        "done_text": """✅ Все свечи зажжены!
+
+Готово!""",
+    },
+
+    # Павильон 5: Коробка конфет
+    29: {  # Сложить пряники
+        "text": """🍪 Сложить пряники
+
+Выбери форму пряников!""",
+        "options": [("⭐ Звездочки", "star"), ("🎄 Елочки", "tree"), ("❄️ Снежинки", "snowflake")],
+    },
+    30: {  # Отмерить 500г
+        "hit_label": "⚖️ НАЖАТЬ!",
+        "delay": 1.5,
+        "frames": [
+            """⚖️ Отмерить 500г
+
+Нужно отмерить ровно 500 грамм пряников!
+
+━━━━━━━━━━━━━━━━
+
+Вес: 200г...""",
+            """⚖️ Отмерить 500г
+
+Вес: 350г...""",
+            """⚖️ Отмерить 500г
+
+Вес: 500г! ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    31: {  # Добавить варенье
+        "text": """🫙 Добавить варенье
+
+Выбери варенье!""",
+        "options": [("🫐 Малина", "raspberry"), ("🟠 Облепиха", "sea_buckthorn"), ("🔴 Брусника", "cranberry")],
+    },
+    32: {  # Украсить пряник
+        "text": """🎨 Украсить пряник
+
+Выбери узор!""",
+        "options": [("❄️ Снежинка", "snowflake"), ("🎄 Елочка", "tree"), ("⭐ Звезда", "star")],
+    },
+    33: {  # Достать из духовки
+        "hit_label": "🔥 НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """🔥 Достать из духовки
+
+Пряники пекутся. Нажми когда подрумянятся!
+
+━━━━━━━━━━━━━━━━
+
+Цвет: Светлый...""",
+            """🔥 Достать из духовки
+
+Цвет: Золотистый...""",
+            """🔥 Достать из духовки
+
+Цвет: Подрумянились! ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    34: {  # Собрать микс конфет
+        "text": """🍬 Собрать микс конфет
+
+По 2 каждого цвета!
+
+━━━━━━━━━━━━━━━━
+
+🔴 Красные: {red}/2
+🔵 Синие: {blue}/2
+🟢 Зеленые: {green}/2
+🟡 Желтые: {yellow}/2""",
+        "options": [
+            ("🔴 Красная", "red"), ("🔵 Синяя", "blue"),
+            ("🟢 Зеленая", "green"), ("🟡 Желтая", "yellow"),
+        ],
+        "tally": 2,
+        "done_text": """✅ Микс собран!
+
+Готово!""",
+    },
+    35: {  # Завязать ленту
+        "hit_label": "✅ НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """🎀 Завязать ленту
+
+Завяжи ленту на коробке!
+
+━━━━━━━━━━━━━━━━
+
+Лента: Готова...""",
+            """🎀 Завязать ленту
+
+Лента: Завязана! ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    36: {  # Заварить чай
+        "text": """☕️ Заварить чай
+
+Выбери сорт чая!""",
+        "options": [("⚫️ Черный", "black"), ("🟢 Зеленый", "green"), ("🌿 Травяной", "herbal")],
+    },
+    37: {  # Закрыть коробку
+        "hit_label": "✅ НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """📦 Закрыть коробку
+
+Закрой коробку когда всё внутри!
+
+━━━━━━━━━━━━━━━━
+
+Коробка: Готова...""",
+            """📦 Закрыть коробку
+
+Коробка: Всё внутри! ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+
+    # Павильон 6: Самовар
+    38: {  # Заварить имбирный чай
+        "hit_label": "🔥 НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """🫖 Заварить имбирный чай
+
+Посетитель заказал согревающий имбирный чай. Нужно нагреть воду до идеальной температуры!
+
+Следи за термометром! 🌡️
+
+━━━━━━━━━━━━━━━━
+
+Температура: 25°C...""",
+            """🫖 Заварить имбирный чай
+
+Температура: 55°C...""",
+            """🫖 Заварить имбирный чай
+
+Температура: 88°C... 🔥
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    39: {  # Собрать набор 'Москва'
+        "steps": [
+            {
+                "text": """📦 Собрать набор "Москва"
+
+Выбери чай!""",
+                "options": [("🫖 Московский", "tea"), ("🫖 Классический", "classic")],
+            },
+            {
+                "text": """✅ Чай выбран!
+
+━━━━━━━━━━━━━━━━
+
+ШАГ 2/3: Выбери сервиз""",
+                "options": [("🍵 Гжель", "set"), ("🍵 Классический", "classic")],
+            },
+            {
+                "text": """✅ Сервиз выбран!
+
+━━━━━━━━━━━━━━━━
+
+ШАГ 3/3: Выбери варенье""",
+                "options": [
+                    ("🫙 Малина", "raspberry"), ("🫙 Облепиха", "sea_buckthorn"),
+                    ("🫙 Брусника", "cranberry"),
+                ],
+            },
+        ],
+    },
+    40: {  # Дождаться кипения
+        "hit_label": "💨 НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """💨 Дождаться кипения
+
+Самовар нагревается. Нажми когда пойдет пар!
+
+━━━━━━━━━━━━━━━━
+
+Пар: Нет...""",
+            """💨 Дождаться кипения
+
+Пар: Появляется...""",
+            """💨 Дождаться кипения
+
+Пар: Идет! 💨
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    41: {  # Разлить по чашкам
+        "text": """☕️ Разлить по чашкам
+
+Разливай чай гостям!
+
+━━━━━━━━━━━━━━━━
+
+Разлито: {count}/4""",
+        "options": [("☕️ Разлить", "pour")],
+        "counter": 4,
+        "done_text": """✅ Все чашки наполнены!
+
+Готово!""",
+    },
+    42: {  # Помешать сахар
+        "text": """🥄 Помешать сахар
+
+Делай круговые движения!
+
+━━━━━━━━━━━━━━━━
+
+Движений: {count}/3""",
+        "options": [("🥄 Помешать", "stir")],
+        "counter": 3,
+        "done_text": """✅ Сахар размешан!
+
+Готово!""",
+    },
+    43: {  # Проверить заварку
+        "hit_label": "⏱ НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """⏱ Проверить заварку
+
+Чай заваривается. Нажми через 3 минуты!
+
+━━━━━━━━━━━━━━━━
+
+Время: 1 минута...""",
+            """⏱ Проверить заварку
+
+Время: 2 минуты...""",
+            """⏱ Проверить заварку
+
+Время: 3 минуты! ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    44: {  # Собрать чайную пару
+        "text": """🍵 Собрать чайную пару
+
+Выбери чайную пару!""",
+        "options": [("🔵 Гжель", "gzel"), ("🔴 Красная", "red"), ("⚪️ Белая", "white")],
+    },
+    45: {  # Выбрать варенье
+        "text": """🫙 Выбрать варенье
+
+Выбери варенье!""",
+        "options": [
+            ("🫐 Малина", "raspberry"), ("🟠 Облепиха", "sea_buckthorn"),
+            ("🔴 Брусника", "cranberry"), ("🍒 Вишня", "cherry"),
+        ],
+    },
+    46: {  # Найти редкий сорт
+        "text": """🔍 *Найти редкий сорт*
+
+🫖 Полки уставлены банками с чаем
+📜 Этикетки с названиями: "Классический", "Иван-чай", "Смородиновый"...
+🔎 Нужно найти "Московский вечер" — редкий сорт
+
+Листай полку и ищи нужную банку.
+
+🎯 *Поиск:*""",
+        "options": [("⬅️ Назад", "prev"), ("➡️ Вперед", "next"), ("✅ Это он!", "found")],
+        "answer": "found",
+        "fail_text": "Продолжай искать...",
+        "fail_alert": False,
+    },
+
+    # Павильон 7: Фабрика подарков
+    47: {  # Упаковать подарок
+        "steps": [
+            {
+                "text": """🎁 Упаковать подарок для мамы
+
+Молодой человек выбрал набор свечей. Нужно красиво упаковать!
+
+━━━━━━━━━━━━━━━━
+
+ШАГ 1/5: Положи подарок на конвейер""",
+                "options": [("📦 Положить", "place")],
+            },
+            {
+                "text": """✅ Подарок на конвейере!
+
+━━━━━━━━━━━━━━━━
+
+ШАГ 2/5: Выбери упаковочную бумагу""",
+                "options": [
+                    ("🟡 Золотая", "gold"), ("🎄 Скандинавская", "scandinavian"),
+                    ("🔴 Красная", "red"), ("⚪️ Белая", "white"),
+                ],
+            },
+            {
+                "text": """✅ Элегантный выбор!
+
+━━━━━━━━━━━━━━━━
+
+ШАГ 3/5: Заверни бумагу""",
+                "options": [("🎀 Завернуть", "wrap")],
+            },
+            {
+                "text": """✅ Аккуратно!
+
+━━━━━━━━━━━━━━━━
+
+ШАГ 4/5: Завяжи бант""",
+                "options": [
+                    ("🎀 Красная лента", "red"), ("🤍 Белая лента", "white"),
+                    ("💛 Золотая лента", "gold"),
+                ],
+            },
+            {
+                "text": """✅ Красиво!
+
+━━━━━━━━━━━━━━━━
+
+ШАГ 5/5: Последний штрих — декор""",
+                "options": [
+                    ("🌲 Еловая веточка", "branch"), ("🔔 Колокольчик", "bell"),
+                    ("❄️ Снежинка", "snowflake"), ("✨ Без декора", "none"),
+                ],
+            },
+        ],
+    },
+    48: {  # Завернуть бумагу
+        "text": """🎀 Завернуть бумагу
+
+Выбери упаковочную бумагу!""",
+        "options": [
+            ("🟡 Золотая", "gold"), ("🎄 Скандинавская", "scandinavian"),
+            ("🔴 Красная", "red"), ("⚪️ Белая", "white"),
+        ],
+    },
+    50: {  # Написать пожелание
+        "text": """🏷 Написать пожелание
+
+Выбери пожелание для открытки!""",
+        "options": [("🎄 С Новым Годом", "newyear"), ("❤️ С любовью", "love"), ("🎉 Поздравляю", "congrats")],
+    },
+    51: {  # Добавить веточку
+        "hit_label": "🌲 Добавить",
+        "frames": [
+            """🌲 Добавить веточку
+
+Добавь еловую веточку к подарку!
+
+━━━━━━━━━━━━━━━━
+
+Веточка: Готова...""",
+        ],
+    },
+    52: {  # Отрезать ленту
+        "hit_label": "✂️ НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """✂️ Отрезать ленту
+
+Отрежь ленту в нужный момент!
+
+━━━━━━━━━━━━━━━━
+
+Лента: Натягивается...""",
+            """✂️ Отрезать ленту
+
+Лента: Натянута! ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    53: {  # Разгладить складки
+        "text": """👋 Разгладить складки
+
+Проводи рукой по складкам!
+
+━━━━━━━━━━━━━━━━
+
+Проведено: {count}/3""",
+        "options": [("👋 Разгладить", "smooth")],
+        "counter": 3,
+        "done_text": """✅ Складки разглажены!
+
+Готово!""",
+    },
+    54: {  # Украсить декором
+        "text": """🎨 *Украсить декором*
+
+🎁 Подарок лежит на столе
+✨ Коробка с декоративными элементами: шишки, бусины, колокольчики, звезды
+🌟 Нужно выбрать 2 элемента для финального штриха
+
+Выбери 2 декоративных элемента.
+
+🎯 *Декор (2 элемента):*""",
+        "options": [
+            ("🌲 Шишка", "cone"), ("🔵 Бусина", "bead"),
+            ("🔔 Колокольчик", "bell"), ("⭐ Звезда", "star"),
+        ],
+        "pick": 2,
+        "picked_text": "✅ Выбрано 2 элемента!",
+        "fail_text": "Нужно выбрать 2 элемента!",
+    },
+    55: {  # Остановить конвейер
+        "hit_label": "⏸ НАЖАТЬ!",
+        "delay": 2,
+        "frames": [
+            """⏸ Остановить конвейер
+
+Останови конвейер когда подарок на месте!
+
+━━━━━━━━━━━━━━━━
+
+Конвейер: Движется...""",
+            """⏸ Остановить конвейер
+
+Подарок: На месте! ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    56: {  # Посыпать снегом
+        "hit_label": "❄️ Посыпать",
+        "frames": [
+            """❄️ Посыпать снегом
+
+Посыпь подарок искусственным снегом!
+
+━━━━━━━━━━━━━━━━
+
+Снег: Готов...""",
+        ],
+    },
+    57: {  # Выбрать открытку
+        "text": """💌 Выбрать открытку
+
+Выбери дизайн открытки!""",
+        "options": [("🎄 Новогодняя", "newyear"), ("❄️ Зимняя", "winter"), ("🎁 Подарочная", "gift")],
+    },
+    58: {  # Отмерить ленту
+        "hit_label": "📏 НАЖАТЬ!",
+        "delay": 1.5,
+        "frames": [
+            """📏 Отмерить ленту
+
+Отмерь 50 см ленты!
+
+━━━━━━━━━━━━━━━━
+
+Длина: 20см...""",
+            """📏 Отмерить ленту
+
+Длина: 35см...""",
+            """📏 Отмерить ленту
+
+Длина: 50см! ✅
+
+⚡ СЕЙЧАС!""",
+        ],
+    },
+    59: {  # Финальный штрих
+        "text": """🎁 Финальный штрих
+
+Добавь последний штрих к подарку!""",
+        "options": [("🌸 Цветок", "flower"), ("🔔 Бубенчик", "bell"), ("✨ Без декора", "none")],
+    },
+}
+
 FACTS_DATA = [
     # Павильон 1: Поезд
     {"id": 1, "pavilion_id": 1, "text": "Первые вязаные варежки появились на Руси в XIII веке. Их украшали особыми узорами-оберегами от холода!"},
@@ -230,42 +1208,43 @@ FACTS_DATA = [
     {"id": 59, "pavilion_id": 7, "text": "Фабрики подарков работают круглосуточно перед Новым годом!"}
 ]
 
+# Справочные таблицы базы и их колонки (в порядке значений в данных модуля)
+REFERENCE_TABLES = {
+    "pavilions": (PAVILIONS_DATA, ("id", "name", "emoji", "location", "price", "reward",
+                                   "description", "atmosphere", "tasks_count")),
+    "tasks": (TASKS_DATA, ("id", "pavilion_id", "name", "emoji", "type", "reward", "fact_id")),
+    "facts": (FACTS_DATA, ("id", "pavilion_id", "text")),
+}
+
 async def load_game_data():
-    """Загрузить игровые данные в базу"""
-    import aiosqlite  # pyright: ignore[reportMissingImports]
-    from config import DATABASE_PATH
-    
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        # Загружаем павильоны
-        for pav in PAVILIONS_DATA:
-            await db.execute("""
-                INSERT OR REPLACE INTO pavilions 
-                (id, name, emoji, location, price, reward, description, atmosphere, tasks_count)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                pav["id"], pav["name"], pav["emoji"], pav["location"],
-                pav["price"], pav["reward"], pav["description"], pav["atmosphere"],
-                pav["tasks_count"]
-            ))
-        
-        # Загружаем задания
-        for task in TASKS_DATA:
-            await db.execute("""
-                INSERT OR REPLACE INTO tasks 
-                (id, pavilion_id, name, emoji, type, reward, fact_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                task["id"], task["pavilion_id"], task["name"], task["emoji"],
-                task["type"], task["reward"], task["fact_id"]
-            ))
-        
-        # Загружаем факты
-        for fact in FACTS_DATA:
-            await db.execute("""
-                INSERT OR REPLACE INTO facts 
-                (id, pavilion_id, text)
-                VALUES (?, ?, ?)
-            """, (fact["id"], fact["pavilion_id"], fact["text"]))
-        
-        await db.commit()
+    """Загрузить игровые данные в справочные таблицы базы
+
+    Бот читает справочник из памяти (catalog.CATALOG), таблицы нужны для
+    запросов к базе. Поэтому таблицы сначала сверяются с данными через
+    соединение читателя, а писатель берётся, только если строки изменились:
+    процессы кластера при старте не переписывают справочники по очереди.
+    Возвращает число записанных строк.
+    """
+    import database
+
+    changed = {}
+    async with database.get_pool().read() as db:
+        for table, (data, columns) in REFERENCE_TABLES.items():
+            cursor = await db.execute(f"SELECT {', '.join(columns)} FROM {table}")
+            stored = {tuple(row) for row in await cursor.fetchall()}
+            rows = [tuple(item[column] for column in columns) for item in data]
+            rows = [row for row in rows if row not in stored]
+            if rows:
+                changed[table] = rows
 
+    if not changed:
+        return 0
+    async with database.get_pool().write() as db:
+        for table, rows in changed.items():
+            columns = REFERENCE_TABLES[table][1]
+            await db.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})",
+                rows
+            )
+    return sum(len(rows) for rows in changed.values())
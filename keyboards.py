@@ -0,0 +1,128 @@
+"""Готовые клавиатуры экранов бота
+
+InlineKeyboardMarkup в python-telegram-bot неизменяем, поэтому одну и ту же
+клавиатуру можно отдавать всем игрокам. Каждая клавиатура собирается один
+раз для своего набора параметров (павильон, задание, маска открытых
+павильонов) и дальше берётся из lru_cache. Клавиатуры заданий собирает
+движок заданий (task_engine.py).
+"""
+
+from functools import lru_cache
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from catalog import CATALOG, popcount
+
+
+def _column(*buttons) -> InlineKeyboardMarkup:
+    """Клавиатура из кнопок (подпись, callback_data) по одной в ряд"""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(label, callback_data=data)] for label, data in buttons])
+
+
+@lru_cache(maxsize=None)
+def start_keyboard() -> InlineKeyboardMarkup:
+    return _column(("🎪 Открыть ярмарку", "menu"))
+
+@lru_cache(maxsize=None)
+def menu_keyboard() -> InlineKeyboardMarkup:
+    return _column(("🗺 Карта ярмарки", "map"), ("📖 Моя коллекция", "collection"))
+
+@lru_cache(maxsize=256)
+def map_keyboard(pavilions_mask: int) -> InlineKeyboardMarkup:
+    """Карта ярмарки: открытые павильоны ведут внутрь, закрытые — к покупке"""
+    buttons = []
+    for pav in CATALOG.pavilions:
+        if pavilions_mask & pav.bit:
+            buttons.append((f"✅ {pav.emoji} {pav.name}", f"pav_enter:{pav.id}"))
+        else:
+            buttons.append((f"🔒 {pav.emoji} {pav.name} · {pav.price}🍊", f"pav_view:{pav.id}"))
+    buttons.append(("⬅️ В меню", "menu"))
+    return _column(*buttons)
+
+@lru_cache(maxsize=128)
+def pavilion_preview_keyboard(pav_id: int, buy_label: str = None) -> InlineKeyboardMarkup:
+    """Закрытый павильон: покупка (если хватает мандаринок) и возврат на карту"""
+    buttons = [(buy_label, f"pav_buy:{pav_id}")] if buy_label else []
+    buttons.append(("⬅️ Назад на карту", "map"))
+    return _column(*buttons)
+
+@lru_cache(maxsize=None)
+def pavilion_opened_keyboard(pav_id: int) -> InlineKeyboardMarkup:
+    pav = CATALOG.pavilion(pav_id)
+    return _column((f"{pav.emoji} Войти в павильон", f"pav_enter:{pav_id}"), ("🗺 На карту", "map"))
+
+@lru_cache(maxsize=None)
+def pavilion_keyboard(pav_id: int) -> InlineKeyboardMarkup:
+    """Задания павильона"""
+    buttons = [(f"{task.emoji} {task.name}", f"task_start:{pav_id}:{task.id}")
+               for task in CATALOG.pavilion_tasks(pav_id)]
+    buttons.append(("⬅️ На карту ярмарки", "map"))
+    return _column(*buttons)
+
+@lru_cache(maxsize=None)
+def retry_task_keyboard(pav_id: int, task_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔄 Попробовать снова", callback_data=f"task_start:{pav_id}:{task_id}"),
+        InlineKeyboardButton("⬅️ Назад в павильон", callback_data=f"pav_enter:{pav_id}")
+    ]])
+
+@lru_cache(maxsize=None)
+def back_to_pavilion_keyboard(pav_id: int) -> InlineKeyboardMarkup:
+    return _column(("⬅️ Назад в павильон", f"pav_enter:{pav_id}"))
+
+@lru_cache(maxsize=None)
+def task_reward_keyboard(pav_id: int, task_id: int) -> InlineKeyboardMarkup:
+    return _column(("📚 Узнать факт", f"fact:{pav_id}:{task_id}"))
+
+@lru_cache(maxsize=None)
+def fact_keyboard(pav_id: int) -> InlineKeyboardMarkup:
+    return _column(("➡️ Ещё задание", f"pav_enter:{pav_id}"), ("🗺 На карту", "map"))
+
+@lru_cache(maxsize=None)
+def collection_keyboard() -> InlineKeyboardMarkup:
+    return _column(("📚 Факты по павильонам", "facts_menu"), ("📊 Статистика", "stats"), ("⬅️ В меню", "menu"))
+
+@lru_cache(maxsize=None)
+def back_to_collection_keyboard() -> InlineKeyboardMarkup:
+    return _column(("⬅️ Назад", "collection"))
+
+@lru_cache(maxsize=None)
+def back_to_facts_menu_keyboard() -> InlineKeyboardMarkup:
+    return _column(("⬅️ К павильонам", "facts_menu"))
+
+def facts_counts(facts_mask: int) -> tuple:
+    """Число собранных фактов в каждом павильоне (в порядке CATALOG.pavilions)"""
+    return tuple(popcount(facts_mask & CATALOG.pavilion_fact_mask(pav.id)) for pav in CATALOG.pavilions)
+
+@lru_cache(maxsize=1024)
+def facts_menu_keyboard(counts: tuple) -> InlineKeyboardMarkup:
+    """Павильоны с прогрессом сбора фактов; counts — результат facts_counts()"""
+    buttons = []
+    for pav, count in zip(CATALOG.pavilions, counts):
+        total = popcount(CATALOG.pavilion_fact_mask(pav.id))
+        status = "✅" if count == total else ""
+        buttons.append((f"{status} {pav.emoji} {pav.name} · {count}/{total}", f"facts_pav:{pav.id}"))
+    buttons.append(("⬅️ Назад", "collection"))
+    return _column(*buttons)
+
+
+CACHED_KEYBOARDS = (
+    start_keyboard, menu_keyboard, map_keyboard, pavilion_preview_keyboard, pavilion_opened_keyboard,
+    pavilion_keyboard, retry_task_keyboard, back_to_pavilion_keyboard, task_reward_keyboard,
+    fact_keyboard, collection_keyboard, back_to_collection_keyboard, back_to_facts_menu_keyboard,
+    facts_menu_keyboard,
+)
+
+def cache_stats() -> dict:
+    """Попадания и промахи кэша по всем клавиатурам"""
+    hits = misses = size = 0
+    for keyboard in CACHED_KEYBOARDS:
+        info = keyboard.cache_info()
+        hits += info.hits
+        misses += info.misses
+        size += info.currsize
+    total = hits + misses
+    return {
+        "size": size,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 3) if total else 0.0,
+    }
@@ -5,8 +5,8 @@ import os
 from datetime import datetime
 from pathlib import Path
 
-# Создаем директорию для логов
-LOG_DIR = Path("logs")
+# Создаем директорию для логов (LOG_DIR — другой каталог, например для тестов)
+LOG_DIR = Path(os.getenv("LOG_DIR", "logs"))
 LOG_DIR.mkdir(exist_ok=True)
 
 # Настройка логирования
@@ -0,0 +1,363 @@
+"""Редактирование сообщений без повторной отправки того же содержимого
+
+Повторное нажатие на ту же кнопку перерисовывает тот же экран: Telegram
+отвечает «message is not modified», а запрос к API и запись в лог ошибок
+тратятся впустую. Для каждого сообщения (чат, message_id) запоминается
+отпечаток последнего отправленного содержимого — текста, разметки и
+клавиатуры. Совпадающая правка не отправляется: на нажатие уже ответил
+button_handler через query.answer().
+
+Отправка идёт через OutboundGovernor: ведро токенов на каждый чат и общее
+ведро держат поток правок в лимитах Telegram. Правки одного сообщения
+отправляются строго по очереди, а из ожидающих отправки остаётся только
+последняя (промежуточные кадры заданий на реакцию не нужны, если уже есть
+более новый). После RetryAfter правка повторяется сама, когда чат снова
+можно редактировать. Обработчик кнопки не ждёт отправки: edit_message
+возвращается, как только правка поставлена в очередь, и очередь игрока
+(update_processor) и время обработчика не зависят от лимитов.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from telegram.error import BadRequest, RetryAfter
+from config import (
+    MESSAGE_FINGERPRINTS_MAX, SEND_GLOBAL_RATE, SEND_GLOBAL_BURST, SEND_CHAT_RATE, SEND_CHAT_BURST,
+    SEND_MAX_RETRIES,
+)
+from logger import log_error
+
+NOT_MODIFIED = "message is not modified"
+
+
+def message_key(query):
+    """Ключ сообщения, к которому привязана кнопка, или None"""
+    if query.inline_message_id:
+        return query.inline_message_id
+    message = query.message
+    if message is None:
+        return None
+    return (message.chat.id, message.message_id)
+
+
+def chat_key(key):
+    """Чат сообщения для лимитов отправки (у inline-сообщений — само сообщение)"""
+    if isinstance(key, tuple):
+        return key[0]
+    return key
+
+
+def fingerprint(text: str, reply_markup, parse_mode) -> int:
+    """Отпечаток содержимого сообщения
+
+    InlineKeyboardMarkup сравнивается и хешируется по кнопкам, поэтому
+    одинаковые клавиатуры дают один отпечаток, даже если это разные объекты.
+    """
+    return hash((text, parse_mode, reply_markup))
+
+
+class RenderedMessages:
+    """Отпечатки последнего содержимого сообщений с вытеснением по LRU"""
+
+    def __init__(self, max_entries: int = MESSAGE_FINGERPRINTS_MAX):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self.sent = 0
+        self.skipped = 0
+        self.not_modified = 0
+
+    def is_current(self, key, digest: int) -> bool:
+        """Показано ли сейчас в сообщении это содержимое"""
+        if self._entries.get(key) != digest:
+            return False
+        self._entries.move_to_end(key)
+        return True
+
+    def remember(self, key, digest: int):
+        self._entries[key] = digest
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def forget(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Счётчики для логов и мониторинга"""
+        edits = self.sent + self.skipped + self.not_modified
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "not_modified": self.not_modified,
+            "skip_rate": round((self.skipped + self.not_modified) / edits, 3) if edits else 0.0,
+        }
+
+
+def retry_seconds(error: RetryAfter) -> float:
+    """Пауза из RetryAfter в секундах (число или timedelta в зависимости от версии PTB)"""
+    retry_after = error.retry_after
+    if hasattr(retry_after, "total_seconds"):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, запас не больше capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Сколько ждать до следующего токена (0 — можно отправлять)"""
+        self._refill(now)
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, seconds: float, now: float):
+        """Не выдавать токены seconds секунд (после RetryAfter)"""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    def idle(self, now: float) -> bool:
+        """Ведро полное и не заблокировано: его можно удалить"""
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class _Outgoing:
+    """Очередь правок одного сообщения: ожидающая правка и её результат"""
+
+    __slots__ = ("chat_id", "send", "future")
+
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.send = None
+        self.future = None
+
+
+def _resolve(future, result):
+    if not future.done():
+        future.set_result(result)
+
+def _fail(future, error):
+    if not future.done():
+        future.set_exception(error)
+
+
+class OutboundGovernor:
+    """Исходящие правки сообщений с лимитами на чат и на бота
+
+    На каждое сообщение с правками работает одна задача-отправитель.
+    Новая правка, пришедшая, пока предыдущая ждёт своей очереди, заменяет
+    её: ожидавший вызов получает False. Правка, которая уже отправляется,
+    не прерывается, а новая уйдёт следом.
+    """
+
+    # Сколько вёдер чатов держать, прежде чем удалять простаивающие
+    PRUNE_THRESHOLD = 10000
+
+    def __init__(self, global_rate: float = SEND_GLOBAL_RATE, global_burst: float = SEND_GLOBAL_BURST,
+                 chat_rate: float = SEND_CHAT_RATE, chat_burst: float = SEND_CHAT_BURST,
+                 max_retries: int = SEND_MAX_RETRIES):
+        self._global = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._chats = {}
+        # ключ сообщения -> _Outgoing, пока у сообщения есть неотправленные правки
+        self._outgoing = {}
+        self._senders = set()
+        self.sent = 0
+        self.coalesced = 0
+        self.throttled = 0
+        self.retries = 0
+
+    def busy(self, key) -> bool:
+        """Есть ли у сообщения правки в очереди или в отправке"""
+        return key in self._outgoing
+
+    def enqueue(self, key, chat_id, send) -> asyncio.Future:
+        """Поставить правку send() в очередь сообщения key, не дожидаясь отправки
+
+        Возвращает future с результатом send() (False, если правку заменила более новая).
+        """
+        future = asyncio.get_running_loop().create_future()
+        outgoing = self._outgoing.get(key)
+        if outgoing is None:
+            outgoing = self._outgoing[key] = _Outgoing(chat_id)
+            task = asyncio.ensure_future(self._run(key, outgoing))
+            # Держим ссылку до завершения, иначе задачу может собрать GC
+            self._senders.add(task)
+            task.add_done_callback(self._senders.discard)
+        elif outgoing.future is not None:
+            # Предыдущая правка так и не ушла: показываем сразу более новую
+            _resolve(outgoing.future, False)
+            self.coalesced += 1
+        outgoing.send = send
+        outgoing.future = future
+        return future
+
+    async def _run(self, key, outgoing):
+        try:
+            while outgoing.future is not None:
+                await self._wait_turn(outgoing.chat_id)
+                send, future = outgoing.send, outgoing.future
+                outgoing.send = outgoing.future = None
+                if future.done():
+                    # Вызвавший обработчик отменён
+                    continue
+                await self._deliver(outgoing, send, future)
+        finally:
+            if self._outgoing.get(key) is outgoing:
+                del self._outgoing[key]
+            if outgoing.future is not None:
+                outgoing.future.cancel()
+
+    async def _deliver(self, outgoing, send, future):
+        attempt = 0
+        while True:
+            try:
+                result = await send()
+            except RetryAfter as e:
+                attempt += 1
+                self.retries += 1
+                self._bucket(outgoing.chat_id).block(retry_seconds(e), time.monotonic())
+                if attempt > self.max_retries:
+                    _fail(future, e)
+                    return
+                await self._wait_turn(outgoing.chat_id)
+                if outgoing.future is not None:
+                    # Пока ждали, пришла более новая правка: повторять старую незачем
+                    _resolve(future, False)
+                    self.coalesced += 1
+                    return
+            except Exception as e:
+                _fail(future, e)
+                return
+            else:
+                self.sent += 1
+                _resolve(future, result)
+                return
+
+    def _bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.PRUNE_THRESHOLD:
+                self._prune()
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _prune(self):
+        now = time.monotonic()
+        busy_chats = {outgoing.chat_id for outgoing in self._outgoing.values()}
+        for chat_id in [c for c, bucket in self._chats.items() if c not in busy_chats and bucket.idle(now)]:
+            del self._chats[chat_id]
+
+    async def _wait_turn(self, chat_id):
+        """Дождаться токена в ведре чата и в общем ведре"""
+        bucket = self._bucket(chat_id)
+        while True:
+            now = time.monotonic()
+            wait = max(self._global.wait_time(now), bucket.wait_time(now))
+            if wait <= 0:
+                self._global.take()
+                bucket.take()
+                return
+            self.throttled += 1
+            await asyncio.sleep(wait)
+
+    def cancel_all(self):
+        """Отменить все неотправленные правки (остановка бота)"""
+        for task in list(self._senders):
+            task.cancel()
+
+    def stats(self) -> dict:
+        """Счётчики для логов и мониторинга"""
+        return {
+            "queued": len(self._outgoing),
+            "chats": len(self._chats),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "throttled": self.throttled,
+            "retries": self.retries,
+        }
+
+
+# Последнее содержимое сообщений с кнопками
+rendered_messages = RenderedMessages()
+
+# Исходящие правки с лимитами Telegram
+outbound = OutboundGovernor()
+
+def _log_failed_edit(future):
+    """Ошибка правки, которую никто не ждёт, попадает в лог"""
+    if not future.cancelled() and future.exception() is not None:
+        log_error(future.exception(), "edit_message")
+
+async def edit_message(query, text: str, reply_markup=None, parse_mode=None, wait: bool = False) -> bool:
+    """Отредактировать сообщение кнопки; False, если правка не понадобилась
+
+    Совпадающая правка не отправляется. По умолчанию правка только ставится
+    в очередь OutboundGovernor (True), а ошибки отправки пишутся в лог.
+    С wait=True вызов ждёт отправки: если Telegram всё же ответил
+    «message is not modified» (например, после перезапуска бота), ошибка
+    не пробрасывается, а правка, которую до отправки заменила более новая
+    правка того же сообщения, возвращает False.
+    """
+    key = message_key(query)
+    digest = fingerprint(text, reply_markup, parse_mode)
+    # Пока в очереди есть другая правка, показанное содержимое ещё может измениться
+    if key is not None and not outbound.busy(key) and rendered_messages.is_current(key, digest):
+        rendered_messages.skipped += 1
+        return False
+
+    async def send() -> bool:
+        try:
+            await query.edit_message_text(text=text, reply_markup=reply_markup, parse_mode=parse_mode)
+        except BadRequest as e:
+            if NOT_MODIFIED not in str(e).lower():
+                if key is not None:
+                    rendered_messages.forget(key)
+                raise
+            rendered_messages.not_modified += 1
+            if key is not None:
+                rendered_messages.remember(key, digest)
+            return False
+        except Exception:
+            if key is not None:
+                rendered_messages.forget(key)
+            raise
+
+        rendered_messages.sent += 1
+        if key is not None:
+            rendered_messages.remember(key, digest)
+        return True
+
+    if key is None:
+        return await send()
+    future = outbound.enqueue(key, chat_key(key), send)
+    if wait:
+        return await future
+    future.add_done_callback(_log_failed_edit)
+    return True
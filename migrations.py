@@ -0,0 +1,685 @@
+"""Версионные миграции схемы базы данных
+
+Версия схемы хранится в PRAGMA user_version. Каждая миграция — изменение
+схемы (только добавление таблиц, колонок и индексов) и, если нужно,
+перенос данных порциями: каждая порция — короткая транзакция писателя,
+после которой база свободна для бота и процессов кластера. Версия
+повышается, только когда перенос закончен, а сами переносы повторяемы,
+поэтому прерванная миграция продолжается со следующего запуска. Старые
+колонки и таблицы не удаляются и не меняются.
+
+Бот не останавливается на время переноса. При старте (check_schema) он
+сразу применяет изменения схемы и, пока переносы не закончены, читает
+прогресс игроков и из старых источников (см. database.legacy_progress).
+Сами переносы идут в фоне (BackgroundMigration) в одном процессе; их
+можно запустить и отдельно:
+
+    python migrations.py            — применить недостающие миграции
+    python migrations.py --dry-run  — показать план: сколько строк перенести
+
+Скорость и оставшееся время переноса пишутся в лог по фактическому
+времени порций.
+"""
+
+import asyncio
+import sys
+import time
+from config import (
+    MIGRATION_BATCH_SIZE, MIGRATION_BATCH_PAUSE_MS, MIGRATION_IN_BACKGROUND, MIGRATION_POLL_INTERVAL,
+)
+import database
+from catalog import MASK_WORD_BITS
+from database import (
+    get_pool, FOLD_USER_SQL, PAVILION_MASK_COLUMNS, FACT_MASK_COLUMNS, LEGACY_JSON, LEGACY_TABLES,
+    legacy_ids_sql, mask_word_sql,
+)
+from logger import log_info, log_warning, log_error
+
+
+class Migration:
+    """Шаг миграции: version, схема, перенос данных и его оценка
+
+    schema(db) выполняется в транзакции писателя. backfill(batch_size,
+    pause, progress) переносит данные порциями, после каждой порции
+    вызывает progress(строк) и ждёт pause секунд; возвращает число
+    обработанных строк. estimate(db) оценивает число строк для переноса
+    (для --dry-run и оставшегося времени в логе).
+    """
+
+    def __init__(self, version: int, name: str, schema, backfill=None, estimate=None):
+        self.version = version
+        self.name = name
+        self.schema = schema
+        self.backfill = backfill
+        self.estimate = estimate
+
+
+class _Progress:
+    """Ход переноса одного шага: строки, измеренная скорость и оставшееся время"""
+
+    # Как часто писать ход переноса в лог (сек)
+    LOG_INTERVAL = 5
+
+    def __init__(self, step: Migration, total: int):
+        self.step = step
+        self.total = total
+        self.rows = 0
+        self.started = self.logged = time.monotonic()
+
+    def __call__(self, rows: int):
+        self.rows += rows
+        now = time.monotonic()
+        if now - self.logged >= self.LOG_INTERVAL:
+            self.logged = now
+            log_info("Миграция: перенос данных", self.stats())
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        rate = self.rows / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total - self.rows)
+        return {
+            "version": self.step.version,
+            "name": self.step.name,
+            "rows": self.rows,
+            "total": self.total,
+            "rows_per_second": round(rate),
+            "eta_seconds": round(remaining / rate) if rate else None,
+            "seconds": round(elapsed, 2),
+        }
+
+
+async def _columns(db, table: str) -> set:
+    """Колонки таблицы (пустое множество, если таблицы нет)"""
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in await cursor.fetchall()}
+
+async def _ensure_column(db, table: str, column: str, definition: str):
+    """Добавить колонку в таблицу, если её ещё нет"""
+    if column not in await _columns(db, table):
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+async def _count(db, sql: str, params: tuple = ()) -> int:
+    cursor = await db.execute(sql, params)
+    return (await cursor.fetchone())[0]
+
+async def _count_users(db) -> int:
+    """Оценка сверху, пока нужных колонок ещё нет: все пользователи"""
+    if not await _columns(db, "users"):
+        return 0
+    return await _count(db, "SELECT COUNT(*) FROM users")
+
+
+# 1. Исходная схема: пользователи и справочники
+
+async def _schema_base(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            coins INTEGER DEFAULT 50,
+            pavilions_open TEXT DEFAULT '[]',
+            facts_collected TEXT DEFAULT '[]',
+            tasks_completed INTEGER DEFAULT 0,
+            guests_served INTEGER DEFAULT 0,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Таблица павильонов (справочная)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS pavilions (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            emoji TEXT NOT NULL,
+            location TEXT NOT NULL,
+            price INTEGER NOT NULL,
+            reward INTEGER NOT NULL,
+            description TEXT NOT NULL,
+            atmosphere TEXT NOT NULL,
+            tasks_count INTEGER NOT NULL
+        )
+    """)
+
+    # Таблица заданий (справочная)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            pavilion_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            emoji TEXT NOT NULL,
+            type TEXT NOT NULL,
+            reward INTEGER NOT NULL,
+            fact_id INTEGER,
+            FOREIGN KEY (pavilion_id) REFERENCES pavilions(id)
+        )
+    """)
+
+    # Таблица фактов (справочная)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS facts (
+            id INTEGER PRIMARY KEY,
+            pavilion_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            FOREIGN KEY (pavilion_id) REFERENCES pavilions(id)
+        )
+    """)
+
+
+# 2. Прогресс в таблицах связей вместо JSON-колонок users. Сейчас это промежуточный
+# шаг: бот пишет только маски (шаг 3), а таблицы остаются источником для шагов 3, 5, 6
+
+async def _schema_progress_tables(db):
+    # Открытые павильоны пользователей
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_pavilions (
+            user_id INTEGER NOT NULL,
+            pavilion_id INTEGER NOT NULL,
+            opened_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, pavilion_id)
+        ) WITHOUT ROWID
+    """)
+
+    # Собранные факты пользователей
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_facts (
+            user_id INTEGER NOT NULL,
+            fact_id INTEGER NOT NULL,
+            collected_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, fact_id)
+        ) WITHOUT ROWID
+    """)
+
+def _parse_id_list(raw) -> list:
+    """Разобрать устаревший JSON-список ID из колонки users"""
+    import json
+    try:
+        ids = json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        return []
+    return [i for i in ids if isinstance(i, int)] if isinstance(ids, list) else []
+
+JSON_PROGRESS_WHERE = """
+    (COALESCE(pavilions_open, '[]') != '[]' OR COALESCE(facts_collected, '[]') != '[]')
+"""
+
+async def migrate_json_progress(batch_size: int = MIGRATION_BATCH_SIZE, pause: float = 0, progress=None) -> int:
+    """Скопировать прогресс из JSON-колонок users в user_pavilions/user_facts
+
+    JSON-колонки остаются как есть (их читает бот, пока перенос идёт), строки
+    связей вставляются через INSERT OR IGNORE, поэтому повторный запуск
+    безопасен. Возвращает число перенесённых пользователей.
+    """
+    migrated = 0
+    last_user_id = None
+    while True:
+        async with get_pool().write() as db:
+            cursor = await db.execute(
+                f"""
+                SELECT user_id, pavilions_open, facts_collected FROM users
+                WHERE user_id > COALESCE(?, -9223372036854775808) AND {JSON_PROGRESS_WHERE}
+                ORDER BY user_id
+                LIMIT ?
+                """,
+                (last_user_id, batch_size)
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                break
+            await db.executemany(
+                "INSERT OR IGNORE INTO user_pavilions (user_id, pavilion_id) VALUES (?, ?)",
+                [(row[0], pav_id) for row in rows for pav_id in _parse_id_list(row[1])]
+            )
+            await db.executemany(
+                "INSERT OR IGNORE INTO user_facts (user_id, fact_id) VALUES (?, ?)",
+                [(row[0], fact_id) for row in rows for fact_id in _parse_id_list(row[2])]
+            )
+        migrated += len(rows)
+        last_user_id = rows[-1][0]
+        if progress is not None:
+            progress(len(rows))
+        await asyncio.sleep(pause)
+    return migrated
+
+async def _estimate_json_progress(db) -> int:
+    if not {"pavilions_open", "facts_collected"} <= await _columns(db, "users"):
+        return 0
+    return await _count(db, f"SELECT COUNT(*) FROM users WHERE {JSON_PROGRESS_WHERE}")
+
+
+# 3. Прогресс в виде битовых масок: бит = ID павильона/факта - 1, по 64 бита
+# на колонку INTEGER (см. catalog.mask_words); слова фактов — FACT_MASK_COLUMNS
+
+async def _schema_progress_masks(db):
+    await _ensure_column(db, "users", "pavilions_mask", "INTEGER NOT NULL DEFAULT 0")
+    await _ensure_column(db, "users", "facts_mask", "INTEGER NOT NULL DEFAULT 0")
+
+def _mask_set_sql(columns: tuple) -> str:
+    """SQL: OR слов масок columns с ID из таблиц связей"""
+    ids_sql = legacy_ids_sql(columns, (LEGACY_TABLES,), "users")
+    return ", ".join(f"{column} = {column} | {mask_word_sql(ids_sql, i)}" for i, column in enumerate(columns))
+
+PROGRESS_USERS_SQL = """
+    SELECT user_id FROM user_pavilions WHERE user_id > COALESCE(?, -9223372036854775808)
+    UNION
+    SELECT user_id FROM user_facts WHERE user_id > COALESCE(?, -9223372036854775808)
+    ORDER BY user_id
+    LIMIT ?
+"""
+
+async def _out_of_range_progress(db, first_user_id: int, last_user_id: int) -> list:
+    """Строки таблиц связей с ID, которых нет места в масках (до 5 штук)"""
+    cursor = await db.execute(
+        f"""
+        SELECT 'pavilion', user_id, pavilion_id FROM user_pavilions
+        WHERE user_id BETWEEN ? AND ? AND pavilion_id NOT BETWEEN 1 AND {MASK_WORD_BITS * len(PAVILION_MASK_COLUMNS)}
+        UNION ALL
+        SELECT 'fact', user_id, fact_id FROM user_facts
+        WHERE user_id BETWEEN ? AND ? AND fact_id NOT BETWEEN 1 AND {MASK_WORD_BITS * len(FACT_MASK_COLUMNS)}
+        LIMIT 5
+        """,
+        (first_user_id, last_user_id, first_user_id, last_user_id)
+    )
+    return [tuple(row) for row in await cursor.fetchall()]
+
+async def backfill_progress_masks(batch_size: int = MIGRATION_BATCH_SIZE, pause: float = 0, progress=None) -> int:
+    """Заполнить маски прогресса по таблицам user_pavilions/user_facts
+
+    Проходит всех пользователей со строками в таблицах связей по возрастанию
+    user_id; биты добавляются через OR, поэтому повторный запуск безопасен и
+    дополняет маски, заполненные раньше (например, факты с ID больше 63 до
+    появления второго слова). ID, для которых нет места в маске, — ошибка:
+    перенос останавливается, а не теряет прогресс игроков. Возвращает число
+    обработанных пользователей.
+    """
+    updated = 0
+    last_user_id = None
+    update_sql = (
+        f"UPDATE users SET {_mask_set_sql(PAVILION_MASK_COLUMNS)}, "
+        f"{_mask_set_sql(FACT_MASK_COLUMNS)} WHERE user_id = ?"
+    )
+    while True:
+        async with get_pool().write() as db:
+            cursor = await db.execute(PROGRESS_USERS_SQL, (last_user_id, last_user_id, batch_size))
+            user_ids = [row[0] for row in await cursor.fetchall()]
+            if not user_ids:
+                break
+            invalid = await _out_of_range_progress(db, user_ids[0], user_ids[-1])
+            if invalid:
+                raise ValueError(f"ID прогресса не помещаются в маски (вид, user_id, ID): {invalid}")
+            await db.executemany(update_sql, [(user_id,) for user_id in user_ids])
+        updated += len(user_ids)
+        last_user_id = user_ids[-1]
+        if progress is not None:
+            progress(len(user_ids))
+        await asyncio.sleep(pause)
+    return updated
+
+async def _estimate_progress_masks(db) -> int:
+    if not await _columns(db, "user_pavilions"):
+        return await _count_users(db)
+    return await _count(
+        db, "SELECT COUNT(*) FROM (SELECT user_id FROM user_pavilions UNION SELECT user_id FROM user_facts)"
+    )
+
+
+# 4. Состояния начатых заданий (state_backends.SqliteBackend), state — JSON
+
+async def _schema_task_states(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS task_states (
+            user_id INTEGER NOT NULL,
+            task_id INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (user_id, task_id)
+        ) WITHOUT ROWID
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_task_states_updated ON task_states(updated_at)"
+    )
+
+
+# 5. Журнал событий игроков (только добавление, строки не удаляются и не меняются).
+# users.last_event_id — до какого события журнал уже свёрнут в строку игрока
+
+async def _schema_events(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            ref_id INTEGER,
+            coins INTEGER NOT NULL DEFAULT 0,
+            tasks INTEGER NOT NULL DEFAULT 0,
+            guests INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL
+        )
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_events_user ON events(user_id, id)"
+    )
+    await _ensure_column(db, "users", "last_event_id", "INTEGER NOT NULL DEFAULT 0")
+    # Все события с id <= folded_upto уже свёрнуты у всех игроков
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS event_snapshot (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            folded_upto INTEGER NOT NULL
+        )
+    """)
+    await db.execute(
+        "INSERT OR IGNORE INTO event_snapshot (id, folded_upto) VALUES (1, 0)"
+    )
+
+# Журнал игрока начинается с baseline (игроки до журнала) или с join (новые игроки)
+NO_BASELINE_WHERE = """
+    NOT EXISTS (SELECT 1 FROM events e WHERE e.user_id = u.user_id AND e.kind IN ('baseline', 'join'))
+"""
+
+async def backfill_event_baselines(batch_size: int = MIGRATION_BATCH_SIZE, pause: float = 0, progress=None) -> int:
+    """Записать в журнал исходное состояние игроков, появившихся до журнала
+
+    Если у игрока уже есть события (перенос прерывали), его журнал сначала
+    сворачивается, а baseline получает ту часть строки users, которой в
+    журнале нет. Павильоны и факты без своих событий получают
+    события pavilion/fact. Повторный запуск безопасен. Возвращает число
+    игроков.
+    """
+    updated = 0
+    last_user_id = None
+    while True:
+        async with get_pool().write() as db:
+            cursor = await db.execute(
+                f"""
+                SELECT user_id FROM users u
+                WHERE user_id > COALESCE(?, -9223372036854775808) AND {NO_BASELINE_WHERE}
+                ORDER BY user_id
+                LIMIT ?
+                """,
+                (last_user_id, batch_size)
+            )
+            user_ids = [row[0] for row in await cursor.fetchall()]
+            if not user_ids:
+                break
+            now = time.time()
+            await db.executemany(FOLD_USER_SQL, [(user_id,) for user_id in user_ids])
+            await db.executemany(
+                """
+                INSERT INTO events (user_id, kind, coins, tasks, guests, created_at)
+                SELECT u.user_id, 'baseline',
+                    u.coins - COALESCE(SUM(e.coins), 0),
+                    u.tasks_completed - COALESCE(SUM(e.tasks), 0),
+                    u.guests_served - COALESCE(SUM(e.guests), 0),
+                    ?
+                FROM users u LEFT JOIN events e ON e.user_id = u.user_id
+                WHERE u.user_id = ?
+                GROUP BY u.user_id
+                """,
+                [(now, user_id) for user_id in user_ids]
+            )
+            await db.executemany(
+                """
+                INSERT INTO events (user_id, kind, ref_id, created_at)
+                SELECT user_id, 'pavilion', pavilion_id, ? FROM user_pavilions p
+                WHERE user_id = ? AND NOT EXISTS (SELECT 1 FROM events e
+                    WHERE e.user_id = p.user_id AND e.kind = 'pavilion' AND e.ref_id = p.pavilion_id)
+                """,
+                [(now, user_id) for user_id in user_ids]
+            )
+            await db.executemany(
+                """
+                INSERT INTO events (user_id, kind, ref_id, created_at)
+                SELECT user_id, 'fact', fact_id, ? FROM user_facts f
+                WHERE user_id = ? AND NOT EXISTS (SELECT 1 FROM events e
+                    WHERE e.user_id = f.user_id AND e.kind = 'fact' AND e.ref_id = f.fact_id)
+                """,
+                [(now, user_id) for user_id in user_ids]
+            )
+            await db.executemany(
+                "UPDATE users SET last_event_id = (SELECT MAX(id) FROM events WHERE user_id = ?) WHERE user_id = ?",
+                [(user_id, user_id) for user_id in user_ids]
+            )
+        updated += len(user_ids)
+        last_user_id = user_ids[-1]
+        if progress is not None:
+            progress(len(user_ids))
+        await asyncio.sleep(pause)
+    return updated
+
+async def _estimate_event_baselines(db) -> int:
+    if not await _columns(db, "events"):
+        return await _count_users(db)
+    return await _count(db, f"SELECT COUNT(*) FROM users u WHERE {NO_BASELINE_WHERE}")
+
+
+# 6. Второе слово маски фактов (ID 65..128). Перенос повторяет шаг 3: раньше он
+# отбрасывал факты с ID больше 63, теперь дописывает их в маску
+
+async def _schema_fact_mask_words(db):
+    for column in FACT_MASK_COLUMNS:
+        await _ensure_column(db, "users", column, "INTEGER NOT NULL DEFAULT 0")
+
+
+# Все миграции по порядку; новые добавляются только в конец
+MIGRATIONS = [
+    Migration(1, "base", _schema_base),
+    Migration(2, "progress_tables", _schema_progress_tables,
+              migrate_json_progress, _estimate_json_progress),
+    Migration(3, "progress_masks", _schema_progress_masks,
+              backfill_progress_masks, _estimate_progress_masks),
+    Migration(4, "task_states", _schema_task_states),
+    Migration(5, "events", _schema_events,
+              backfill_event_baselines, _estimate_event_baselines),
+    Migration(6, "fact_mask_words", _schema_fact_mask_words,
+              backfill_progress_masks, _estimate_progress_masks),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+async def get_schema_version(db) -> int:
+    cursor = await db.execute("PRAGMA user_version")
+    return (await cursor.fetchone())[0]
+
+async def _pending(db) -> list:
+    version = await get_schema_version(db)
+    if version > LATEST_VERSION:
+        log_warning("Схема базы новее кода", {"schema": version, "latest": LATEST_VERSION})
+    return [step for step in MIGRATIONS if step.version > version]
+
+def legacy_sources(version: int) -> tuple:
+    """Старые источники прогресса, которые нужно читать при версии схемы version
+
+    JSON-колонки — пока не закончен перенос шага 2, таблицы связей — пока
+    не закончен шаг 6 (последний, который дописывает из них маски).
+    """
+    sources = []
+    if version < 2:
+        sources.append(LEGACY_JSON)
+    if version < 6:
+        sources.append(LEGACY_TABLES)
+    return tuple(sources)
+
+async def _apply_schemas(pending: list):
+    """Изменения схемы всех недостающих миграций, одной транзакцией
+
+    Они только добавляют и повторяемы, поэтому применяются сразу, ещё до
+    переносов: бот пишет в новые колонки, а перенос шага может писать в
+    колонки следующих шагов (шаг 3 — во второе слово маски фактов из шага 6).
+    """
+    if pending:
+        async with get_pool().write() as db:
+            for step in pending:
+                await step.schema(db)
+
+async def _raise_version(version: int):
+    """Повысить user_version до version; понизить её нельзя
+
+    Переносы могут идти и в фоне бота, и из python migrations.py, поэтому
+    версия читается и меняется в одной транзакции писателя.
+    """
+    async with get_pool().write() as db:
+        if await get_schema_version(db) < version:
+            await db.execute(f"PRAGMA user_version = {version}")
+
+async def migrate(batch_size: int = MIGRATION_BATCH_SIZE, pause_ms: int = MIGRATION_BATCH_PAUSE_MS) -> list:
+    """Применить недостающие миграции по порядку; возвращает их версии
+
+    Сначала применяются изменения схемы, затем по порядку переносы: между
+    порциями перенос ждёт pause_ms, чтобы не занимать писателя подряд.
+    После каждого шага повышается версия и сокращается список старых
+    источников прогресса, которые читает бот (database.set_legacy_progress).
+    """
+    async with get_pool().read() as db:
+        pending = await _pending(db)
+    await _apply_schemas(pending)
+    applied = []
+    for step in pending:
+        progress = None
+        if step.backfill is not None:
+            async with get_pool().read() as db:
+                total = await step.estimate(db)
+            progress = _Progress(step, total)
+            await step.backfill(max(1, batch_size), max(0, pause_ms) / 1000, progress)
+        await _raise_version(step.version)
+        database.set_legacy_progress(legacy_sources(step.version))
+        log_info("Миграция применена", progress.stats() if progress is not None else {
+            "version": step.version,
+            "name": step.name,
+        })
+        applied.append(step.version)
+    return applied
+
+async def check_schema() -> int:
+    """Проверка схемы при старте бота; возвращает версию схемы
+
+    Пустая база (ещё нет таблицы users) создаётся сразу всеми миграциями:
+    переносить в ней нечего. В базе с данными недостающие изменения схемы
+    применяются сразу, а переносы идут, пока бот работает (BackgroundMigration
+    или python migrations.py): до их окончания бот читает прогресс и из
+    старых источников.
+    """
+    async with get_pool().read() as db:
+        version = await get_schema_version(db)
+        empty = not await _columns(db, "users")
+        pending = await _pending(db)
+    if version == 0 and empty:
+        await migrate()
+        return LATEST_VERSION
+    await _apply_schemas(pending)
+    database.set_legacy_progress(legacy_sources(version))
+    if version < LATEST_VERSION:
+        log_warning("Переносы миграций не закончены, прогресс читается и из старых источников", {
+            "schema": version,
+            "latest": LATEST_VERSION,
+            "legacy": list(database.legacy_progress()),
+        })
+    return version
+
+async def plan() -> list:
+    """План недостающих миграций без изменений в базе
+
+    Для каждой миграции — оценка числа строк переноса. Пока колонок, по
+    которым ищутся строки, ещё нет, оценка сверху: все пользователи.
+    """
+    steps = []
+    async with get_pool().read() as db:
+        for step in await _pending(db):
+            rows = await step.estimate(db) if step.estimate is not None else 0
+            steps.append({"version": step.version, "name": step.name, "rows": rows})
+    return steps
+
+
+class BackgroundMigration:
+    """Переносы миграций в фоне работающего бота
+
+    Переносы запускает только один процесс (run_backfills): порции всё
+    равно идут через одного писателя базы. Остальные процессы раз в
+    poll_interval секунд читают user_version и перестают читать старые
+    источники прогресса, когда переносы закончены.
+    """
+
+    def __init__(self, run_backfills: bool = MIGRATION_IN_BACKGROUND,
+                 poll_interval: float = MIGRATION_POLL_INTERVAL):
+        self.run_backfills = run_backfills
+        self.poll_interval = poll_interval
+        self._task = None
+        self.errors = 0
+
+    def start(self):
+        """Запустить переносы (или ожидание их окончания), если они не закончены"""
+        if self._task is None and database.legacy_progress():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Остановить фоновую работу (начатая порция откатывается и повторится при следующем запуске)"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def wait(self):
+        """Дождаться окончания фоновой работы (для тестов и скриптов)"""
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self):
+        if self.run_backfills:
+            try:
+                applied = await migrate()
+            except Exception as e:
+                self.errors += 1
+                log_error(e, "BackgroundMigration")
+                return
+            log_info("Фоновые миграции закончены", {"applied": applied})
+            return
+        while database.legacy_progress():
+            await asyncio.sleep(self.poll_interval)
+            try:
+                async with get_pool().read() as db:
+                    version = await get_schema_version(db)
+            except Exception as e:
+                self.errors += 1
+                log_error(e, "BackgroundMigration")
+                continue
+            database.set_legacy_progress(legacy_sources(version))
+
+    def stats(self) -> dict:
+        """Состояние для логов и мониторинга"""
+        return {
+            "legacy": list(database.legacy_progress()),
+            "running": self._task is not None and not self._task.done(),
+            "errors": self.errors,
+        }
+
+
+# Глобальные фоновые миграции (запускаются в bot.init())
+background_migration = BackgroundMigration()
+
+
+async def main(args: list):
+    await database.open_pool()
+    try:
+        async with get_pool().read() as db:
+            version = await get_schema_version(db)
+        print(f"📦 Версия схемы: {version}, последняя: {LATEST_VERSION}")
+        if "--dry-run" in args:
+            steps = await plan()
+            if not steps:
+                print("✅ Миграции не нужны")
+                return
+            for step in steps:
+                print(f"   {step['version']}. {step['name']}: строк ~{step['rows']}")
+            return
+        applied = await migrate()
+        print(f"✅ Применено миграций: {len(applied)}" if applied else "✅ Миграции не нужны")
+    finally:
+        await database.close_pool()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        print("\n⚠️ Прервано пользователем")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Критическая ошибка: {e}")
+        sys.exit(1)
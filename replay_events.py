@@ -0,0 +1,60 @@
+"""Восстановление состояния игроков по журналу событий
+
+    python replay_events.py 123 456         — сравнить текущее состояние с журналом
+    python replay_events.py 123 --apply     — перезаписать строку игрока по журналу
+    python replay_events.py --fold          — свернуть журнал в users сейчас
+
+Сравнение и --fold можно запускать рядом с работающим ботом: события,
+которые бот ещё держит в буфере отложенной записи, в журнал попадут позже
+и в сравнении не видны. Для --apply бота нужно остановить: его кэш игроков
+не узнает о перезаписи строки и продолжит отдавать старое состояние.
+"""
+
+import asyncio
+import sys
+import database
+
+FIELDS = ("coins", "tasks_completed", "guests_served", "pavilions_mask", "facts_mask")
+
+async def replay(user_ids: list, apply: bool):
+    for user_id in user_ids:
+        replayed = await database.replay_user(user_id)
+        if replayed is None:
+            print(f"⚠️ {user_id}: в журнале нет событий")
+            continue
+        current = await database.get_user_snapshot(user_id)
+        if apply:
+            replayed = await database.restore_user(user_id)
+        diff = {name: (getattr(current, name), getattr(replayed, name))
+                for name in FIELDS if getattr(current, name) != getattr(replayed, name)}
+        if not diff:
+            print(f"✅ {user_id}: состояние совпадает с журналом")
+        else:
+            action = "восстановлено" if apply else "расхождения"
+            print(f"{'🔧' if apply else '❗'} {user_id}: {action} (было → по журналу)")
+            for name, (was, now) in diff.items():
+                print(f"    {name}: {was} → {now}")
+
+async def main(args: list):
+    await database.open_pool()
+    try:
+        await database.init_db()
+        if "--fold" in args:
+            print(f"📚 Свёрнуто игроков: {await database.fold_events()}")
+        user_ids = [int(arg) for arg in args if not arg.startswith("--")]
+        await replay(user_ids, apply="--apply" in args)
+    finally:
+        await database.close_pool()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    try:
+        asyncio.run(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        print("\n⚠️ Прервано пользователем")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Критическая ошибка: {e}")
+        sys.exit(1)
@@ -0,0 +1,128 @@
+"""Табличная маршрутизация нажатий inline-кнопок
+
+callback_data имеет вид "action:arg1:arg2...". Обработчик действия ищется в
+словаре за O(1), типы аргументов разбираются по формату, заданному при
+регистрации маршрута, поэтому стоимость одного нажатия не растёт с числом
+действий и заданий.
+"""
+
+import time
+
+
+class CallbackDataError(ValueError):
+    """callback_data не соответствует формату маршрута"""
+
+
+class Route:
+    """Маршрут: обработчик действия, формат аргументов и статистика вызовов"""
+
+    __slots__ = ("action", "handler", "arg_types", "required", "max_split",
+                 "hooks", "calls", "errors", "total_time", "max_time")
+
+    def __init__(self, action: str, handler, arg_types: tuple, required: int):
+        self.action = action
+        self.handler = handler
+        self.arg_types = arg_types
+        self.required = required
+        # Последний аргумент забирает остаток строки целиком
+        self.max_split = len(arg_types) - 1
+        self.hooks = []
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def parse_args(self, raw: str) -> tuple:
+        """Разобрать аргументы после имени действия"""
+        if not self.arg_types:
+            return ()
+        parts = raw.split(":", self.max_split) if raw else []
+        if len(parts) < self.required:
+            raise CallbackDataError(f"{self.action}: ожидалось аргументов {self.required}, получено {len(parts)}")
+        try:
+            return tuple(convert(value) for convert, value in zip(self.arg_types, parts))
+        except ValueError as e:
+            raise CallbackDataError(f"{self.action}: {e}") from e
+
+    def stats(self) -> dict:
+        """Статистика вызовов маршрута"""
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(self.total_time / self.calls * 1000, 2) if self.calls else 0.0,
+            "max_ms": round(self.max_time * 1000, 2),
+        }
+
+
+class CallbackRouter:
+    """Реестр маршрутов callback_data
+
+    Обработчик вызывается как handler(query, context, *args), где args —
+    аргументы callback_data, приведённые к типам маршрута. После каждого
+    вызова выполняются хуки времени: hook(action, elapsed) — общие и
+    привязанные к маршруту. Хуки не должны бросать исключений.
+    """
+
+    def __init__(self):
+        self._routes = {}
+        self._hooks = []
+
+    def route(self, action: str, *arg_types, required: int = None):
+        """Декоратор регистрации обработчика действия
+
+        arg_types — функции приведения аргументов (int, str...);
+        required — сколько первых аргументов обязательны (по умолчанию все).
+        """
+        if required is None:
+            required = len(arg_types)
+
+        def decorator(handler):
+            if action in self._routes:
+                raise ValueError(f"Маршрут '{action}' уже зарегистрирован")
+            self._routes[action] = Route(action, handler, tuple(arg_types), required)
+            return handler
+
+        return decorator
+
+    def add_timing_hook(self, hook, action: str = None):
+        """Добавить хук времени для всех маршрутов или для одного действия"""
+        if action is None:
+            self._hooks.append(hook)
+        else:
+            self._routes[action].hooks.append(hook)
+
+    def resolve(self, data: str):
+        """Найти маршрут и разобрать аргументы; (None, ()) для неизвестного действия"""
+        action, _, raw = data.partition(":")
+        route = self._routes.get(action)
+        if route is None:
+            return None, ()
+        return route, route.parse_args(raw)
+
+    async def dispatch(self, query, context) -> bool:
+        """Выполнить обработчик для query.data; False, если действие неизвестно"""
+        route, args = self.resolve(query.data)
+        if route is None:
+            return False
+
+        started = time.perf_counter()
+        try:
+            await route.handler(query, context, *args)
+        except Exception:
+            route.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            route.calls += 1
+            route.total_time += elapsed
+            if elapsed > route.max_time:
+                route.max_time = elapsed
+            for hook in self._hooks:
+                hook(route.action, elapsed)
+            for hook in route.hooks:
+                hook(route.action, elapsed)
+        return True
+
+    def stats(self) -> dict:
+        """Статистика по маршрутам, которые уже вызывались"""
+        return {action: route.stats() for action, route in self._routes.items() if route.calls}
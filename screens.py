@@ -0,0 +1,133 @@
+"""Отрисовка экранов с запоминанием результата
+
+Текст и клавиатура карты, меню фактов и фактов павильона зависят только от
+небольшого набора входных данных: маски открытых павильонов, подписи с
+мандаринками и собранных фактов. Готовая пара (текст, клавиатура)
+запоминается в ограниченном LRU-кэше по этим данным, поэтому повторная
+навигация не собирает строки и не просматривает справочник заново.
+"""
+
+from functools import lru_cache
+from catalog import CATALOG
+from config import SCREEN_CACHE_SIZE
+import keyboards
+
+
+# Вспомогательные функции для визуализации
+def create_progress_bar(current: int, total: int, length: int = 10) -> str:
+    """Создать визуальный прогресс-бар"""
+    filled = int((current / total) * length) if total > 0 else 0
+    filled = min(filled, length)
+    bar = "█" * filled + "░" * (length - filled)
+    percent = int((current / total) * 100) if total > 0 else 0
+    return f"{bar} {percent}%"
+
+def format_coins(amount: int) -> str:
+    """Форматировать количество мандаринок"""
+    if amount >= 1000:
+        return f"{amount/1000:.1f}K🍊"
+    return f"{amount}🍊"
+
+
+def render_map(pavilions_mask: int, coins: int) -> tuple:
+    """Карта ярмарки: (текст, клавиатура)
+
+    Ключ кэша — подпись с мандаринками, а не сама сумма: от 1000 она
+    округляется, и разные суммы дают один и тот же экран.
+    """
+    return _render_map(pavilions_mask, format_coins(coins))
+
+@lru_cache(maxsize=SCREEN_CACHE_SIZE)
+def _render_map(pavilions_mask: int, coins_label: str) -> tuple:
+    text = f"""🗺 *Карта Московской зимней ярмарки* 🗺
+
+❄️ Снег падает на огоньки павильонов...
+☕ Пахнет глинтвейном и мандаринами...
+🎄 В воздухе витает предновогоднее волшебство...
+
+━━━━━━━━━━━━━━━━━━━━
+
+💰 *У тебя:* {coins_label}
+
+━━━━━━━━━━━━━━━━━━━━
+
+📍 *Выбери павильон:*"""
+    # Клавиатура зависит только от набора открытых павильонов
+    return text, keyboards.map_keyboard(pavilions_mask)
+
+
+FACTS_MENU_TEXT = """📚✨ *Собранные факты* ✨📚
+
+━━━━━━━━━━━━━━━━━━━━
+
+📍 *Выбери павильон:*"""
+
+@lru_cache(maxsize=SCREEN_CACHE_SIZE)
+def render_facts_menu(facts_mask: int) -> tuple:
+    """Меню фактов по павильонам: (текст, клавиатура)"""
+    # Клавиатура зависит только от числа собранных фактов в каждом павильоне
+    return FACTS_MENU_TEXT, keyboards.facts_menu_keyboard(keyboards.facts_counts(facts_mask))
+
+
+def render_pavilion_facts(pav_id: int, facts_mask: int) -> tuple:
+    """Собранные факты павильона: (текст, клавиатура)"""
+    # В ключ кэша идут только факты этого павильона
+    return _render_pavilion_facts(pav_id, facts_mask & CATALOG.pavilion_fact_mask(pav_id))
+
+@lru_cache(maxsize=SCREEN_CACHE_SIZE)
+def _render_pavilion_facts(pav_id: int, pav_facts_mask: int) -> tuple:
+    pav = CATALOG.pavilion(pav_id)
+    pav_facts = CATALOG.pavilion_facts(pav_id)
+
+    collected_pav_facts = [pf for pf in pav_facts if pav_facts_mask & pf.bit]
+    count = len(collected_pav_facts)
+    total = len(pav_facts)
+
+    facts_progress = create_progress_bar(count, total)
+
+    if count == 0:
+        text = f"""📚 *Факты:* {pav.emoji} {pav.name}
+
+━━━━━━━━━━━━━━━━━━━━
+
+📊 *Собрано:* {count}/{total}
+{facts_progress}
+
+━━━━━━━━━━━━━━━━━━━━
+
+💡 Пока нет собранных фактов.
+✨ Выполняй задания в этом павильоне!"""
+    else:
+        text = f"""📚 *Факты:* {pav.emoji} {pav.name}
+
+━━━━━━━━━━━━━━━━━━━━
+
+📊 *Собрано:* {count}/{total} {'✅' if count == total else '📝'}
+{facts_progress}
+
+━━━━━━━━━━━━━━━━━━━━
+
+"""
+        for i, fact in enumerate(collected_pav_facts, 1):
+            text += f"💡 *Факт {i}:*\n\"{fact.text}\"\n\n"
+            if i < len(collected_pav_facts):
+                text += "━━━━━━━━━━━━━━━━━━━━\n\n"
+
+    return text, keyboards.back_to_facts_menu_keyboard()
+
+
+CACHED_SCREENS = (_render_map, render_facts_menu, _render_pavilion_facts)
+
+def cache_stats() -> dict:
+    """Попадания и промахи кэша отрисованных экранов"""
+    stats = {}
+    for render in CACHED_SCREENS:
+        info = render.cache_info()
+        total = info.hits + info.misses
+        stats[render.__name__.lstrip("_")] = {
+            "size": info.currsize,
+            "hits": info.hits,
+            "misses": info.misses,
+            "hit_rate": round(info.hits / total, 3) if total else 0.0,
+        }
+    return stats
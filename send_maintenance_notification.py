@@ -11,7 +11,13 @@ async def send_maintenance_message():
     """Отправить сообщение о технических работах всем пользователям"""
     
     # Инициализация базы данных
-    await database.init_db()
+    await database.open_pool()
+    try:
+        await database.init_db()
+        # Получаем список всех пользователей
+        user_ids = await database.get_all_user_ids()
+    finally:
+        await database.close_pool()
     
     # Получаем токен бота
     bot_token = get_bot_token()
@@ -21,9 +27,6 @@ async def send_maintenance_message():
     
     bot = Bot(token=bot_token)
     
-    # Получаем список всех пользователей
-    user_ids = await database.get_all_user_ids()
-    
     if not user_ids:
         print("ℹ️ Пользователей в базе данных не найдено.")
         return
@@ -0,0 +1,207 @@
+"""Долговременное хранение состояний начатых заданий
+
+TaskStateStore держит состояния в памяти, а бэкенд сохраняет их пачками,
+чтобы перезапуск бота (update.sh, deploy.sh) или другой процесс не терял
+задание на середине. Состояние подгружается из бэкенда при следующем
+нажатии игрока.
+
+Бэкенды:
+    memory — в памяти процесса (без долговременного хранения);
+    sqlite — таблица task_states в основной базе, через общий пул соединений;
+    redis  — хеш на игрока в Redis (нужен пакет redis).
+"""
+
+import json
+import time
+import database
+from config import REDIS_URL, TASK_STATE_TTL
+from task_state import TaskState
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+
+def dump_state(state: TaskState) -> str:
+    return json.dumps(state.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+def load_state(raw) -> TaskState:
+    return TaskState.from_dict(json.loads(raw))
+
+
+class StateBackend:
+    """Интерфейс бэкенда: ключ состояния — пара (user_id, task_id)"""
+
+    async def load_user(self, user_id: int) -> dict:
+        """Живые состояния игрока: {task_id: state}"""
+        raise NotImplementedError
+
+    async def save_many(self, states: dict):
+        """Сохранить {(user_id, task_id): state} одной пачкой"""
+        raise NotImplementedError
+
+    async def delete_many(self, keys: list):
+        """Удалить состояния по ключам (user_id, task_id)"""
+        raise NotImplementedError
+
+    async def purge(self) -> int:
+        """Удалить просроченные состояния; возвращает их количество"""
+        return 0
+
+    async def close(self):
+        """Освободить ресурсы"""
+
+
+class MemoryBackend(StateBackend):
+    """Бэкенд в памяти процесса: состояния сериализуются так же, как в базе"""
+
+    def __init__(self, ttl: float = TASK_STATE_TTL):
+        self.ttl = ttl
+        # user_id -> {task_id: (updated_at, JSON)}
+        self._users = {}
+
+    async def load_user(self, user_id: int) -> dict:
+        deadline = time.time() - self.ttl
+        rows = self._users.get(user_id, {})
+        return {task_id: load_state(raw) for task_id, (updated_at, raw) in rows.items()
+                if updated_at >= deadline}
+
+    async def save_many(self, states: dict):
+        now = time.time()
+        for (user_id, task_id), state in states.items():
+            self._users.setdefault(user_id, {})[task_id] = (now, dump_state(state))
+
+    async def delete_many(self, keys: list):
+        for user_id, task_id in keys:
+            rows = self._users.get(user_id)
+            if rows is not None:
+                rows.pop(task_id, None)
+                if not rows:
+                    del self._users[user_id]
+
+    async def purge(self) -> int:
+        deadline = time.time() - self.ttl
+        removed = 0
+        for user_id in list(self._users):
+            rows = self._users[user_id]
+            for task_id in [t for t, (updated_at, _) in rows.items() if updated_at < deadline]:
+                del rows[task_id]
+                removed += 1
+            if not rows:
+                del self._users[user_id]
+        return removed
+
+
+class SqliteBackend(StateBackend):
+    """Таблица task_states в основной базе, через общий пул соединений"""
+
+    def __init__(self, ttl: float = TASK_STATE_TTL):
+        self.ttl = ttl
+
+    async def load_user(self, user_id: int) -> dict:
+        async with database.get_pool().read() as db:
+            cursor = await db.execute(
+                "SELECT task_id, state FROM task_states WHERE user_id = ? AND updated_at >= ?",
+                (user_id, time.time() - self.ttl)
+            )
+            rows = await cursor.fetchall()
+        return {row[0]: load_state(row[1]) for row in rows}
+
+    async def save_many(self, states: dict):
+        now = time.time()
+        async with database.get_pool().write() as db:
+            await db.executemany(
+                "INSERT OR REPLACE INTO task_states (user_id, task_id, state, updated_at) VALUES (?, ?, ?, ?)",
+                [(user_id, task_id, dump_state(state), now) for (user_id, task_id), state in states.items()]
+            )
+
+    async def delete_many(self, keys: list):
+        async with database.get_pool().write() as db:
+            await db.executemany(
+                "DELETE FROM task_states WHERE user_id = ? AND task_id = ?",
+                list(keys)
+            )
+
+    async def purge(self) -> int:
+        async with database.get_pool().write() as db:
+            cursor = await db.execute(
+                "DELETE FROM task_states WHERE updated_at < ?",
+                (time.time() - self.ttl,)
+            )
+            return cursor.rowcount
+
+
+class RedisBackend(StateBackend):
+    """Хеш task_state:<user_id> в Redis: поле — task_id, значение — JSON
+
+    Значение хранит время записи состояния: Redis умеет задавать время жизни
+    только всему хешу, а оно продлевается при каждой записи, пока игрок
+    активен. Поэтому, как и в других бэкендах, load_user отбрасывает
+    состояния старше ttl (и удаляет их из хеша), а хеши неактивных игроков
+    удаляет сам Redis. Вместо клиента по REDIS_URL можно передать любой
+    совместимый клиент redis.asyncio (например, fakeredis для проверки).
+    """
+
+    def __init__(self, client=None, url: str = REDIS_URL, ttl: float = TASK_STATE_TTL,
+                 prefix: str = "task_state"):
+        if client is None:
+            if redis_asyncio is None:
+                raise RuntimeError("Для TASK_STATE_BACKEND=redis установите пакет redis")
+            client = redis_asyncio.from_url(url)
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    async def load_user(self, user_id: int) -> dict:
+        fields = await self.client.hgetall(self._key(user_id))
+        deadline = time.time() - self.ttl
+        states, expired = {}, []
+        for task_id, raw in fields.items():
+            entry = json.loads(raw)
+            # Значения без updated_at записаны до его появления и давно просрочены
+            if entry.get("updated_at", 0) >= deadline:
+                states[int(task_id)] = TaskState.from_dict(entry["state"])
+            else:
+                expired.append(task_id)
+        if expired:
+            await self.client.hdel(self._key(user_id), *expired)
+        return states
+
+    async def save_many(self, states: dict):
+        now = time.time()
+        by_user = {}
+        for (user_id, task_id), state in states.items():
+            by_user.setdefault(user_id, {})[task_id] = json.dumps(
+                {"updated_at": now, "state": state.to_dict()}, ensure_ascii=False, separators=(",", ":")
+            )
+        async with self.client.pipeline(transaction=False) as pipe:
+            for user_id, fields in by_user.items():
+                pipe.hset(self._key(user_id), mapping=fields)
+                pipe.expire(self._key(user_id), self.ttl)
+            await pipe.execute()
+
+    async def delete_many(self, keys: list):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for user_id, task_id in keys:
+                pipe.hdel(self._key(user_id), task_id)
+            await pipe.execute()
+
+    async def close(self):
+        # redis-py >= 5 закрывает клиент через aclose(), старые версии — через close()
+        close = getattr(self.client, "aclose", None) or self.client.close
+        await close()
+
+
+def make_backend(name: str) -> StateBackend:
+    """Бэкенд по имени из TASK_STATE_BACKEND"""
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SqliteBackend()
+    if name == "redis":
+        return RedisBackend()
+    raise ValueError(f"Неизвестный бэкенд состояний заданий: {name}")
@@ -0,0 +1,411 @@
+"""Движок заданий: описания из game_data компилируются в машины состояний
+
+Каждое задание описано данными в game_data.TASK_FLOWS_DATA (тексты, кадры,
+задержки, кнопки, правильные ответы, число шагов). При старте compile_tasks()
+один раз превращает описания в машины с готовыми экранами: тексты и
+InlineKeyboardMarkup собираются заранее, а обработчик нажатия только
+выбирает нужный экран. Задания без описания получают универсальный экран
+по типу из TASKS_DATA.
+
+Вид машины определяется типом задания и ключами описания:
+    reaction: frames, delay, hit_label — кадры по таймеру, нажатие на последнем;
+    choice:   text, options и answer/fail_text/success_text/fail_alert —
+              выбор варианта (без answer подходит любой);
+              pick, picked_text, fail_text — набрать pick вариантов и нажать «Готово»;
+              then — шаги, которые идут после выбора (как steps);
+    sequence: steps — шаги по порядку;
+              counter, text, options, done_text — повторять действие до counter;
+              tally, text, options, done_text — набрать по tally каждого варианта.
+
+Кнопки вариантов раскладываются по две в ряд; «❌ Отменить» занимает
+свободное место в последнем ряду или отдельный ряд.
+"""
+
+import asyncio
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from task_state import TaskState
+from messaging import edit_message
+
+CANCEL_LABEL = "❌ Отменить"
+DONE_LABEL = "✅ Готово"
+DONE_CHOICE = "done"
+
+
+def build_markup(options, prefix: str, cancel_data: str) -> InlineKeyboardMarkup:
+    """Клавиатура из вариантов (подпись, значение) и кнопки отмены"""
+    buttons = [InlineKeyboardButton(label, callback_data=f"{prefix}:{value}") for label, value in options]
+    rows = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    cancel = InlineKeyboardButton(CANCEL_LABEL, callback_data=cancel_data)
+    if len(buttons) > 1 and len(buttons) % 2:
+        rows[-1].append(cancel)
+    else:
+        rows.append([cancel])
+    return InlineKeyboardMarkup(rows)
+
+
+class Screen:
+    """Готовый экран задания: текст, клавиатура и разметка"""
+
+    __slots__ = ("text", "markup", "parse_mode")
+
+    def __init__(self, text: str, markup: InlineKeyboardMarkup, parse_mode: str = "Markdown"):
+        self.text = text
+        self.markup = markup
+        self.parse_mode = parse_mode
+
+    async def show(self, query, text: str = None, wait: bool = False):
+        await edit_message(
+            query,
+            text=text if text is not None else self.text,
+            reply_markup=self.markup,
+            parse_mode=self.parse_mode,
+            wait=wait
+        )
+
+
+class TaskMachine:
+    """Машина задания: по умолчанию любой выбор или шаг завершает его
+
+    Обработчики возвращают True, если задание выполнено и пора начислять
+    награду (это делает бот).
+    """
+
+    __slots__ = ("task_id",)
+
+    def __init__(self, task_id: int):
+        self.task_id = task_id
+
+    async def start(self, engine, query, state: TaskState):
+        raise NotImplementedError
+
+    async def choose(self, engine, query, state: TaskState, choice: str) -> bool:
+        return True
+
+    async def step(self, engine, query, state: TaskState, step: int, choice: str) -> bool:
+        return True
+
+
+class ReactionMachine(TaskMachine):
+    """Кадры по таймеру; кнопка нажатия появляется на последнем кадре
+
+    Первый кадр отправляется с Markdown, остальные без разметки.
+    """
+
+    __slots__ = ("frames", "delay")
+
+    def __init__(self, task_id: int, frames, hit_label: str, delay: float = 0):
+        super().__init__(task_id)
+        last = len(frames) - 1
+        wait_first = InlineKeyboardMarkup([[
+            InlineKeyboardButton("⏳ Подождать...", callback_data=f"task_reaction_wait:{task_id}")
+        ]])
+        wait_more = InlineKeyboardMarkup([[
+            InlineKeyboardButton("⏳ Ещё рано...", callback_data=f"task_reaction_wait:{task_id}")
+        ]])
+        hit = InlineKeyboardMarkup([
+            [InlineKeyboardButton(hit_label, callback_data=f"task_reaction_hit:{task_id}")],
+            [InlineKeyboardButton(CANCEL_LABEL, callback_data=f"task_cancel:{task_id}")]
+        ])
+        self.frames = tuple(
+            Screen(text,
+                   hit if index == last else wait_first if index == 0 else wait_more,
+                   "Markdown" if index == 0 else None)
+            for index, text in enumerate(frames)
+        )
+        self.delay = delay
+
+    async def start(self, engine, query, state):
+        await self.show_frame(engine, query, state, 0)
+
+    async def show_frame(self, engine, query, state: TaskState, index: int):
+        """Показать кадр и запланировать следующий
+
+        Обработчик кнопки не ждёт: следующий кадр ставится в таймеры движка,
+        а task_cancel снимает его по ключу (user_id, task_id). Кадры из
+        таймеров ждут отправки: задание готово, когда игрок видит последний
+        кадр, а не когда тот встал в очередь. Кадр знает
+        состояние своей попытки: если задание начато заново, пока кадр
+        отправлялся, он не трогает таймер и состояние новой попытки.
+        """
+        key = (query.from_user.id, self.task_id)
+        if index > 0 and engine.states.peek(key) is not state:
+            return
+
+        if index == 0:
+            await self.frames[0].show(query)
+            shown = True
+        else:
+            try:
+                await self.frames[index].show(query, wait=True)
+                shown = True
+            except Exception:
+                shown = False
+
+        if engine.states.peek(key) is not state:
+            return
+        if index == len(self.frames) - 1:
+            if shown:
+                state.ready = True
+                # Пометить изменённое состояние для сохранения в бэкенд
+                engine.states[key] = state
+        else:
+            engine.timers.schedule(key, self.delay, self.show_frame, engine, query, state, index + 1)
+
+
+class StepsMachine(TaskMachine):
+    """Шаги по порядку: последний шаг завершает задание"""
+
+    __slots__ = ("screens",)
+
+    def __init__(self, task_id: int, steps):
+        super().__init__(task_id)
+        self.screens = tuple(
+            Screen(step["text"],
+                   build_markup(step["options"], f"task_sequence:{task_id}:{number}", f"task_cancel:{task_id}"))
+            for number, step in enumerate(steps, 1)
+        )
+
+    async def start(self, engine, query, state):
+        await self.screens[0].show(query)
+
+    async def step(self, engine, query, state, step, choice):
+        if step == len(self.screens):
+            return True
+        if not 1 <= step < len(self.screens):
+            return False
+        state.step = step + 1
+        await self.screens[step].show(query)
+        return False
+
+
+class ChoiceMachine(TaskMachine):
+    """Выбор варианта: правильный ответ, любой ответ или переход к шагам"""
+
+    __slots__ = ("screen", "answer", "fail_text", "success_text", "fail_alert", "then")
+
+    def __init__(self, task_id: int, text: str, options, answer: str = None, fail_text: str = "",
+                 success_text: str = None, fail_alert: bool = True, then: StepsMachine = None):
+        super().__init__(task_id)
+        self.screen = Screen(text, build_markup(options, f"task_choice:{task_id}", f"task_cancel:{task_id}"))
+        self.answer = answer
+        self.fail_text = fail_text
+        self.success_text = success_text
+        self.fail_alert = fail_alert
+        self.then = then
+
+    async def start(self, engine, query, state):
+        await self.screen.show(query)
+
+    async def choose(self, engine, query, state, choice):
+        if self.then is not None:
+            state.add_choice(choice)
+            await self.then.start(engine, query, state)
+            return False
+        if self.answer is None:
+            return True
+        if choice != self.answer:
+            await query.answer(self.fail_text.format(choice=choice), show_alert=self.fail_alert)
+            return False
+        if self.success_text:
+            await query.answer(self.success_text, show_alert=False)
+            await asyncio.sleep(0.3)
+        return True
+
+    async def step(self, engine, query, state, step, choice):
+        if self.then is not None:
+            return await self.then.step(engine, query, state, step, choice)
+        return True
+
+
+class PickMachine(TaskMachine):
+    """Набрать pick вариантов и нажать «Готово»
+
+    Экраны для каждого числа выбранных вариантов собираются заранее.
+    """
+
+    __slots__ = ("screens", "fail_text")
+
+    def __init__(self, task_id: int, text: str, options, pick: int, picked_text: str, fail_text: str):
+        super().__init__(task_id)
+        cancel_data = f"task_cancel:{task_id}"
+        markup = build_markup(options, f"task_choice:{task_id}", cancel_data)
+        done = build_markup([(DONE_LABEL, DONE_CHOICE)], f"task_choice:{task_id}", cancel_data)
+        self.screens = tuple(
+            Screen(f"{text}\n\nВыбрано: {picked}/{pick}", markup) for picked in range(pick)
+        ) + (Screen(f"{text}\n\n{picked_text}", done),)
+        self.fail_text = fail_text
+
+    async def start(self, engine, query, state):
+        await self.screens[0].show(query)
+
+    async def choose(self, engine, query, state, choice):
+        if choice != DONE_CHOICE:
+            state.add_choice(choice)
+            await self.screens[min(len(state.choices), len(self.screens) - 1)].show(query)
+            return False
+        if len(state.choices) == len(self.screens) - 1:
+            return True
+        await query.answer(self.fail_text, show_alert=True)
+        return False
+
+
+class CounterMachine(TaskMachine):
+    """Повторять действие counter раз, затем нажать «Готово»"""
+
+    __slots__ = ("screens", "actions")
+
+    def __init__(self, task_id: int, text: str, options, counter: int, done_text: str):
+        super().__init__(task_id)
+        cancel_data = f"task_cancel:{task_id}"
+        markup = build_markup(options, f"task_sequence:{task_id}:1", cancel_data)
+        done = build_markup([(DONE_LABEL, DONE_CHOICE)], f"task_sequence:{task_id}:2", cancel_data)
+        self.screens = tuple(
+            Screen(text.format(count=count), markup) for count in range(counter)
+        ) + (Screen(done_text, done),)
+        self.actions = frozenset(value for _, value in options)
+
+    async def start(self, engine, query, state):
+        await self.screens[0].show(query)
+
+    async def step(self, engine, query, state, step, choice):
+        if choice in self.actions:
+            state.count += 1
+            await self.screens[min(state.count, len(self.screens) - 1)].show(query)
+            return False
+        return choice == DONE_CHOICE
+
+
+class TallyMachine(TaskMachine):
+    """Набрать по tally нажатий каждого варианта, затем нажать «Готово»
+
+    Текст с отдельными счётчиками подставляется при показе, клавиатуры готовые.
+    """
+
+    __slots__ = ("text", "names", "total", "screen", "done_screen")
+
+    def __init__(self, task_id: int, text: str, options, tally: int, done_text: str):
+        super().__init__(task_id)
+        cancel_data = f"task_cancel:{task_id}"
+        self.text = text
+        self.names = tuple(value for _, value in options)
+        self.total = tally * len(self.names)
+        self.screen = Screen(text, build_markup(options, f"task_sequence:{task_id}:1", cancel_data))
+        self.done_screen = Screen(
+            done_text, build_markup([(DONE_LABEL, DONE_CHOICE)], f"task_sequence:{task_id}:2", cancel_data)
+        )
+
+    async def start(self, engine, query, state):
+        await self.show(query, state)
+
+    async def show(self, query, state):
+        counts = {name: state.counter(name) for name in self.names}
+        if sum(counts.values()) < self.total:
+            await self.screen.show(query, self.text.format(**counts))
+        else:
+            await self.done_screen.show(query)
+
+    async def step(self, engine, query, state, step, choice):
+        if choice in self.names:
+            state.bump(choice)
+            await self.show(query, state)
+            return False
+        return choice == DONE_CHOICE
+
+
+def generic_flow(task: dict) -> dict:
+    """Описание универсального экрана для задания без своего описания"""
+    if task["type"] == "reaction":
+        return {
+            "hit_label": "✅ НАЖАТЬ!",
+            "frames": [f"""{task['emoji']} *{task['name']}*
+
+⏳ Следи за процессом...
+
+🎯 *Нажми в нужный момент*"""],
+        }
+    if task["type"] == "choice":
+        return {
+            "text": f"""{task['emoji']} *{task['name']}*
+
+🎯 *Выбери вариант:*""",
+            "options": [("Вариант 1", "1"), ("Вариант 2", "2")],
+        }
+    return {
+        "steps": [{
+            "text": f"""{task['emoji']} {task['name']}
+
+Шаг 1""",
+            "options": [("✅ Продолжить", "next")],
+        }],
+    }
+
+
+def compile_task(task: dict, flow: dict) -> TaskMachine:
+    """Машина состояний задания по его описанию"""
+    task_id = task["id"]
+    if task["type"] == "reaction":
+        return ReactionMachine(task_id, flow["frames"], flow["hit_label"], flow.get("delay", 0))
+    if task["type"] == "choice":
+        if "pick" in flow:
+            return PickMachine(task_id, flow["text"], flow["options"], flow["pick"],
+                               flow["picked_text"], flow["fail_text"])
+        then = StepsMachine(task_id, flow["then"]) if "then" in flow else None
+        return ChoiceMachine(task_id, flow["text"], flow["options"], flow.get("answer"),
+                             flow.get("fail_text", ""), flow.get("success_text"),
+                             flow.get("fail_alert", True), then)
+    if task["type"] == "sequence":
+        if "counter" in flow:
+            return CounterMachine(task_id, flow["text"], flow["options"], flow["counter"], flow["done_text"])
+        if "tally" in flow:
+            return TallyMachine(task_id, flow["text"], flow["options"], flow["tally"], flow["done_text"])
+        return StepsMachine(task_id, flow["steps"])
+    raise ValueError(f"Неизвестный тип задания {task['type']!r} (задание {task_id})")
+
+
+def compile_tasks(tasks_data, flows_data) -> dict:
+    """Машины всех заданий: task_id -> TaskMachine"""
+    return {
+        task["id"]: compile_task(task, flows_data.get(task["id"]) or generic_flow(task))
+        for task in tasks_data
+    }
+
+
+class TaskEngine:
+    """Запуск заданий и обработка нажатий через скомпилированные машины
+
+    states — хранилище TaskStateStore, timers — TimerScheduler для кадров
+    заданий на реакцию.
+    """
+
+    def __init__(self, machines: dict, states, timers):
+        self.machines = machines
+        self.states = states
+        self.timers = timers
+
+    async def start(self, query, pavilion_id: int, task_id: int) -> bool:
+        """Начать задание заново; False, если такого задания нет"""
+        machine = self.machines.get(task_id)
+        if machine is None:
+            return False
+        # Сохраняем состояние; таймер прошлой попытки больше не нужен
+        key = (query.from_user.id, task_id)
+        self.timers.cancel(key)
+        state = self.states[key] = TaskState(pavilion_id)
+        await machine.start(self, query, state)
+        return True
+
+    async def choose(self, query, task_id: int, choice: str) -> bool:
+        """Выбор варианта; True, если задание выполнено"""
+        machine = self.machines.get(task_id)
+        if machine is None:
+            return True
+        state = self.states.ensure((query.from_user.id, task_id))
+        return await machine.choose(self, query, state, choice)
+
+    async def step(self, query, task_id: int, step: int, choice: str) -> bool:
+        """Шаг последовательности; True, если задание выполнено"""
+        machine = self.machines.get(task_id)
+        if machine is None:
+            return True
+        state = self.states.ensure((query.from_user.id, task_id))
+        return await machine.step(self, query, state, step, choice)
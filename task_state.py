@@ -0,0 +1,339 @@
+"""Хранилище состояний начатых заданий
+
+Состояние живёт, пока игрок проходит задание. Брошенные задания больше не
+копятся в памяти: у каждой записи скользящий TTL (продлевается при каждом
+обращении), общее число записей ограничено с вытеснением по LRU, а
+просроченные записи периодически вычищает таймер в цикле событий.
+
+Если подключён бэкенд (см. state_backends.py), изменённые состояния
+сбрасываются в него пачками раз в TASK_STATE_FLUSH_INTERVAL, а при первом
+нажатии игрока после перезапуска его состояния подгружаются обратно.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from config import (
+    TASK_STATE_TTL, TASK_STATE_MAX_ENTRIES, TASK_STATE_SWEEP_INTERVAL, TASK_STATE_FLUSH_INTERVAL,
+)
+from logger import log_error
+
+
+class TaskState:
+    """Состояние начатого задания игрока
+
+    Ключ в хранилище — кортеж (user_id, task_id), поэтому здесь только
+    поля самого задания. Выборы хранятся кортежем, счётчики по цветам
+    создаются только у заданий, которые их используют.
+    """
+
+    __slots__ = ("pavilion_id", "step", "choices", "count", "counters", "ready")
+
+    def __init__(self, pavilion_id: int = 1, step: int = 1, choices: tuple = (),
+                 count: int = 0, counters: dict = None, ready: bool = False):
+        self.pavilion_id = pavilion_id
+        self.step = step
+        self.choices = choices
+        self.count = count
+        self.counters = counters
+        self.ready = ready
+
+    def add_choice(self, choice: str):
+        """Добавить выбранный вариант"""
+        self.choices = self.choices + (choice,)
+
+    def counter(self, name: str) -> int:
+        """Значение именованного счётчика"""
+        return self.counters.get(name, 0) if self.counters else 0
+
+    def bump(self, name: str) -> int:
+        """Увеличить именованный счётчик на 1"""
+        if self.counters is None:
+            self.counters = {}
+        self.counters[name] = self.counters.get(name, 0) + 1
+        return self.counters[name]
+
+    def to_dict(self) -> dict:
+        """Словарь для сериализации в бэкенд"""
+        return {
+            "pavilion_id": self.pavilion_id,
+            "step": self.step,
+            "choices": list(self.choices),
+            "count": self.count,
+            "counters": self.counters,
+            "ready": self.ready,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TaskState":
+        """Состояние из словаря бэкенда"""
+        return cls(
+            pavilion_id=data.get("pavilion_id", 1),
+            step=data.get("step", 1),
+            choices=tuple(data.get("choices") or ()),
+            count=data.get("count", 0),
+            counters=data.get("counters"),
+            ready=data.get("ready", False),
+        )
+
+    def __repr__(self):
+        return (f"TaskState(pavilion_id={self.pavilion_id}, step={self.step}, choices={self.choices}, "
+                f"count={self.count}, counters={self.counters}, ready={self.ready})")
+
+
+class TaskStateStore:
+    """Словарь состояний заданий с TTL, лимитом записей и метриками
+
+    Ключ — кортеж (user_id, task_id), значение — TaskState. Поддерживает
+    операции обычного dict, которыми пользуются обработчики: in, [], get,
+    setdefault, pop, del (и ensure для создания пустого состояния).
+    Порядок OrderedDict — порядок
+    последнего обращения; так как TTL одинаков для всех записей, это же и
+    порядок истечения, поэтому очистка просматривает только просроченные
+    записи в начале.
+
+    Обработчики меняют состояния на месте, поэтому любое обращение,
+    отдающее состояние наружу, помечает его для записи в бэкенд.
+    """
+
+    def __init__(self, ttl: float = TASK_STATE_TTL, max_entries: int = TASK_STATE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        # key -> [expires_at, state]
+        self._entries = OrderedDict()
+        self._sweep_handle = None
+        self.evictions = 0
+        self.expirations = 0
+        self.sweeps = 0
+        # Долговременное хранение
+        self._backend = None
+        self._flush_interval = TASK_STATE_FLUSH_INTERVAL
+        self._flush_handle = None
+        self._flush_tasks = set()
+        # key -> state для сохранения или None для удаления
+        self._dirty = {}
+        # Игроки, чьи состояния уже подгружены из бэкенда (LRU того же размера)
+        self._hydrated = OrderedDict()
+        self.flushes = 0
+        self.flush_errors = 0
+        self.hydrated_states = 0
+
+    def _lookup(self, key):
+        """Живая запись (с продлением TTL) или None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if entry[0] <= now:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        entry[0] = now + self.ttl
+        self._entries.move_to_end(key)
+        return entry
+
+    def __contains__(self, key) -> bool:
+        return self._lookup(key) is not None
+
+    def __getitem__(self, key):
+        entry = self._lookup(key)
+        if entry is None:
+            raise KeyError(key)
+        self._mark(key, entry[1])
+        return entry[1]
+
+    def get(self, key, default=None):
+        entry = self._lookup(key)
+        if entry is None:
+            return default
+        self._mark(key, entry[1])
+        return entry[1]
+
+    def peek(self, key):
+        """Живое состояние без пометки для сохранения в бэкенд (или None)"""
+        entry = self._lookup(key)
+        return entry[1] if entry is not None else None
+
+    def __setitem__(self, key, state):
+        self._put(key, state)
+        self._mark(key, state)
+
+    def _put(self, key, state):
+        self._entries[key] = [time.monotonic() + self.ttl, state]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            # Вытесненное состояние осталось в бэкенде: подгрузим его при следующем нажатии
+            self._hydrated.pop(evicted[0], None)
+
+    def setdefault(self, key, default=None):
+        entry = self._lookup(key)
+        if entry is not None:
+            self._mark(key, entry[1])
+            return entry[1]
+        self[key] = default
+        return default
+
+    def ensure(self, key, pavilion_id: int = 1) -> TaskState:
+        """Состояние по ключу; если его нет — создать пустое"""
+        entry = self._lookup(key)
+        if entry is not None:
+            self._mark(key, entry[1])
+            return entry[1]
+        state = TaskState(pavilion_id)
+        self[key] = state
+        return state
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        self._mark(key, None)
+        return entry[1]
+
+    def __delitem__(self, key):
+        del self._entries[key]
+        self._mark(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        """Удалить все состояния из памяти"""
+        self._entries.clear()
+        self._hydrated.clear()
+
+    def sweep(self) -> int:
+        """Удалить просроченные записи; возвращает их количество"""
+        now = time.monotonic()
+        removed = 0
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[0] > now:
+                break
+            del self._entries[key]
+            removed += 1
+        self.expirations += removed
+        self.sweeps += 1
+        if self._backend is not None:
+            self._spawn(self._backend.purge())
+        return removed
+
+    def start_sweeper(self, interval: float = TASK_STATE_SWEEP_INTERVAL):
+        """Запускать sweep() каждые interval секунд в текущем цикле событий"""
+        self.stop_sweeper()
+        loop = asyncio.get_running_loop()
+
+        def run():
+            self.sweep()
+            self._sweep_handle = loop.call_later(interval, run)
+
+        self._sweep_handle = loop.call_later(interval, run)
+
+    def stop_sweeper(self):
+        """Остановить периодическую очистку"""
+        if self._sweep_handle is not None:
+            self._sweep_handle.cancel()
+            self._sweep_handle = None
+
+    # Долговременное хранение
+
+    def attach_backend(self, backend, flush_interval: float = TASK_STATE_FLUSH_INTERVAL):
+        """Подключить бэкенд (state_backends.StateBackend)"""
+        self._backend = backend
+        self._flush_interval = flush_interval
+        self._hydrated.clear()
+
+    async def detach_backend(self):
+        """Сбросить несохранённое и отключить бэкенд"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await self.flush()
+        backend, self._backend = self._backend, None
+        if backend is not None:
+            await backend.close()
+
+    def _mark(self, key, state):
+        """Запомнить изменение для следующей пачки записи в бэкенд"""
+        if self._backend is None:
+            return
+        self._dirty[key] = state
+        if self._flush_handle is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._flush_handle = loop.call_later(self._flush_interval, self._flush_due)
+
+    def _flush_due(self):
+        self._flush_handle = None
+        self._spawn(self.flush())
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        # Держим ссылку до завершения, иначе задачу может собрать GC
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task):
+        self._flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log_error(task.exception(), "TaskStateStore backend")
+
+    async def flush(self):
+        """Записать накопленные изменения в бэкенд одной пачкой"""
+        if self._backend is None or not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        saves = {key: state for key, state in batch.items() if state is not None}
+        deletes = [key for key, state in batch.items() if state is None]
+        try:
+            if saves:
+                await self._backend.save_many(saves)
+            if deletes:
+                await self._backend.delete_many(deletes)
+            self.flushes += 1
+        except Exception as e:
+            # Вернём пачку в очередь; более свежие изменения не перетираем
+            for key, state in batch.items():
+                self._dirty.setdefault(key, state)
+            self.flush_errors += 1
+            log_error(e, "TaskStateStore.flush")
+
+    async def hydrate(self, user_id: int):
+        """Подгрузить состояния игрока из бэкенда при его первом нажатии
+
+        Состояния, которые уже есть в памяти, не заменяются.
+        """
+        if self._backend is None:
+            return
+        if user_id in self._hydrated:
+            self._hydrated.move_to_end(user_id)
+            return
+        states = await self._backend.load_user(user_id)
+        for task_id, state in states.items():
+            key = (user_id, task_id)
+            if key not in self._entries and key not in self._dirty:
+                self._put(key, state)
+                self.hydrated_states += 1
+        self._hydrated[user_id] = True
+        while len(self._hydrated) > self.max_entries:
+            self._hydrated.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Счётчики хранилища для логов и мониторинга"""
+        return {
+            "live": len(self._entries),
+            "max_entries": self.max_entries,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "sweeps": self.sweeps,
+            "dirty": len(self._dirty),
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "hydrated": self.hydrated_states,
+        }
@@ -0,0 +1,23 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# Модули бота лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# logger создаёт каталог и файлы логов при импорте: до импорта модулей бота
+# направляем их во временный каталог, а не в logs/ репозитория
+_LOG_DIR = tempfile.mkdtemp(prefix="winter_fair_logs_")
+os.environ["LOG_DIR"] = _LOG_DIR
+
+
+@pytest.fixture(autouse=True, scope="session")
+def _remove_test_logs():
+    yield
+    import logger
+    for handler in logger.logger.handlers:
+        handler.close()
+    shutil.rmtree(_LOG_DIR, ignore_errors=True)
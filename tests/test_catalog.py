@@ -0,0 +1,31 @@
+import pytest
+
+from catalog import Catalog, FACT_MASK_WORDS, MASK_WORD_BITS, id_bit, id_word, mask_ids, mask_words, words_mask
+
+
+def test_mask_words_round_trip_at_word_boundaries():
+    ids = [1, 63, 64, 65, 127, 128]
+    mask = sum(id_bit(item_id) for item_id in ids)
+    words = mask_words(mask, 2)
+    # Бит 63 каждого слова — знаковый, значения помещаются в INTEGER SQLite
+    assert all(-2 ** 63 <= word < 2 ** 63 for word in words)
+    assert words_mask(words) == mask
+    assert mask_ids(words_mask(words)) == ids
+    assert id_word(64) == (0, -2 ** 63)
+    assert id_word(65) == (1, 1)
+
+
+def test_mask_words_rejects_ids_beyond_capacity():
+    with pytest.raises(ValueError):
+        mask_words(id_bit(129), 2)
+
+
+def test_catalog_accepts_facts_up_to_capacity_and_rejects_beyond():
+    limit = MASK_WORD_BITS * FACT_MASK_WORDS
+    pavilion = {"id": 1, "name": "p", "emoji": "", "location": "", "price": 0, "reward": 1,
+                "description": "", "atmosphere": "", "tasks_count": 0}
+    facts = [{"id": fact_id, "pavilion_id": 1, "text": ""} for fact_id in (63, 64, 75, limit)]
+    catalog = Catalog([pavilion], [], facts)
+    assert mask_ids(catalog.pavilion_fact_mask(1)) == [63, 64, 75, limit]
+    with pytest.raises(ValueError):
+        Catalog([pavilion], [], facts + [{"id": limit + 1, "pavilion_id": 1, "text": ""}])
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import cluster
+from cluster import WorkerProcess, shard_for
+
+
+def test_updates_of_one_user_go_to_one_worker():
+    def update(user_id, update_id):
+        user = SimpleNamespace(id=user_id) if user_id is not None else None
+        return SimpleNamespace(effective_user=user, update_id=update_id)
+
+    assert {shard_for(update(42, n), 4) for n in range(10)} == {42 % 4}
+    assert shard_for(update(None, 7), 4) == 7 % 4
+
+
+def test_workers_share_global_send_rate_and_only_first_folds_events():
+    workers = [WorkerProcess(i, 9000 + i, "secret", workers=4) for i in range(4)]
+    envs = [worker.environment() for worker in workers]
+
+    total_rate = sum(float(env["SEND_GLOBAL_RATE"]) for env in envs)
+    assert abs(total_rate - cluster.SEND_GLOBAL_RATE) < 1e-9
+    assert all(float(env["SEND_GLOBAL_BURST"]) >= 1 for env in envs)
+    assert [float(env["EVENT_SNAPSHOT_INTERVAL"]) > 0 for env in envs] == [True, False, False, False]
+    assert all(env["WEBHOOK_SECRET"] == "secret" and env["WEBHOOK_URL"] == "" for env in envs)
+
+
+def test_update_rejected_with_503_is_retried_until_processed(monkeypatch):
+    import asyncio
+    import json
+
+    from cluster import WorkerChannel
+    from webhook import WebhookServer
+
+    monkeypatch.setattr(WorkerChannel, "RETRY_DELAY", 0.01)
+
+    async def scenario():
+        application = SimpleNamespace(running=True, update_queue=asyncio.Queue(), bot=None)
+        worker = WebhookServer(application, listen="127.0.0.1", port=0, path=cluster.WORKER_PATH,
+                               secret="secret", max_backlog=1)
+        port = await worker.start()
+        channel = WorkerChannel(0, port, "secret")
+        channel.start()
+        processed = []
+        try:
+            for update_id in (1, 2, 3):
+                channel.submit(json.dumps({"update_id": update_id}).encode())
+            # Очередь процесса переполнена, пока обработчик не возьмёт первое обновление
+            await asyncio.sleep(0.1)
+            while len(processed) < 3:
+                update = await asyncio.wait_for(application.update_queue.get(), 5)
+                processed.append(update.update_id)
+            await asyncio.wait_for(channel.queue.join(), 5)
+        finally:
+            await channel.stop()
+            await worker.stop()
+        return processed, channel.stats(), worker.stats()
+
+    processed, channel_stats, worker_stats = asyncio.run(scenario())
+    assert processed == [1, 2, 3]
+    assert channel_stats["dropped"] == 0
+    assert channel_stats["retried"] >= 1
+    assert channel_stats["forwarded"] == 3
@@ -0,0 +1,211 @@
+import asyncio
+
+import pytest
+
+import database
+from catalog import CATALOG
+
+
+@pytest.fixture
+def run_db(tmp_path, monkeypatch):
+    """Запустить сценарий на пустой базе во временном каталоге с ручной записью буфера"""
+    monkeypatch.setattr(database, "counter_buffer", database.CounterBuffer(interval_ms=60000, max_ops=100000))
+    monkeypatch.setattr(database, "user_cache", database.UserCache())
+    monkeypatch.setattr(database, "_legacy_progress", ())
+
+    def run(scenario):
+        async def wrapper():
+            await database.open_pool(path=str(tmp_path / "test.db"), readers=2)
+            try:
+                await database.init_db()
+                return await scenario()
+            finally:
+                await database.close_pool()
+        return asyncio.run(wrapper())
+
+    return run
+
+
+def state(record):
+    return (record.coins, record.tasks_completed, record.guests_served,
+            record.pavilions_mask, record.facts_mask)
+
+
+def test_buffered_rewards_are_visible_before_and_after_flush(run_db):
+    task = CATALOG.pavilion_tasks(1)[0]
+    reward = CATALOG.pavilion(1).reward
+
+    async def scenario():
+        await database.get_user_snapshot(7)
+        for _ in range(3):
+            await database.complete_task_reward(7, task.id)
+        buffered = state(await database.get_user_snapshot(7))
+        database.user_cache.clear()
+        from_db_with_overlay = state(await database.get_user_snapshot(7))
+
+        await database.counter_buffer.flush()
+        database.user_cache.clear()
+        flushed = state(await database.get_user_snapshot(7))
+        return buffered, from_db_with_overlay, flushed, database.counter_buffer.stats()
+
+    buffered, from_db_with_overlay, flushed, stats = run_db(scenario)
+    assert buffered == (50 + 3 * reward, 3, 3, 0, 0)
+    assert from_db_with_overlay == buffered
+    assert flushed == buffered
+    assert stats["flushes"] == 1 and stats["flushed_ops"] == 3 and stats["pending_ops"] == 0
+
+
+def test_fold_and_replay_match_live_state(run_db):
+    tasks = CATALOG.pavilion_tasks(1)
+    fact_id = CATALOG.pavilion_facts(1)[0].id
+
+    async def scenario():
+        for user_id in (1, 2):
+            await database.open_pavilion(user_id, 1)
+            for task in tasks:
+                await database.complete_task_reward(user_id, task.id)
+        await database.add_fact_to_collection(1, fact_id)
+        await database.counter_buffer.flush()
+        # Часть событий игрока 1 — уже после записи пачки
+        await database.complete_task_reward(1, tasks[0].id)
+        await database.counter_buffer.flush()
+
+        database.user_cache.clear()
+        before = {user_id: state(await database.get_user_snapshot(user_id)) for user_id in (1, 2)}
+        folded = await database.fold_events()
+        database.user_cache.clear()
+        after = {user_id: state(await database.get_user_snapshot(user_id)) for user_id in (1, 2)}
+        replayed = {user_id: state(await database.replay_user(user_id)) for user_id in (1, 2)}
+        async with database.get_pool().read() as db:
+            cursor = await db.execute("SELECT COUNT(*) FROM events e JOIN users u USING (user_id) WHERE e.id > u.last_event_id")
+            unfolded = (await cursor.fetchone())[0]
+        return before, folded, after, replayed, unfolded
+
+    before, folded, after, replayed, unfolded = run_db(scenario)
+    assert folded == 2
+    assert unfolded == 0
+    assert after == before
+    assert replayed == before
+    assert before[1][1] == len(tasks) + 1 and before[1][4] != 0
+
+
+def test_restore_user_without_events_leaves_database_untouched(run_db):
+    async def scenario():
+        restored = await database.restore_user(99)
+        async with database.get_pool().read() as db:
+            cursor = await db.execute("SELECT COUNT(*) FROM users WHERE user_id = 99")
+            rows = (await cursor.fetchone())[0]
+        return restored, rows
+
+    assert run_db(scenario) == (None, 0)
+
+
+def test_restore_user_rewrites_row_from_events(run_db):
+    async def scenario():
+        await database.open_pavilion(5, 1)
+        await database.complete_task_reward(5, CATALOG.pavilion_tasks(1)[0].id)
+        await database.counter_buffer.flush()
+        expected = state(await database.get_user_snapshot(5))
+        async with database.get_pool().write() as db:
+            await database._fold_user(db, 5)
+            await db.execute("UPDATE users SET coins = 0, tasks_completed = 0, pavilions_mask = 0 WHERE user_id = 5")
+        restored = state(await database.restore_user(5))
+        return expected, restored, state(await database.get_user_snapshot(5))
+
+    expected, restored, current = run_db(scenario)
+    assert restored == expected
+    assert current == expected
+
+
+def test_concurrent_purchases_charge_once_and_count_buffered_coins(run_db):
+    pavilion = CATALOG.pavilion(2)
+
+    async def scenario():
+        await database.ensure_user(3)
+        # Мандаринки на покупку ещё лежат в буфере отложенной записи
+        await database.counter_buffer.add(3, "task", coins=pavilion.price)
+        results = await asyncio.gather(*(database.purchase_pavilion(3, pavilion.id) for _ in range(10)))
+        await database.counter_buffer.flush()
+        database.user_cache.clear()
+        user = await database.get_user_snapshot(3)
+        async with database.get_pool().read() as db:
+            cursor = await db.execute(
+                "SELECT COUNT(*) FROM events WHERE user_id = 3 AND kind = 'pavilion'"
+            )
+            events = (await cursor.fetchone())[0]
+        return results, user, events
+
+    results, user, events = run_db(scenario)
+    assert [r for r in results if r is not None] == [50]
+    assert user.coins == 50
+    assert pavilion.id in database.mask_ids(user.pavilions_mask)
+    assert events == 1
+
+
+def test_purchase_without_enough_coins_changes_nothing(run_db):
+    async def scenario():
+        result = await database.purchase_pavilion(4, 2)
+        database.user_cache.clear()
+        return result, state(await database.get_user_snapshot(4))
+
+    assert run_db(scenario) == (None, (50, 0, 0, 0, 0))
+
+
+def test_reference_tables_are_rewritten_only_when_data_changes(run_db, monkeypatch):
+    import game_data
+
+    async def scenario():
+        first = await game_data.load_game_data()
+        second = await game_data.load_game_data()
+        pavilion = dict(game_data.PAVILIONS_DATA[0], price=1)
+        data, columns = game_data.REFERENCE_TABLES["pavilions"]
+        monkeypatch.setitem(game_data.REFERENCE_TABLES, "pavilions", ([pavilion] + data[1:], columns))
+        third = await game_data.load_game_data()
+        async with database.get_pool().read() as db:
+            cursor = await db.execute("SELECT price FROM pavilions WHERE id = ?", (pavilion["id"],))
+            price = (await cursor.fetchone())[0]
+        return first, second, third, price
+
+    first, second, third, price = run_db(scenario)
+    assert first == len(game_data.PAVILIONS_DATA) + len(game_data.TASKS_DATA) + len(game_data.FACTS_DATA)
+    assert (second, third, price) == (0, 1, 1)
+
+
+def test_facts_beyond_the_first_mask_word_are_kept(run_db):
+    fact_ids = [1, 63, 64, 65, 128]
+
+    async def scenario():
+        await database.ensure_user(8)
+        for fact_id in fact_ids:
+            await database.add_fact_to_collection(8, fact_id)
+        database.user_cache.clear()
+        stored = await database.get_collected_facts(8)
+        replayed = database.mask_ids((await database.replay_user(8)).facts_mask)
+        restored = database.mask_ids((await database.restore_user(8)).facts_mask)
+        database.user_cache.clear()
+        return stored, replayed, restored, await database.get_collected_facts(8)
+
+    assert run_db(scenario) == (fact_ids,) * 4
+
+
+def test_progress_lives_in_masks_and_tables_only_feed_the_backfill(run_db):
+    import migrations
+
+    async def scenario():
+        await database.ensure_user(9)
+        await database.open_pavilion(9, 1)
+        await database.add_fact_to_collection(9, 2)
+        async with database.get_pool().read() as db:
+            cursor = await db.execute(
+                "SELECT (SELECT COUNT(*) FROM user_pavilions) + (SELECT COUNT(*) FROM user_facts)"
+            )
+            junction_rows = (await cursor.fetchone())[0]
+        # Прогресс, записанный старой версией бота только в таблицы связей
+        async with database.get_pool().write() as db:
+            await db.execute("INSERT INTO user_pavilions (user_id, pavilion_id) VALUES (9, 3)")
+            await db.execute("INSERT INTO user_facts (user_id, fact_id) VALUES (9, 70)")
+        await migrations.backfill_progress_masks()
+        database.user_cache.clear()
+        return junction_rows, await database.get_open_pavilions(9), await database.get_collected_facts(9)
+
+    assert run_db(scenario) == (0, [1, 3], [2, 70])
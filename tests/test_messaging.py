@@ -0,0 +1,54 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import messaging
+from messaging import OutboundGovernor, RenderedMessages, edit_message
+
+
+class FakeQuery:
+    """Нажатие под сообщением чата: правки идут через очередь OutboundGovernor"""
+
+    def __init__(self, chat_id=1, message_id=10):
+        self.inline_message_id = None
+        self.message = SimpleNamespace(chat=SimpleNamespace(id=chat_id), message_id=message_id)
+        self.shown = []
+
+    async def edit_message_text(self, text, reply_markup=None, parse_mode=None):
+        self.shown.append(text)
+
+
+def test_throttled_edits_do_not_hold_the_handler(monkeypatch):
+    monkeypatch.setattr(messaging, "outbound", OutboundGovernor(chat_rate=2, chat_burst=1))
+    monkeypatch.setattr(messaging, "rendered_messages", RenderedMessages())
+
+    async def scenario():
+        query = FakeQuery()
+        durations = []
+        for n in range(4):
+            started = time.perf_counter()
+            assert await edit_message(query, f"screen {n}") is True
+            durations.append(time.perf_counter() - started)
+            # Следующее нажатие приходит, пока первая правка уже ушла, а ведро чата пустое
+            await asyncio.sleep(0.01)
+        # Та же правка с ожиданием заменяет ожидающую и возвращается после отправки
+        await edit_message(query, "screen 3", wait=True)
+        return durations, query.shown
+
+    durations, shown = asyncio.run(scenario())
+    assert max(durations) < 0.05
+    # Первая правка ушла сразу, из ожидавших осталась только последняя
+    assert shown == ["screen 0", "screen 3"]
+
+
+def test_wait_returns_result_of_delivery(monkeypatch):
+    monkeypatch.setattr(messaging, "outbound", OutboundGovernor(chat_rate=10, chat_burst=1))
+    monkeypatch.setattr(messaging, "rendered_messages", RenderedMessages())
+
+    async def scenario():
+        query = FakeQuery()
+        first = await edit_message(query, "frame", wait=True)
+        repeated = await edit_message(query, "frame", wait=True)
+        return first, repeated, query.shown
+
+    assert asyncio.run(scenario()) == (True, False, ["frame"])
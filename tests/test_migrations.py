@@ -0,0 +1,209 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+import database
+import migrations
+from catalog import CATALOG, id_bit
+
+# Схема и данные базы до версионных миграций (user_version = 0)
+LEGACY_USERS = [
+    # user_id, coins, pavilions_open, facts_collected, tasks_completed, guests_served
+    (1, 50, "[]", "[]", 0, 0),
+    (2, 120, json.dumps([1, 2]), json.dumps([1, 3]), 7, 7),
+    (3, 990, json.dumps([1]), "not json", 2, 2),
+    (4, 60, "[]", json.dumps([63, 64, 65, 128]), 1, 1),
+]
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "user_cache", database.UserCache())
+    monkeypatch.setattr(database, "counter_buffer", database.CounterBuffer(interval_ms=60000))
+    monkeypatch.setattr(database, "_legacy_progress", ())
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE users (
+            user_id INTEGER PRIMARY KEY,
+            coins INTEGER DEFAULT 50,
+            pavilions_open TEXT DEFAULT '[]',
+            facts_collected TEXT DEFAULT '[]',
+            tasks_completed INTEGER DEFAULT 0,
+            guests_served INTEGER DEFAULT 0,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO users (user_id, coins, pavilions_open, facts_collected, tasks_completed, guests_served)"
+        " VALUES (?, ?, ?, ?, ?, ?)",
+        LEGACY_USERS
+    )
+    conn.commit()
+    conn.close()
+
+    def run(scenario):
+        async def wrapper():
+            await database.open_pool(path=str(path), readers=1)
+            try:
+                return await scenario()
+            finally:
+                await database.close_pool()
+        return asyncio.run(wrapper())
+
+    return run
+
+
+async def _fetch(sql):
+    async with database.get_pool().read() as db:
+        cursor = await db.execute(sql)
+        return [tuple(row) for row in await cursor.fetchall()]
+
+
+def test_dry_run_plans_without_changing_the_database(legacy_db):
+    async def scenario():
+        steps = await migrations.plan()
+        version = (await _fetch("PRAGMA user_version"))[0][0]
+        tables = {row[0] for row in await _fetch("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        return steps, version, tables
+
+    steps, version, tables = legacy_db(scenario)
+    assert [step["version"] for step in steps] == [1, 2, 3, 4, 5, 6]
+    rows = {step["name"]: step["rows"] for step in steps}
+    assert rows["progress_tables"] == 3
+    assert rows["events"] == len(LEGACY_USERS)
+    assert version == 0
+    assert tables == {"users"}
+
+
+def _state(record):
+    return (record.coins, record.tasks_completed, record.guests_served, record.pavilions_mask, record.facts_mask)
+
+
+def test_bot_works_while_backfills_run(legacy_db):
+    task = CATALOG.pavilion_tasks(1)[0]
+    reward = CATALOG.pavilion(1).reward
+    user_ids = [row[0] for row in LEGACY_USERS] + [5]
+
+    async def play():
+        for user_id in user_ids:
+            await database.ensure_user(user_id)
+            await database.open_pavilion(user_id, 4)
+            await database.add_fact_to_collection(user_id, 5)
+            await database.complete_task_reward(user_id, task.id)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        await database.init_db()
+        version = (await _fetch("PRAGMA user_version"))[0][0]
+        legacy = database.legacy_progress()
+        # Прогресс ещё не перенесён, но бот его видит и не продаёт павильон второй раз
+        before = _state(await database.get_user_snapshot(2))
+        bought = await database.purchase_pavilion(3, 1)
+        await asyncio.gather(migrations.migrate(batch_size=1, pause_ms=0), play())
+        await database.counter_buffer.flush()
+        database.user_cache.clear()
+        snapshots = [_state(await database.get_user_snapshot(user_id)) for user_id in user_ids]
+        replayed = [_state(await database.replay_user(user_id)) for user_id in user_ids]
+        return version, legacy, before, bought, snapshots, replayed, database.legacy_progress()
+
+    version, legacy, before, bought, snapshots, replayed, legacy_after = legacy_db(scenario)
+    assert version == 0
+    assert legacy == (database.LEGACY_JSON, database.LEGACY_TABLES)
+    assert before == (120, 7, 7, id_bit(1) | id_bit(2), id_bit(1) | id_bit(3))
+    assert bought is None
+    expected = [
+        (50, 0, 0, 0, 0),
+        (120, 7, 7, id_bit(1) | id_bit(2), id_bit(1) | id_bit(3)),
+        (990, 2, 2, id_bit(1), 0),
+        (60, 1, 1, 0, id_bit(63) | id_bit(64) | id_bit(65) | id_bit(128)),
+        (50, 0, 0, 0, 0),
+    ]
+    expected = [
+        (coins + reward, tasks + 1, guests + 1, pavilions | id_bit(4), facts | id_bit(5))
+        for coins, tasks, guests, pavilions, facts in expected
+    ]
+    assert snapshots == expected
+    assert replayed == expected
+    assert legacy_after == ()
+
+
+def test_background_migration_finishes_and_other_processes_follow(legacy_db):
+    async def scenario():
+        await database.init_db()
+        runner = migrations.BackgroundMigration(run_backfills=True)
+        runner.start()
+        await runner.wait()
+        version = (await _fetch("PRAGMA user_version"))[0][0]
+        # Другой процесс стартовал до окончания переносов и узнаёт о нём по user_version
+        database.set_legacy_progress(migrations.legacy_sources(0))
+        follower = migrations.BackgroundMigration(run_backfills=False, poll_interval=0.01)
+        follower.start()
+        await asyncio.wait_for(follower.wait(), timeout=5)
+        return version, runner.stats(), database.legacy_progress()
+
+    version, stats, legacy = legacy_db(scenario)
+    assert version == migrations.LATEST_VERSION
+    assert stats["errors"] == 0
+    assert legacy == ()
+
+
+def test_concurrent_migrations_never_lower_the_version(legacy_db):
+    async def scenario():
+        # Фоновый перенос и python migrations.py, запущенные одновременно
+        await asyncio.gather(migrations.migrate(batch_size=1, pause_ms=0), migrations.migrate(batch_size=3, pause_ms=0))
+        version = (await _fetch("PRAGMA user_version"))[0][0]
+        baselines = await _fetch("SELECT COUNT(*) FROM events WHERE kind = 'baseline'")
+        return version, baselines[0][0]
+
+    assert legacy_db(scenario) == (migrations.LATEST_VERSION, len(LEGACY_USERS))
+
+
+def test_migrate_is_repeatable(legacy_db):
+    async def scenario():
+        applied = await migrations.migrate(batch_size=2)
+        await database.init_db()
+        return applied, await migrations.migrate()
+
+    applied, again = legacy_db(scenario)
+    assert applied == [1, 2, 3, 4, 5, 6]
+    assert again == []
+
+
+def test_apply_keeps_legacy_columns_and_state(legacy_db):
+    async def scenario():
+        await migrations.migrate(batch_size=2)
+        legacy = await _fetch("SELECT user_id, pavilions_open, facts_collected FROM users ORDER BY user_id")
+        snapshots = [await database.get_user_snapshot(row[0]) for row in LEGACY_USERS]
+        replayed = [await database.replay_user(row[0]) for row in LEGACY_USERS]
+        return legacy, snapshots, replayed
+
+    legacy, snapshots, replayed = legacy_db(scenario)
+    assert legacy == [(row[0], row[2], row[3]) for row in LEGACY_USERS]
+    expected = [
+        (1, 50, 0, 0, 0, 0),
+        (2, 120, 7, 7, id_bit(1) | id_bit(2), id_bit(1) | id_bit(3)),
+        (3, 990, 2, 2, id_bit(1), 0),
+        (4, 60, 1, 1, 0, id_bit(63) | id_bit(64) | id_bit(65) | id_bit(128)),
+    ]
+    for records in (snapshots, replayed):
+        assert [(r.user_id, r.coins, r.tasks_completed, r.guests_served, r.pavilions_mask, r.facts_mask)
+                for r in records] == expected
+
+
+def test_progress_ids_beyond_mask_capacity_stop_the_backfill(legacy_db):
+    async def scenario():
+        async with database.get_pool().write() as db:
+            await db.execute("UPDATE users SET facts_collected = ? WHERE user_id = 1", (json.dumps([129]),))
+        with pytest.raises(ValueError):
+            await migrations.migrate()
+        version = (await _fetch("PRAGMA user_version"))[0][0]
+        kept = await _fetch("SELECT fact_id FROM user_facts WHERE user_id = 1")
+        return version, kept
+
+    version, kept = legacy_db(scenario)
+    # Шаг 2 успел скопировать прогресс, шаг 3 не отбросил факт 129, а остановился
+    assert version == 2
+    assert kept == [(129,)]
@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+import state_backends
+from state_backends import RedisBackend
+from task_state import TaskState
+
+
+class FakeRedis:
+    """Минимальная замена клиента redis.asyncio: хеши в памяти, bytes на выходе"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.expires = {}
+
+    async def hgetall(self, key):
+        return {str(field).encode(): value.encode() for field, value in self.hashes.get(key, {}).items()}
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({str(field): value for field, value in mapping.items()})
+
+    async def hdel(self, key, *fields):
+        fields = {field.decode() if isinstance(field, bytes) else str(field) for field in fields}
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    async def expire(self, key, seconds):
+        self.expires[key] = seconds
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def aclose(self):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        return lambda *args, **kwargs: self.calls.append(method(*args, **kwargs))
+
+    async def execute(self):
+        calls, self.calls = self.calls, []
+        return [await call for call in calls]
+
+
+def test_redis_backend_round_trip_and_delete():
+    async def scenario():
+        client = FakeRedis()
+        backend = RedisBackend(client=client, ttl=60)
+        await backend.save_many({(1, 5): TaskState(pavilion_id=2, step=3, choices=("a",)),
+                                 (1, 6): TaskState(count=4)})
+        loaded = await backend.load_user(1)
+        await backend.delete_many([(1, 6)])
+        return client, loaded, await backend.load_user(1)
+
+    client, loaded, after_delete = asyncio.run(scenario())
+    assert set(loaded) == {5, 6}
+    assert (loaded[5].pavilion_id, loaded[5].step, loaded[5].choices) == (2, 3, ("a",))
+    assert loaded[6].count == 4
+    assert set(after_delete) == {5}
+    assert client.expires["task_state:1"] == 60
+
+
+def test_redis_backend_drops_stale_task_while_user_stays_active(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(state_backends.time, "time", lambda: clock[0])
+
+    async def scenario():
+        client = FakeRedis()
+        backend = RedisBackend(client=client, ttl=60)
+        await backend.save_many({(1, 5): TaskState(step=2)})
+        clock[0] += 45
+        # Другое задание продлевает время жизни всего хеша
+        await backend.save_many({(1, 6): TaskState(step=1)})
+        clock[0] += 30
+        return client, await backend.load_user(1)
+
+    client, loaded = asyncio.run(scenario())
+    assert set(loaded) == {6}
+    assert set(client.hashes["task_state:1"]) == {"6"}
+
+
+def test_redis_backend_ignores_values_without_timestamp():
+    async def scenario():
+        client = FakeRedis()
+        client.hashes["task_state:1"] = {"5": json.dumps(TaskState(step=2).to_dict())}
+        return await RedisBackend(client=client, ttl=60).load_user(1)
+
+    assert asyncio.run(scenario()) == {}
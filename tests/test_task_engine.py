@@ -0,0 +1,49 @@
+import asyncio
+from types import SimpleNamespace
+
+from task_engine import ReactionMachine, TaskEngine
+from task_state import TaskStateStore
+from timers import TimerScheduler
+
+
+class FakeQuery:
+    """Нажатие без сообщения: правки идут сразу, без очереди OutboundGovernor"""
+
+    def __init__(self, user_id, gate=None):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.inline_message_id = None
+        self.message = None
+        self.shown = []
+        self.gate = gate
+
+    async def edit_message_text(self, text, reply_markup=None, parse_mode=None):
+        if text == "f1" and self.gate is not None:
+            gate, self.gate = self.gate, None
+            await gate.wait()
+        self.shown.append(text)
+
+
+def test_stale_reaction_frame_does_not_touch_restarted_attempt():
+    async def scenario():
+        machine = ReactionMachine(7, ["f0", "f1", "f2"], "hit", delay=0.05)
+        engine = TaskEngine({7: machine}, TaskStateStore(), TimerScheduler())
+        gate = asyncio.Event()
+        query = FakeQuery(1, gate)
+
+        await engine.start(query, 1, 7)
+        # Кадр f1 первой попытки начал отправляться и ждёт
+        await asyncio.sleep(0.08)
+        assert query.gate is None
+        await engine.start(query, 1, 7)
+        restarted = engine.states.peek((1, 7))
+        # Старый кадр дошёл, пока новый таймер ещё ждёт
+        gate.set()
+        await asyncio.sleep(0.02)
+        ready_early = restarted.ready
+        await asyncio.sleep(0.2)
+        return query.shown, ready_early, restarted.ready
+
+    shown, ready_early, ready = asyncio.run(scenario())
+    assert shown == ["f0", "f0", "f1", "f1", "f2"]
+    assert not ready_early
+    assert ready
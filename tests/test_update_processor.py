@@ -0,0 +1,70 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from update_processor import UserOrderedUpdateProcessor
+
+
+def make_update(user_id):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id))
+
+
+def test_updates_of_one_user_run_in_order():
+    async def scenario():
+        processor = UserOrderedUpdateProcessor(8)
+        log = []
+
+        async def handle(n):
+            log.append(("start", n))
+            await asyncio.sleep(0.01)
+            log.append(("end", n))
+
+        await asyncio.gather(*(processor.process_update(make_update(1), handle(n)) for n in range(5)))
+        return log, processor.active_users
+
+    log, active_users = asyncio.run(scenario())
+    assert log == [(event, n) for n in range(5) for event in ("start", "end")]
+    assert active_users == 0
+
+
+def test_backlog_of_one_user_does_not_delay_others():
+    async def scenario():
+        processor = UserOrderedUpdateProcessor(4)
+        started = time.monotonic()
+        finished = {}
+
+        async def handle(name):
+            await asyncio.sleep(0.2)
+            finished[name] = time.monotonic() - started
+
+        tasks = [asyncio.ensure_future(processor.process_update(make_update(1), handle(f"a{n}")))
+                 for n in range(6)]
+        await asyncio.sleep(0.05)
+        await processor.process_update(make_update(2), handle("b"))
+        await asyncio.gather(*tasks)
+        return finished
+
+    finished = asyncio.run(scenario())
+    # Шесть нажатий первого игрока идут по очереди (~1.2 с), второй игрок их не ждёт
+    assert finished["b"] < 0.5
+    assert finished["a5"] > 1.1
+
+
+def test_concurrency_limit_is_respected():
+    async def scenario():
+        processor = UserOrderedUpdateProcessor(2)
+        running = peak = 0
+
+        async def handle():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(*(processor.process_update(make_update(user_id), handle())
+                               for user_id in range(10)))
+        return peak, processor.max_concurrent_updates
+
+    peak, limit = asyncio.run(scenario())
+    assert peak == limit == 2
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from webhook import SECRET_HEADER, WebhookListener, WebhookServer
+
+SECRET = "s3cret"
+
+
+def make_application():
+    return SimpleNamespace(running=True, update_queue=asyncio.Queue(), bot=None)
+
+
+async def request(port, method, path, body=b"", headers=None):
+    """Фейковый Telegram: один HTTP-запрос, в ответ — код статуса"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = [f"{method} {path} HTTP/1.1", "Host: 127.0.0.1", "Connection: close",
+            f"Content-Length: {len(body)}"]
+    head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+def post_update(port, update_id, secret=SECRET, body=None):
+    headers = {SECRET_HEADER: secret} if secret is not None else {}
+    if body is None:
+        body = json.dumps({"update_id": update_id}).encode()
+    return request(port, "POST", "/telegram", body, headers)
+
+
+def run_server(scenario, **kwargs):
+    async def main():
+        application = make_application()
+        server = WebhookServer(application, listen="127.0.0.1", port=0, path="/telegram",
+                               secret=SECRET, **kwargs)
+        port = await server.start()
+        try:
+            return await scenario(server, application, port)
+        finally:
+            await server.stop()
+
+    return asyncio.run(main())
+
+
+def test_listener_refuses_to_start_without_secret():
+    with pytest.raises(ValueError):
+        WebhookListener(secret="")
+
+
+def test_accepts_update_with_valid_secret():
+    async def scenario(server, application, port):
+        status = await post_update(port, 1)
+        return status, application.update_queue.qsize(), server.stats()
+
+    status, queued, stats = run_server(scenario)
+    assert status == 200
+    assert queued == 1
+    assert stats["received"] == 1
+
+
+def test_rejects_wrong_or_missing_secret():
+    async def scenario(server, application, port):
+        wrong = await post_update(port, 1, secret="guess")
+        missing = await post_update(port, 2, secret=None)
+        return wrong, missing, application.update_queue.qsize(), server.stats()
+
+    wrong, missing, queued, stats = run_server(scenario)
+    assert wrong == missing == 403
+    assert queued == 0
+    assert stats["rejected"] == 2
+
+
+def test_rejects_oversized_body():
+    async def scenario(server, application, port):
+        body = json.dumps({"update_id": 1, "padding": "x" * 200}).encode()
+        return await post_update(port, 1, body=body), application.update_queue.qsize()
+
+    status, queued = run_server(scenario, max_body=100)
+    assert status == 413
+    assert queued == 0
+
+
+def test_backlog_overflow_returns_503_and_not_ready():
+    async def scenario(server, application, port):
+        first = await post_update(port, 1)
+        second = await post_update(port, 2)
+        ready = await request(port, "GET", "/readyz")
+        health = await request(port, "GET", "/healthz")
+        return first, second, ready, health, application.update_queue.qsize()
+
+    first, second, ready, health, queued = run_server(scenario, max_backlog=1)
+    assert (first, second) == (200, 503)
+    assert ready == 503
+    assert health == 200
+    assert queued == 1
+
+
+def test_repeated_update_is_accepted_but_queued_once():
+    async def scenario(server, application, port):
+        statuses = [await post_update(port, 5) for _ in range(3)]
+        return statuses, application.update_queue.qsize(), server.stats()["duplicates"]
+
+    assert run_server(scenario) == ([200, 200, 200], 1, 2)
@@ -0,0 +1,71 @@
+"""Отложенные кадры заданий без asyncio.sleep в обработчиках
+
+Таймеры ставятся в цикл событий через loop.call_later (куча таймеров
+asyncio), поэтому обработчик кнопки возвращается сразу, а ожидающий
+таймер стоит один TimerHandle. На каждый ключ (user_id, task_id) в очереди
+не больше одного таймера: новый таймер заменяет старый, отмена — O(1).
+"""
+
+import asyncio
+from logger import log_error
+
+
+class TimerScheduler:
+    """Планировщик корутин по ключу"""
+
+    def __init__(self):
+        self._handles = {}
+        self._running = set()
+        self.fired = 0
+        self.cancelled = 0
+
+    def schedule(self, key, delay: float, callback, *args):
+        """Запустить callback(*args) через delay секунд, заменив таймер ключа"""
+        self.cancel(key)
+        loop = asyncio.get_running_loop()
+        self._handles[key] = loop.call_later(delay, self._fire, key, callback, args)
+
+    def cancel(self, key) -> bool:
+        """Отменить таймер ключа; True, если он был"""
+        handle = self._handles.pop(key, None)
+        if handle is None:
+            return False
+        handle.cancel()
+        self.cancelled += 1
+        return True
+
+    def cancel_all(self):
+        """Отменить все таймеры (остановка бота)"""
+        for handle in self._handles.values():
+            handle.cancel()
+        self.cancelled += len(self._handles)
+        self._handles.clear()
+
+    def pending(self, key) -> bool:
+        """Есть ли у ключа запланированный таймер"""
+        return key in self._handles
+
+    def __len__(self):
+        return len(self._handles)
+
+    def _fire(self, key, callback, args):
+        self._handles.pop(key, None)
+        self.fired += 1
+        task = asyncio.ensure_future(callback(*args))
+        # Держим ссылку, пока корутина не завершится, иначе задачу может собрать GC
+        self._running.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task):
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log_error(task.exception(), "TimerScheduler callback")
+
+    def stats(self) -> dict:
+        """Счётчики планировщика"""
+        return {
+            "pending": len(self._handles),
+            "running": len(self._running),
+            "fired": self.fired,
+            "cancelled": self.cancelled,
+        }
@@ -0,0 +1,98 @@
+"""Параллельная обработка обновлений с порядком внутри одного игрока
+
+Обновления разных пользователей обрабатываются одновременно (не больше
+max_concurrent_updates), а обновления одного пользователя выполняются
+строго по очереди: двойное нажатие на «Открыть» или «НАЖАТЬ!» не
+выполнится параллельно с первым.
+
+Место среди max_concurrent_updates обновление занимает, только когда до
+него дошла очередь игрока. Несколько быстрых нажатий одного игрока ждут
+своей очереди, не занимая мест, и не задерживают других игроков.
+"""
+
+import asyncio
+from telegram.ext import BaseUpdateProcessor
+
+# Семафор BaseUpdateProcessor держится всё время do_process_update, включая
+# ожидание очереди игрока, поэтому его лимит снят: лимит — свой семафор
+UNLIMITED = 2 ** 31 - 1
+
+
+def update_user_id(update):
+    """ID пользователя, от которого пришло обновление, или None"""
+    user = getattr(update, "effective_user", None)
+    return user.id if user else None
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Процессор обновлений с блокировкой на каждого пользователя
+
+    Блокировки создаются при первом обновлении пользователя и удаляются,
+    когда его очередь пуста, поэтому память зависит от числа игроков,
+    которые сейчас нажимают кнопки, а не от числа игроков вообще.
+    asyncio.Lock отдаёт блокировку ожидающим в порядке прихода, и только
+    после неё обновление берёт место в семафоре обработки.
+    """
+
+    __slots__ = ("_locks", "_limit", "_slots", "_running")
+
+    def __init__(self, max_concurrent_updates: int):
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        # BaseUpdateProcessor создаёт свой семафор по max_concurrent_updates
+        self._limit = UNLIMITED
+        super().__init__(max_concurrent_updates)
+        self._limit = max_concurrent_updates
+        # Семафор создаётся в работающем цикле событий (Python 3.8)
+        self._slots = None
+        self._running = 0
+        # user_id -> [Lock, сколько обновлений держат или ждут блокировку]
+        self._locks = {}
+
+    @property
+    def max_concurrent_updates(self) -> int:
+        return self._limit
+
+    @property
+    def current_concurrent_updates(self) -> int:
+        return self._running
+
+    async def do_process_update(self, update, coroutine):
+        user_id = update_user_id(update)
+        if user_id is None:
+            await self._run(coroutine)
+            return
+
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._run(coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[user_id]
+
+    async def _run(self, coroutine):
+        """Обработать обновление, заняв место среди max_concurrent_updates"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._limit)
+        async with self._slots:
+            self._running += 1
+            try:
+                await coroutine
+            finally:
+                self._running -= 1
+
+    @property
+    def active_users(self) -> int:
+        """Сколько пользователей сейчас обрабатывается или ждёт очереди"""
+        return len(self._locks)
+
+    async def initialize(self):
+        """Ничего не требуется"""
+
+    async def shutdown(self):
+        """Ничего не требуется"""
@@ -0,0 +1,277 @@
+"""Приём обновлений Telegram через webhook
+
+Вместо одного цикла долгого опроса Telegram сам присылает обновления
+POST-запросами. Встроенный HTTP-сервер на asyncio проверяет секрет из
+заголовка X-Telegram-Bot-Api-Secret-Token, кладёт обновление в
+application.update_queue и сразу отвечает 200: обработка идёт тем же
+путём, что и при run_polling, и не задерживает ответ Telegram.
+
+Для балансировщика и systemd есть два служебных адреса:
+/healthz — процесс жив и принимает соединения,
+/readyz — приложение запущено, база открыта и очередь не переполнена.
+Пока очередь переполнена, обновления отклоняются с кодом 503. Повторно
+присланное обновление (тот же update_id) подтверждается, но не
+обрабатывается второй раз: Telegram и супервизор кластера повторяют
+запросы, на которые не получили ответа.
+
+Тот же сервер (WebhookListener) служит входом кластера процессов
+(cluster.py): там обновления не обрабатываются, а пересылаются дальше.
+"""
+
+import asyncio
+import hmac
+import json
+from collections import OrderedDict
+from telegram import Update
+from config import (
+    WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_MAX_BODY, WEBHOOK_MAX_BACKLOG,
+    WEBHOOK_RECENT_UPDATES,
+)
+from logger import log_info, log_warning, log_error
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+# Сколько ждать следующего запроса в открытом соединении и тела запроса (сек)
+IDLE_TIMEOUT = 75
+BODY_TIMEOUT = 10
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    """Запрос, на который отвечаем ошибкой и закрываем соединение"""
+
+    def __init__(self, status: int):
+        super().__init__(REASONS.get(status, str(status)))
+        self.status = status
+
+
+def parse_head(head: bytes) -> tuple:
+    """Строка запроса и заголовки: (метод, путь, версия, {заголовок: значение})"""
+    try:
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HTTPError(400)
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(":")
+        if not sep:
+            raise HTTPError(400)
+        headers[name.strip().lower()] = value.strip()
+    return method, target.split("?", 1)[0], version, headers
+
+
+def response(status: int, body: str, keep_alive: bool) -> bytes:
+    payload = body.encode()
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        "Content-Type: text/plain; charset=utf-8\r\n"
+        f"Content-Length: {len(payload)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    return head.encode("latin-1") + payload
+
+
+class WebhookListener:
+    """HTTP-сервер для запросов Telegram: секрет, /healthz, /readyz
+
+    Что делать с принятым обновлением, решает deliver(); готовность для
+    /readyz — ready(). WebhookServer кладёт обновления в очередь приложения,
+    cluster.py пересылает их процессам-обработчикам.
+    """
+
+    def __init__(self, listen: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT, path: str = WEBHOOK_PATH,
+                 secret: str = WEBHOOK_SECRET, max_body: int = WEBHOOK_MAX_BODY):
+        # Без секрета любой, кто узнал путь, мог бы присылать поддельные обновления
+        if not secret:
+            raise ValueError("WEBHOOK_SECRET не задан: webhook без секрета не запускается")
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.max_body = max_body
+        self._server = None
+        self._connections = set()
+        self.received = 0
+        self.rejected = 0
+        self.invalid = 0
+
+    async def start(self) -> int:
+        """Начать приём соединений; возвращает порт (при port=0 — выбранный системой)"""
+        self._server = await asyncio.start_server(self._serve, self.listen, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        log_info("Webhook-сервер запущен", {"listen": self.listen, "port": self.port, "path": self.path})
+        return self.port
+
+    async def stop(self):
+        """Перестать принимать запросы и закрыть открытые соединения"""
+        if self._server is None:
+            return
+        server, self._server = self._server, None
+        server.close()
+        for writer in list(self._connections):
+            writer.close()
+        await server.wait_closed()
+
+    @property
+    def serving(self) -> bool:
+        return self._server is not None
+
+    def ready(self) -> bool:
+        """Готов ли процесс принимать обновления"""
+        return self.serving
+
+    async def deliver(self, data: dict, body: bytes) -> bool:
+        """Передать обновление дальше; False — это не обновление Telegram"""
+        raise NotImplementedError
+
+    async def _serve(self, reader, writer):
+        self._connections.add(writer)
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                        ConnectionError):
+                    return
+                try:
+                    method, path, version, headers = parse_head(head)
+                    body = await self._read_body(reader, headers)
+                    status, text = await self._dispatch(method, path, headers, body)
+                except HTTPError as e:
+                    writer.write(response(e.status, e.args[0], keep_alive=False))
+                    await writer.drain()
+                    return
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(response(status, text, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            log_error(e, "webhook")
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _read_body(self, reader, headers: dict) -> bytes:
+        if "transfer-encoding" in headers:
+            raise HTTPError(411)
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HTTPError(400)
+        if length < 0:
+            raise HTTPError(400)
+        if length > self.max_body:
+            raise HTTPError(413)
+        if not length:
+            return b""
+        return await asyncio.wait_for(reader.readexactly(length), BODY_TIMEOUT)
+
+    async def _dispatch(self, method: str, path: str, headers: dict, body: bytes) -> tuple:
+        if path == self.path:
+            if method != "POST":
+                return 405, "method not allowed"
+            return await self._receive(headers, body)
+        if path in ("/healthz", "/readyz") and method != "GET":
+            return 405, "method not allowed"
+        if path == "/healthz":
+            return 200, "ok"
+        if path == "/readyz":
+            return (200, "ready") if self.ready() else (503, "not ready")
+        return 404, "not found"
+
+    async def _receive(self, headers: dict, body: bytes) -> tuple:
+        """Проверить запрос Telegram и передать обновление в deliver()"""
+        if not hmac.compare_digest(
+            headers.get(SECRET_HEADER, "").encode(), self.secret.encode()
+        ):
+            self.rejected += 1
+            log_warning("Webhook: неверный секрет в запросе")
+            return 403, "forbidden"
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict) or not await self.deliver(data, body):
+            self.invalid += 1
+            return 400, "bad update"
+        self.received += 1
+        return 200, "ok"
+
+    def stats(self) -> dict:
+        """Счётчики для логов и мониторинга"""
+        return {
+            "received": self.received,
+            "rejected": self.rejected,
+            "invalid": self.invalid,
+            "connections": len(self._connections),
+        }
+
+
+class WebhookServer(WebhookListener):
+    """Webhook одного процесса: обновления идут в application.update_queue
+
+    ready_check — дополнительная проверка готовности для /readyz
+    (например, что пул базы данных открыт). Последние recent_updates
+    принятых update_id хранятся в LRU, повторы не ставятся в очередь.
+    """
+
+    def __init__(self, application, ready_check=None, max_backlog: int = WEBHOOK_MAX_BACKLOG,
+                 recent_updates: int = WEBHOOK_RECENT_UPDATES, **kwargs):
+        super().__init__(**kwargs)
+        self.application = application
+        self.ready_check = ready_check
+        self.max_backlog = max_backlog
+        self.recent_updates = max(1, recent_updates)
+        self._recent = OrderedDict()
+        self.duplicates = 0
+
+    def ready(self) -> bool:
+        if not self.serving or not self.application.running:
+            return False
+        if self.ready_check is not None and not self.ready_check():
+            return False
+        return self.application.update_queue.qsize() < self.max_backlog
+
+    async def deliver(self, data: dict, body: bytes) -> bool:
+        update_id = data.get("update_id")
+        if update_id in self._recent:
+            self._recent.move_to_end(update_id)
+            self.duplicates += 1
+            return True
+        if self.application.update_queue.qsize() >= self.max_backlog:
+            # Очередь переполнена: Telegram повторит запрос позже
+            raise HTTPError(503)
+        try:
+            update = Update.de_json(data, self.application.bot)
+        except (ValueError, TypeError, KeyError):
+            return False
+        if update is None:
+            return False
+        await self.application.update_queue.put(update)
+        self._recent[update.update_id] = None
+        if len(self._recent) > self.recent_updates:
+            self._recent.popitem(last=False)
+        return True
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["backlog"] = self.application.update_queue.qsize()
+        stats["duplicates"] = self.duplicates
+        return stats